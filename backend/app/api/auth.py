@@ -4,9 +4,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel
 
+from app.api.dictionaries import create_default_dictionary
 from app.core.config import Settings
 from app.core.auth import get_current_user
+from app.core.executor import run_cpu
 from app.core.security import create_access_token, verify_password
+from app.services.storage import Storage, get_storage
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -34,11 +37,15 @@ def find_account(settings: Settings, username: str):
 
 
 @router.post("/login", response_model=LoginResponse)
-def login(payload: LoginRequest, request: Request):
+async def login(payload: LoginRequest, request: Request, storage: Storage = Depends(get_storage)):
     settings = get_settings(request)
     account = find_account(settings, payload.username)
-    if not account or not verify_password(payload.password, account.password_hash):
+    if not account or not await run_cpu(
+        request, verify_password, payload.password, account.password_hash
+    ):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    # Here rather than on the first GET, so read endpoints never write.
+    await create_default_dictionary(storage, account.username)
 
     token = create_access_token(
         subject=account.username,
@@ -53,5 +60,5 @@ def login(payload: LoginRequest, request: Request):
 
 
 @router.get("/me")
-def me(current_user: dict = Depends(get_current_user)):
+async def me(current_user: dict = Depends(get_current_user)):
     return current_user
@@ -1,20 +1,32 @@
 """Character endpoints."""
 
 
+import codecs
+import json
+import re
 from datetime import datetime, timezone
-from typing import List
+from typing import AsyncIterator, List, Tuple
 
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from app.core.auth import get_current_user
 from app.core.config import Settings
-from app.core.db import get_connection
-from app.services.dictionary.pinyin import get_pinyin
-from app.services.dictionary.thuocl import get_common_words
+from app.core.etag import etag_matches, make_etag, not_modified, set_etag
+from app.core.executor import run_cpu
+from app.services.dictionary.pinyin import get_pinyin_batch
+from app.services.dictionary.thuocl import CommonWordsService
+from app.services.storage import Repository, Storage, get_storage
 
 router = APIRouter(prefix="/dictionaries/{dictionary_id}/characters", tags=["characters"])
 
+HANZI = re.compile("[\u4e00-\u9fff]")
+# New characters per insert transaction during a streamed import.
+STREAM_BATCH_SIZE = 1000
+# Report reading progress at least this often (bytes received).
+STREAM_PROGRESS_BYTES = 1 << 20
+
 
 class CharacterInfoResponse(BaseModel):
     hanzi: str
@@ -44,11 +56,12 @@ def get_settings(request: Request) -> Settings:
     return request.app.state.settings
 
 
-def fetch_dictionary(conn, dictionary_id: int):
-    return conn.execute(
-        "SELECT id, owner_id, visibility FROM dictionaries WHERE id = ?",
-        (dictionary_id,),
-    ).fetchone()
+def get_common_words(request: Request) -> CommonWordsService:
+    return request.app.state.common_words
+
+
+def fetch_dictionary(repo: Repository, dictionary_id: int):
+    return repo.get_dictionary(dictionary_id)
 
 
 def can_read(dictionary_row, user_id: str) -> bool:
@@ -61,91 +74,186 @@ def can_write(dictionary_row, user_id: str) -> bool:
     return dictionary_row and dictionary_row["owner_id"] == user_id
 
 
-def ensure_character(conn, dictionary_id: int, hanzi: str) -> bool:
-    pinyin_text = get_pinyin(hanzi)
+def insert_characters(repo: Repository, dictionary_id: int, items: List[Tuple[str, str]]) -> int:
     now = datetime.now(timezone.utc).isoformat()
-    cursor = conn.execute(
-        "INSERT OR IGNORE INTO characters (dictionary_id, hanzi, pinyin, cached_at) VALUES (?, ?, ?, ?)",
-        (dictionary_id, hanzi, pinyin_text, now),
-    )
-    return cursor.rowcount > 0
+    return repo.insert_characters(dictionary_id, items, now)
+
+
+def load_versions(repo: Repository, dictionary_id: int, user_id: str):
+    return repo.get_data_versions(dictionary_id, user_id)
+
+
+def lookup_character(repo: Repository, dictionary_id: int, hanzi: str):
+    return fetch_dictionary(repo, dictionary_id), repo.get_character(dictionary_id, hanzi)
+
+
+def list_dictionary_characters(repo: Repository, dictionary_id: int, user_id: str):
+    dictionary_row = fetch_dictionary(repo, dictionary_id)
+    if not can_read(dictionary_row, user_id):
+        return {"items": []}
+    return {"items": repo.list_characters(dictionary_id)}
+
+
+def prepare_import_items(items: List[str]) -> List[Tuple[str, str]]:
+    """Unique single hanzi in input order, each with its pinyin."""
+    unique = [hanzi for hanzi in dict.fromkeys(items) if len(hanzi) == 1 and HANZI.match(hanzi)]
+    return list(zip(unique, get_pinyin_batch(unique)))
+
+
+class HanziScanner:
+    """Collects unique hanzi, in order of first appearance, from UTF-8 chunks.
+
+    Chunks may split a multi-byte sequence; the incremental decoder carries
+    the partial bytes over. Invalid bytes decode to U+FFFD and are ignored.
+    """
+
+    def __init__(self) -> None:
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.seen = set()
+        self.pending: List[str] = []
+        self.bytes_read = 0
+
+    def feed(self, chunk: bytes, final: bool = False) -> None:
+        self.bytes_read += len(chunk)
+        text = self.decoder.decode(chunk, final)
+        for hanzi in dict.fromkeys(HANZI.findall(text)):
+            if hanzi not in self.seen:
+                self.seen.add(hanzi)
+                self.pending.append(hanzi)
+
+    def take(self) -> List[str]:
+        pending = self.pending
+        self.pending = []
+        return pending
+
+
+class UploadProgressResponse(StreamingResponse):
+    """Streams a body produced while the request body is still being read.
+
+    ``StreamingResponse`` listens for a disconnect by consuming ``receive``,
+    which would swallow the upload; here only the body iterator reads it
+    (and raises ``ClientDisconnect`` if the client goes away).
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def progress_line(event: str, scanner: HanziScanner, imported: int) -> bytes:
+    found = len(scanner.seen)
+    line = {"event": event, "bytes": scanner.bytes_read, "characters": found, "imported": imported}
+    if event == "done":
+        line["skipped"] = found - imported
+    return (json.dumps(line) + "\n").encode("utf-8")
+
+
+async def stream_text_import(
+    request: Request, storage: Storage, dictionary_id: int
+) -> AsyncIterator[bytes]:
+    """Import hanzi from the request body while it arrives, yielding NDJSON progress.
+
+    Each batch of new characters commits on its own, so an interrupted
+    upload keeps what was imported before the break.
+    """
+    scanner = HanziScanner()
+    imported = 0
+    reported = 0
+
+    async def flush() -> int:
+        items = await run_cpu(request, prepare_import_items, scanner.take())
+        return await storage.write(insert_characters, dictionary_id, items)
+
+    async for chunk in request.stream():
+        scanner.feed(chunk)
+        if len(scanner.pending) >= STREAM_BATCH_SIZE:
+            imported += await flush()
+        elif scanner.bytes_read - reported < STREAM_PROGRESS_BYTES:
+            continue
+        reported = scanner.bytes_read
+        yield progress_line("progress", scanner, imported)
+    scanner.feed(b"", final=True)
+    if scanner.pending:
+        imported += await flush()
+    yield progress_line("done", scanner, imported)
 
 
 @router.get("/{hanzi}/info", response_model=CharacterInfoResponse)
-def character_info(
-    dictionary_id: int, hanzi: str, request: Request, current_user: dict = Depends(get_current_user)
+async def character_info(
+    dictionary_id: int,
+    hanzi: str,
+    request: Request,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
 ):
     settings = get_settings(request)
-    conn = get_connection(settings.sqlite.path)
-    try:
-        dictionary_row = fetch_dictionary(conn, dictionary_id)
-        if not can_read(dictionary_row, current_user["username"]):
-            return {"hanzi": hanzi, "pinyin": "", "common_words": []}
-        row = conn.execute(
-            "SELECT hanzi, pinyin FROM characters WHERE dictionary_id = ? AND hanzi = ?",
-            (dictionary_id, hanzi),
-        ).fetchone()
-        if row is None:
-            if not can_write(dictionary_row, current_user["username"]):
-                return {"hanzi": hanzi, "pinyin": "", "common_words": []}
-            ensure_character(conn, dictionary_id, hanzi)
-            row = conn.execute(
-                "SELECT hanzi, pinyin FROM characters WHERE dictionary_id = ? AND hanzi = ?",
-                (dictionary_id, hanzi),
-            ).fetchone()
-        common_words = get_common_words(
-            settings.sqlite.path, hanzi, settings.dictionary.max_common_words
-        )
-        return {"hanzi": row["hanzi"], "pinyin": row["pinyin"], "common_words": common_words}
-    finally:
-        conn.close()
+    user_id = current_user["username"]
+    empty = {"hanzi": hanzi, "pinyin": "", "common_words": []}
+    dictionary_row, row = await storage.read(lookup_character, dictionary_id, hanzi)
+    # Read-only: characters are added through /import, never by looking them up.
+    if not can_read(dictionary_row, user_id) or row is None:
+        return empty
+    words = get_common_words(request)
+    limit = settings.dictionary.max_common_words
+    common_words = words.peek(hanzi, limit)
+    if common_words is None:
+        common_words = await run_cpu(request, words.lookup, hanzi, limit)
+    return {"hanzi": row["hanzi"], "pinyin": row["pinyin"], "common_words": common_words}
 
 
 @router.post("/import", response_model=ImportResponse)
-def import_characters(
-    dictionary_id: int, payload: ImportRequest, request: Request, current_user: dict = Depends(get_current_user)
+async def import_characters(
+    dictionary_id: int,
+    payload: ImportRequest,
+    request: Request,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
 ):
-    settings = get_settings(request)
-    conn = get_connection(settings.sqlite.path)
-    try:
-        dictionary_row = fetch_dictionary(conn, dictionary_id)
-        if not can_write(dictionary_row, current_user["username"]):
-            return {"imported": 0, "skipped": len(payload.items)}
-        imported = 0
-        skipped = 0
-        for hanzi in payload.items:
-            if len(hanzi) != 1:
-                skipped += 1
-                continue
-            if not ("\u4e00" <= hanzi <= "\u9fff"):
-                skipped += 1
-                continue
-            if ensure_character(conn, dictionary_id, hanzi):
-                imported += 1
-            else:
-                skipped += 1
-        conn.commit()
-        return {"imported": imported, "skipped": skipped}
-    finally:
-        conn.close()
+    dictionary_row = await storage.read(fetch_dictionary, dictionary_id)
+    if not can_write(dictionary_row, current_user["username"]):
+        return {"imported": 0, "skipped": len(payload.items)}
+    items = await run_cpu(request, prepare_import_items, payload.items)
+    imported = await storage.write(insert_characters, dictionary_id, items)
+    return {"imported": imported, "skipped": len(payload.items) - imported}
+
+
+@router.post("/import/text")
+async def import_text(
+    dictionary_id: int,
+    request: Request,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
+):
+    """Import every distinct hanzi in a UTF-8 text or file sent as the raw request body.
+
+    The body is read as a stream and never held in memory; the response is
+    NDJSON: ``progress`` lines while reading, then one ``done`` line with
+    the totals.
+    """
+    dictionary_row = await storage.read(fetch_dictionary, dictionary_id)
+    if not dictionary_row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dictionary not found")
+    if not can_write(dictionary_row, current_user["username"]):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    return UploadProgressResponse(
+        stream_text_import(request, storage, dictionary_id), media_type="application/x-ndjson"
+    )
 
 
 @router.get("/list", response_model=CharacterListResponse)
-def list_characters(
-    dictionary_id: int, request: Request, current_user: dict = Depends(get_current_user)
+async def list_characters(
+    dictionary_id: int,
+    request: Request,
+    response: Response,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
 ):
-    settings = get_settings(request)
-    conn = get_connection(settings.sqlite.path)
-    try:
-        dictionary_row = fetch_dictionary(conn, dictionary_id)
-        if not can_read(dictionary_row, current_user["username"]):
-            return {"items": []}
-        rows = conn.execute(
-            "SELECT hanzi, pinyin FROM characters WHERE dictionary_id = ? ORDER BY hanzi ASC",
-            (dictionary_id,),
-        ).fetchall()
-        return {
-            "items": [{"hanzi": row["hanzi"], "pinyin": row["pinyin"]} for row in rows]
-        }
-    finally:
-        conn.close()
+    user_id = current_user["username"]
+    shared, _ = await storage.read(load_versions, dictionary_id, user_id)
+    etag = make_etag(storage, "characters", dictionary_id, user_id, shared)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    result = await storage.read(list_dictionary_characters, dictionary_id, user_id)
+    set_etag(response, etag)
+    return result
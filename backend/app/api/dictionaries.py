@@ -1,34 +1,39 @@
 """Dictionary endpoints."""
 
-import sqlite3
 from datetime import datetime, timezone
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from pydantic import BaseModel
 
 from app.core.auth import get_current_user
 from app.core.config import Settings
-from app.core.db import get_connection
+from app.core.etag import etag_matches, make_etag, not_modified, set_etag
+from app.services.storage import DuplicateNameError, Repository, Storage, get_storage
 
 
 router = APIRouter(prefix="/dictionaries", tags=["dictionaries"])
 
+SCHEDULERS = ("sm2", "fsrs")
+
 
 class DictionaryCreateRequest(BaseModel):
     name: str
     visibility: Optional[str] = "private"
+    scheduler: Optional[str] = "sm2"
 
 
 class DictionaryUpdateRequest(BaseModel):
     name: Optional[str] = None
     visibility: Optional[str] = None
+    scheduler: Optional[str] = None
 
 
 class DictionaryItem(BaseModel):
     id: int
     name: str
     visibility: str
+    scheduler: str
     owner_id: str
     is_owner: bool
 
@@ -41,192 +46,203 @@ def get_settings(request: Request) -> Settings:
     return request.app.state.settings
 
 
-def fetch_dictionary(conn, dictionary_id: int):
-    return conn.execute(
-        "SELECT id, owner_id, name, visibility FROM dictionaries WHERE id = ?",
-        (dictionary_id,),
-    ).fetchone()
+def fetch_dictionary(repo: Repository, dictionary_id: int):
+    return repo.get_dictionary(dictionary_id)
 
 
-@router.get("", response_model=DictionaryListResponse)
-def list_dictionaries(request: Request, current_user: dict = Depends(get_current_user)):
-    settings = get_settings(request)
-    conn = get_connection(settings.sqlite.path)
+def to_item(row: dict, user_id: str) -> dict:
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "visibility": row["visibility"],
+        "scheduler": row["scheduler"],
+        "owner_id": row["owner_id"],
+        "is_owner": row["owner_id"] == user_id,
+    }
+
+
+def check_scheduler(scheduler: str) -> None:
+    if scheduler not in SCHEDULERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown scheduler. Use one of: {', '.join(SCHEDULERS)}.",
+        )
+
+
+def load_catalog_version(repo: Repository) -> int:
+    return repo.get_catalog_version()
+
+
+def load_versions(repo: Repository, dictionary_id: int, user_id: str):
+    return repo.get_data_versions(dictionary_id, user_id)
+
+
+def count_owned(repo: Repository, user_id: str) -> int:
+    return repo.count_owned_dictionaries(user_id)
+
+
+async def create_default_dictionary(storage: Storage, user_id: str) -> None:
+    """Give a user with no dictionaries of their own the default one (called at login)."""
+    if await storage.read(count_owned, user_id) > 0:
+        return
     try:
-        owner_count = conn.execute(
-            "SELECT COUNT(*) AS c FROM dictionaries WHERE owner_id = ?",
-            (current_user["username"],),
-        ).fetchone()["c"]
-        if owner_count == 0:
-            now = datetime.now(timezone.utc).isoformat()
-            conn.execute(
-                """
-                INSERT INTO dictionaries (owner_id, name, visibility, created_at, updated_at)
-                VALUES (?, ?, 'private', ?, ?)
-                """,
-                (current_user["username"], "我的字库", now, now),
-            )
-            conn.commit()
-        rows = conn.execute(
-            """
-            SELECT id, owner_id, name, visibility
-            FROM dictionaries
-            WHERE owner_id = ? OR visibility = 'public'
-            ORDER BY owner_id = ? DESC, name ASC
-            """,
-            (current_user["username"], current_user["username"]),
-        ).fetchall()
-        items = [
-            {
-                "id": row["id"],
-                "name": row["name"],
-                "visibility": row["visibility"],
-                "owner_id": row["owner_id"],
-                "is_owner": row["owner_id"] == current_user["username"],
-            }
-            for row in rows
-        ]
-        return {"items": items}
-    finally:
-        conn.close()
+        await storage.write(ensure_default_dictionary, user_id)
+    except DuplicateNameError:
+        pass
+
+
+def ensure_default_dictionary(repo: Repository, user_id: str) -> None:
+    if repo.count_owned_dictionaries(user_id) > 0:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    repo.create_dictionary(user_id, "我的字库", "private", now)
+
+
+def list_user_dictionaries(repo: Repository, user_id: str) -> List[dict]:
+    return [to_item(row, user_id) for row in repo.list_visible_dictionaries(user_id)]
+
+
+def insert_dictionary(
+    repo: Repository, user_id: str, name: str, visibility: str, scheduler: str
+) -> int:
+    now = datetime.now(timezone.utc).isoformat()
+    try:
+        return repo.create_dictionary(user_id, name, visibility, now, scheduler)
+    except DuplicateNameError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Dictionary name already exists.",
+        )
+
+
+def fetch_owned_dictionary(repo: Repository, dictionary_id: int, user_id: str):
+    row = fetch_dictionary(repo, dictionary_id)
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dictionary not found")
+    if row["owner_id"] != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    return row
+
+
+def apply_dictionary_update(
+    repo: Repository,
+    dictionary_id: int,
+    user_id: str,
+    name: Optional[str],
+    visibility: Optional[str],
+    scheduler: Optional[str] = None,
+) -> dict:
+    row = fetch_owned_dictionary(repo, dictionary_id, user_id)
+    name = name or row["name"]
+    visibility = visibility or row["visibility"]
+    scheduler = scheduler or row["scheduler"]
+    now = datetime.now(timezone.utc).isoformat()
+    try:
+        repo.update_dictionary(dictionary_id, name, visibility, scheduler, now)
+    except DuplicateNameError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Dictionary name already exists.",
+        )
+    return {
+        "id": dictionary_id,
+        "name": name,
+        "visibility": visibility,
+        "scheduler": scheduler,
+        "owner_id": row["owner_id"],
+        "is_owner": True,
+    }
+
+
+def remove_dictionary(repo: Repository, dictionary_id: int, user_id: str) -> None:
+    fetch_owned_dictionary(repo, dictionary_id, user_id)
+    repo.delete_dictionary(dictionary_id)
+
+
+@router.get("", response_model=DictionaryListResponse)
+async def list_dictionaries(
+    request: Request,
+    response: Response,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
+):
+    user_id = current_user["username"]
+    etag = make_etag(storage, "dictionaries", user_id, await storage.read(load_catalog_version))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    items = await storage.read(list_user_dictionaries, user_id)
+    set_etag(response, etag)
+    return {"items": items}
 
 
 @router.post("", response_model=DictionaryItem)
-def create_dictionary(
-    payload: DictionaryCreateRequest, request: Request, current_user: dict = Depends(get_current_user)
+async def create_dictionary(
+    payload: DictionaryCreateRequest,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
 ):
-    settings = get_settings(request)
-    conn = get_connection(settings.sqlite.path)
-    try:
-        now = datetime.now(timezone.utc).isoformat()
-        try:
-            cursor = conn.execute(
-                """
-                INSERT INTO dictionaries (owner_id, name, visibility, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (
-                    current_user["username"],
-                    payload.name,
-                    payload.visibility or "private",
-                    now,
-                    now,
-                ),
-            )
-        except sqlite3.IntegrityError:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Dictionary name already exists.",
-            )
-        conn.commit()
-        return {
-            "id": cursor.lastrowid,
-            "name": payload.name,
-            "visibility": payload.visibility or "private",
-            "owner_id": current_user["username"],
-            "is_owner": True,
-        }
-    finally:
-        conn.close()
+    visibility = payload.visibility or "private"
+    scheduler = payload.scheduler or "sm2"
+    check_scheduler(scheduler)
+    dictionary_id = await storage.write(
+        insert_dictionary, current_user["username"], payload.name, visibility, scheduler
+    )
+    return {
+        "id": dictionary_id,
+        "name": payload.name,
+        "visibility": visibility,
+        "scheduler": scheduler,
+        "owner_id": current_user["username"],
+        "is_owner": True,
+    }
 
 
 @router.patch("/{dictionary_id}", response_model=DictionaryItem)
-def update_dictionary(
+async def update_dictionary(
     dictionary_id: int,
     payload: DictionaryUpdateRequest,
-    request: Request,
+    storage: Storage = Depends(get_storage),
     current_user: dict = Depends(get_current_user),
 ):
-    settings = get_settings(request)
-    conn = get_connection(settings.sqlite.path)
-    try:
-        row = fetch_dictionary(conn, dictionary_id)
-        if not row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dictionary not found")
-        if row["owner_id"] != current_user["username"]:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-
-        name = payload.name or row["name"]
-        visibility = payload.visibility or row["visibility"]
-        now = datetime.now(timezone.utc).isoformat()
-        try:
-            conn.execute(
-                """
-                UPDATE dictionaries
-                SET name = ?, visibility = ?, updated_at = ?
-                WHERE id = ?
-                """,
-                (name, visibility, now, dictionary_id),
-            )
-        except sqlite3.IntegrityError:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Dictionary name already exists.",
-            )
-        conn.commit()
-        return {
-            "id": dictionary_id,
-            "name": name,
-            "visibility": visibility,
-            "owner_id": row["owner_id"],
-            "is_owner": True,
-        }
-    finally:
-        conn.close()
+    if payload.scheduler is not None:
+        check_scheduler(payload.scheduler)
+    return await storage.write(
+        apply_dictionary_update,
+        dictionary_id,
+        current_user["username"],
+        payload.name,
+        payload.visibility,
+        payload.scheduler,
+    )
 
 
 @router.get("/{dictionary_id}", response_model=DictionaryItem)
-def get_dictionary(
-    dictionary_id: int, request: Request, current_user: dict = Depends(get_current_user)
+async def get_dictionary(
+    dictionary_id: int,
+    request: Request,
+    response: Response,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
 ):
-    settings = get_settings(request)
-    conn = get_connection(settings.sqlite.path)
-    try:
-        row = fetch_dictionary(conn, dictionary_id)
-        if not row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dictionary not found")
-        if row["visibility"] != "public" and row["owner_id"] != current_user["username"]:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-        return {
-            "id": row["id"],
-            "name": row["name"],
-            "visibility": row["visibility"],
-            "owner_id": row["owner_id"],
-            "is_owner": row["owner_id"] == current_user["username"],
-        }
-    finally:
-        conn.close()
+    user_id = current_user["username"]
+    shared, _ = await storage.read(load_versions, dictionary_id, user_id)
+    etag = make_etag(storage, "dictionary", dictionary_id, user_id, shared)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    row = await storage.read(fetch_dictionary, dictionary_id)
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dictionary not found")
+    if row["visibility"] != "public" and row["owner_id"] != current_user["username"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    set_etag(response, etag)
+    return to_item(row, user_id)
 
 
 @router.delete("/{dictionary_id}")
-def delete_dictionary(
-    dictionary_id: int, request: Request, current_user: dict = Depends(get_current_user)
+async def delete_dictionary(
+    dictionary_id: int,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
 ):
-    settings = get_settings(request)
-    conn = get_connection(settings.sqlite.path)
-    try:
-        row = fetch_dictionary(conn, dictionary_id)
-        if not row:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dictionary not found")
-        if row["owner_id"] != current_user["username"]:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
-        conn.execute(
-            "DELETE FROM study_records WHERE dictionary_id = ?",
-            (dictionary_id,),
-        )
-        conn.execute(
-            "DELETE FROM study_sessions WHERE dictionary_id = ?",
-            (dictionary_id,),
-        )
-        conn.execute(
-            "DELETE FROM characters WHERE dictionary_id = ?",
-            (dictionary_id,),
-        )
-        conn.execute(
-            "DELETE FROM dictionaries WHERE id = ?",
-            (dictionary_id,),
-        )
-        conn.commit()
-        return {"status": "ok"}
-    finally:
-        conn.close()
+    await storage.write(remove_dictionary, dictionary_id, current_user["username"])
+    return {"status": "ok"}
@@ -5,6 +5,7 @@ from fastapi import APIRouter
 from app.api import auth
 from app.api import characters
 from app.api import dictionaries
+from app.api import scheduler
 from app.api import study
 from app.api import stats
 
@@ -14,3 +15,4 @@ router.include_router(dictionaries.router)
 router.include_router(characters.router)
 router.include_router(study.router)
 router.include_router(stats.router)
+router.include_router(scheduler.router)
@@ -0,0 +1,123 @@
+"""Scheduler parameter endpoints."""
+
+
+from typing import List, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
+from pydantic import BaseModel
+
+from app.core.auth import get_current_user
+from app.core.executor import run_optimize
+from app.core.timeutil import from_epoch, now_epoch
+from app.services.scheduler.fsrs import DEFAULT_PARAMETERS
+from app.services.storage import Repository, Storage, get_storage
+
+router = APIRouter(prefix="/scheduler", tags=["scheduler"])
+
+
+class OptimizeJob(BaseModel):
+    status: str
+    started_at: str
+    finished_at: Optional[str] = None
+    error: Optional[str] = None
+
+
+class FsrsParametersResponse(BaseModel):
+    parameters: List[float]
+    is_default: bool
+    review_count: int
+    loss: Optional[float]
+    updated_at: Optional[str]
+    job: Optional[OptimizeJob]
+
+
+def get_jobs(request: Request) -> dict:
+    return request.app.state.fsrs_jobs
+
+
+def load_parameters(repo: Repository, user_id: str) -> Optional[dict]:
+    return repo.get_scheduler_parameters(user_id, "fsrs")
+
+
+def load_review_history(repo: Repository, user_id: str) -> list:
+    return repo.get_review_history(user_id)
+
+
+def save_parameters(repo: Repository, user_id: str, result) -> None:
+    repo.save_scheduler_parameters(
+        user_id, "fsrs", result.parameters, result.review_count, result.loss, now_epoch()
+    )
+
+
+async def run_optimization(request: Request, storage: Storage, user_id: str, fit) -> None:
+    """Fit and store one user's FSRS weights; progress is tracked in ``app.state.fsrs_jobs``."""
+    job = get_jobs(request)[user_id]
+    try:
+        history = await storage.read(load_review_history, user_id)
+        result = await run_optimize(request, fit, history)
+        await storage.write(save_parameters, user_id, result)
+        job["status"] = "done"
+    except Exception as exc:
+        job["status"] = "failed"
+        job["error"] = str(exc) or exc.__class__.__name__
+    finally:
+        job["finished_at"] = from_epoch(now_epoch())
+
+
+@router.get("/fsrs", response_model=FsrsParametersResponse)
+async def get_fsrs_parameters(
+    request: Request,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
+):
+    user_id = current_user["username"]
+    saved = await storage.read(load_parameters, user_id)
+    job = get_jobs(request).get(user_id)
+    if saved is None:
+        return {
+            "parameters": DEFAULT_PARAMETERS,
+            "is_default": True,
+            "review_count": 0,
+            "loss": None,
+            "updated_at": None,
+            "job": job,
+        }
+    return {
+        "parameters": saved["parameters"],
+        "is_default": False,
+        "review_count": saved["review_count"],
+        "loss": saved["loss"],
+        "updated_at": from_epoch(saved["updated_at"]),
+        "job": job,
+    }
+
+
+@router.post("/fsrs/optimize", response_model=OptimizeJob, status_code=status.HTTP_202_ACCEPTED)
+async def optimize_fsrs_parameters(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
+):
+    try:
+        from app.services.scheduler.fsrs_optimize import fit_parameters
+    except ImportError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Parameter optimization needs NumPy on the server (requirements-optional.txt).",
+        )
+    user_id = current_user["username"]
+    jobs = get_jobs(request)
+    job = jobs.get(user_id)
+    if job is not None and job["status"] == "running":
+        return job
+    # One fit per process; the optimizer thread would only queue the rest.
+    if any(other["status"] == "running" for other in jobs.values()):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Another optimization is running, try again later.",
+        )
+    job = {"status": "running", "started_at": from_epoch(now_epoch()), "finished_at": None, "error": None}
+    jobs[user_id] = job
+    background_tasks.add_task(run_optimization, request, storage, user_id, fit_parameters)
+    return job
@@ -2,13 +2,17 @@
 
 
 from datetime import datetime, timezone
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from pydantic import BaseModel
 
 from app.core.auth import get_current_user
 from app.core.config import Settings
-from app.core.db import get_connection
+from app.core.etag import etag_matches, make_etag, not_modified, set_etag
+from app.core.executor import run_cpu
+from app.core.timeutil import date_to_day, day_to_date, local_day, now_epoch
+from app.services.storage import Repository, Storage, get_storage
 
 router = APIRouter(prefix="/dictionaries/{dictionary_id}/stats", tags=["stats"])
 
@@ -21,15 +25,44 @@ class SummaryResponse(BaseModel):
     study_time_total: int
 
 
+class DailyItem(BaseModel):
+    date: str
+    reviews: int
+    lapses: int
+    new_cards: int
+    study_seconds: int
+
+
+class DailyTotals(BaseModel):
+    reviews: int
+    lapses: int
+    new_cards: int
+    study_seconds: int
+
+
+class DailyResponse(BaseModel):
+    start: str
+    end: str
+    totals: DailyTotals
+    days: List[DailyItem]
+
+
+class ForecastDay(BaseModel):
+    date: str
+    due: int
+
+
+class ForecastResponse(BaseModel):
+    simulated: bool
+    days: List[ForecastDay]
+
+
 def get_settings(request: Request) -> Settings:
     return request.app.state.settings
 
 
-def fetch_dictionary(conn, dictionary_id: int):
-    return conn.execute(
-        "SELECT id, owner_id, visibility FROM dictionaries WHERE id = ?",
-        (dictionary_id,),
-    ).fetchone()
+def fetch_dictionary(repo: Repository, dictionary_id: int):
+    return repo.get_dictionary(dictionary_id)
 
 
 def can_read(dictionary_row, user_id: str) -> bool:
@@ -38,50 +71,199 @@ def can_read(dictionary_row, user_id: str) -> bool:
     )
 
 
+def load_versions(repo: Repository, dictionary_id: int, user_id: str):
+    return repo.get_data_versions(dictionary_id, user_id)
+
+
+def load_summary_validator(repo: Repository, dictionary_id: int, user_id: str, now: int):
+    """Versions plus the next card to fall due: together they fix every summary field at ``now``."""
+    shared, version = repo.get_data_versions(dictionary_id, user_id)
+    return shared, version, repo.next_due_after(user_id, dictionary_id, now)
+
+
+def load_summary(repo: Repository, dictionary_id: int, user_id: str, now: int) -> dict:
+    dictionary_row = fetch_dictionary(repo, dictionary_id)
+    if not can_read(dictionary_row, user_id):
+        return {"total": 0, "known": 0, "unknown": 0, "due_today": 0, "study_time_total": 0}
+    counters = repo.get_user_dictionary_stats(user_id, dictionary_id)
+    total = counters["character_count"]
+    known = counters["known_count"]
+    unknown = max(total - known, 0)
+    due_today = repo.count_due(user_id, dictionary_id, now)
+    study_time_total = counters["study_seconds"]
+    return {
+        "total": total,
+        "known": known,
+        "unknown": unknown,
+        "due_today": due_today,
+        "study_time_total": study_time_total,
+    }
+
+
 @router.get("/summary", response_model=SummaryResponse)
-def summary(dictionary_id: int, request: Request, current_user: dict = Depends(get_current_user)):
-    settings = get_settings(request)
-    conn = get_connection(settings.sqlite.path)
-    try:
-        dictionary_row = fetch_dictionary(conn, dictionary_id)
-        if not can_read(dictionary_row, current_user["username"]):
-            return {"total": 0, "known": 0, "unknown": 0, "due_today": 0, "study_time_total": 0}
-        total = conn.execute(
-            "SELECT COUNT(*) AS c FROM characters WHERE dictionary_id = ?",
-            (dictionary_id,),
-        ).fetchone()["c"]
-        known = conn.execute(
-            """
-            SELECT COUNT(*) AS c
-            FROM study_records
-            WHERE user_id = ? AND dictionary_id = ? AND repetitions > 0
-            """,
-            (current_user["username"], dictionary_id),
-        ).fetchone()["c"]
-        unknown = max(total - known, 0)
-        now = datetime.now(timezone.utc).isoformat()
-        due_today = conn.execute(
-            """
-            SELECT COUNT(*) AS c
-            FROM study_records
-            WHERE user_id = ? AND dictionary_id = ? AND next_review_at <= ?
-            """,
-            (current_user["username"], dictionary_id, now),
-        ).fetchone()["c"]
-        study_time_total = conn.execute(
-            """
-            SELECT COALESCE(SUM((julianday(ended_at) - julianday(started_at)) * 86400), 0) AS seconds
-            FROM study_sessions
-            WHERE user_id = ? AND dictionary_id = ? AND ended_at IS NOT NULL
-            """,
-            (current_user["username"], dictionary_id),
-        ).fetchone()["seconds"]
-        return {
-            "total": total,
-            "known": known,
-            "unknown": unknown,
-            "due_today": due_today,
-            "study_time_total": int(study_time_total),
-        }
-    finally:
-        conn.close()
+async def summary(
+    dictionary_id: int,
+    request: Request,
+    response: Response,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
+):
+    user_id = current_user["username"]
+    now = now_epoch()
+    validator = await storage.read(load_summary_validator, dictionary_id, user_id, now)
+    etag = make_etag(storage, "summary", dictionary_id, user_id, *validator)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    result = await storage.read(load_summary, dictionary_id, user_id, now)
+    set_etag(response, etag)
+    return result
+
+
+def day_start(now: int, tz_offset: int) -> int:
+    """Epoch seconds of local midnight today, ``tz_offset`` minutes east of UTC."""
+    offset = tz_offset * 60
+    return (now + offset) // 86400 * 86400 - offset
+
+
+def load_forecast(
+    repo: Repository, dictionary_id: int, user_id: str, start: int, days: int, simulate: bool
+) -> Optional[dict]:
+    """Due counts per day, or the card states to simulate from when ``simulate`` is set."""
+    dictionary_row = fetch_dictionary(repo, dictionary_id)
+    if not can_read(dictionary_row, user_id):
+        return {"counts": [0] * days}
+    if not simulate:
+        return {"counts": repo.count_due_by_day(user_id, dictionary_id, start, days)}
+    if dictionary_row["scheduler"] != "sm2":
+        return None
+    return {"states": repo.get_schedule_states(user_id, dictionary_id)}
+
+
+def simulate_counts(simulate_due_counts, states: list, start: int, days: int) -> List[int]:
+    if not states:
+        return [0] * days
+    ease_factor, interval, repetitions, next_review_at = zip(*states)
+    return simulate_due_counts(ease_factor, interval, repetitions, next_review_at, start, days).tolist()
+
+
+@router.get("/forecast", response_model=ForecastResponse)
+async def forecast(
+    request: Request,
+    response: Response,
+    dictionary_id: int,
+    days: int = Query(30, ge=1, le=365),
+    simulate: bool = False,
+    tz_offset: Optional[int] = Query(None, ge=-840, le=840),
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
+):
+    """Reviews due per day for the next ``days`` days.
+
+    Counts come from the stored next review dates. With ``simulate`` the
+    SM-2 schedule is played forward assuming every due card is answered
+    correctly, so cards coming back within the window are counted again.
+    Days are local to ``tz_offset`` minutes east of UTC, by default the
+    server's ``app.utc_offset_minutes``.
+    """
+    simulate_due_counts = None
+    if simulate:
+        try:
+            from app.services.scheduler.sm2_batch import simulate_due_counts
+        except ImportError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Simulated forecasts need NumPy on the server (requirements-optional.txt).",
+            )
+    if tz_offset is None:
+        tz_offset = get_settings(request).app.utc_offset_minutes
+    start = day_start(now_epoch(), tz_offset)
+    user_id = current_user["username"]
+    versions = await storage.read(load_versions, dictionary_id, user_id)
+    etag = make_etag(
+        storage, "forecast", dictionary_id, user_id, start, days, simulate, *versions
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    result = await storage.read(load_forecast, dictionary_id, user_id, start, days, simulate)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Simulated forecasts are only available for SM-2 dictionaries.",
+        )
+    counts = result.get("counts")
+    if counts is None:
+        counts = await run_cpu(request, simulate_counts, simulate_due_counts, result["states"], start, days)
+    offset = tz_offset * 60
+    set_etag(response, etag)
+    return {
+        "simulated": simulate,
+        "days": [
+            {
+                "date": datetime.fromtimestamp(start + offset + day * 86400, timezone.utc).strftime("%Y-%m-%d"),
+                "due": due,
+            }
+            for day, due in enumerate(counts)
+        ],
+    }
+
+
+def load_daily(repo: Repository, dictionary_id: int, user_id: str, first_day: int, last_day: int) -> List[dict]:
+    dictionary_row = fetch_dictionary(repo, dictionary_id)
+    if not can_read(dictionary_row, user_id):
+        return []
+    return repo.get_daily_stats(user_id, dictionary_id, first_day, last_day)
+
+
+@router.get("/daily", response_model=DailyResponse)
+async def daily(
+    request: Request,
+    response: Response,
+    dictionary_id: int,
+    days: int = Query(90, ge=1, le=3660),
+    end: Optional[str] = None,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
+):
+    """Daily reviews, lapses, new cards and study time for ``days`` days ending at ``end``.
+
+    ``end`` is a local date (``YYYY-MM-DD``, default today). Only days with
+    activity are listed; ``totals`` sums the whole range.
+    """
+    utc_offset_minutes = get_settings(request).app.utc_offset_minutes
+    if end is None:
+        last_day = local_day(now_epoch(), utc_offset_minutes)
+    else:
+        try:
+            last_day = date_to_day(end)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="end must be a YYYY-MM-DD date."
+            )
+    first_day = last_day - days + 1
+    user_id = current_user["username"]
+    versions = await storage.read(load_versions, dictionary_id, user_id)
+    etag = make_etag(storage, "daily", dictionary_id, user_id, first_day, last_day, *versions)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    rows = await storage.read(load_daily, dictionary_id, user_id, first_day, last_day)
+    totals = {"reviews": 0, "lapses": 0, "new_cards": 0, "study_seconds": 0}
+    items = []
+    for row in rows:
+        for key in totals:
+            totals[key] += row[key]
+        items.append(
+            {
+                "date": day_to_date(row["day"]),
+                "reviews": row["reviews"],
+                "lapses": row["lapses"],
+                "new_cards": row["new_cards"],
+                "study_seconds": row["study_seconds"],
+            }
+        )
+    set_etag(response, etag)
+    return {
+        "start": day_to_date(first_day),
+        "end": day_to_date(last_day),
+        "totals": totals,
+        "days": items,
+    }
@@ -1,29 +1,39 @@
 """Study queue and review endpoints."""
 
 
+import base64
+import json
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, Request
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from pydantic import BaseModel, conlist
 
 from app.core.auth import get_current_user
 from app.core.config import Settings
-from app.core.db import get_connection
-from app.services.scheduler.sm2 import apply_sm2
+from app.core.executor import run_cpu
+from app.core.timeutil import from_epoch, now_epoch, parse_iso_datetime, to_epoch
+from app.services.dictionary.thuocl import CommonWordsService
+from app.services.scheduler.fsrs import apply_fsrs
+from app.services.scheduler.sm2 import ReviewResult, apply_sm2
+from app.services.storage import Repository, Storage, get_storage
 
 router = APIRouter(prefix="/dictionaries/{dictionary_id}/study", tags=["study"])
 
+MAX_BATCH_REVIEWS = 500
+
 
 class QueueItem(BaseModel):
     hanzi: str
     pinyin: str
     due_at: Optional[str]
     is_new: bool
+    common_words: Optional[list] = None
 
 
 class QueueResponse(BaseModel):
     items: List[QueueItem]
+    next_cursor: Optional[str] = None
 
 
 class ReviewRequest(BaseModel):
@@ -38,6 +48,30 @@ class ReviewResponse(BaseModel):
     ease_factor: float
 
 
+class ReviewBatchItem(BaseModel):
+    hanzi: str
+    rating: int
+    reviewed_at: Optional[str] = None
+    client_id: Optional[str] = None
+
+
+class ReviewBatchRequest(BaseModel):
+    items: conlist(ReviewBatchItem, max_items=MAX_BATCH_REVIEWS)
+
+
+class ReviewBatchResult(BaseModel):
+    client_id: Optional[str]
+    hanzi: str
+    status: str
+    next_review_at: str
+    interval: int
+    ease_factor: float
+
+
+class ReviewBatchResponse(BaseModel):
+    items: List[ReviewBatchResult]
+
+
 class SessionStartResponse(BaseModel):
     session_id: int
     started_at: str
@@ -57,11 +91,12 @@ def get_settings(request: Request) -> Settings:
     return request.app.state.settings
 
 
-def fetch_dictionary(conn, dictionary_id: int):
-    return conn.execute(
-        "SELECT id, owner_id, visibility FROM dictionaries WHERE id = ?",
-        (dictionary_id,),
-    ).fetchone()
+def get_common_words(request: Request) -> CommonWordsService:
+    return request.app.state.common_words
+
+
+def fetch_dictionary(repo: Repository, dictionary_id: int):
+    return repo.get_dictionary(dictionary_id)
 
 
 def can_read(dictionary_row, user_id: str) -> bool:
@@ -70,178 +105,379 @@ def can_read(dictionary_row, user_id: str) -> bool:
     )
 
 
-@router.get("/queue", response_model=QueueResponse)
-def get_queue(dictionary_id: int, request: Request, current_user: dict = Depends(get_current_user)):
-    settings = get_settings(request)
-    now = datetime.now(timezone.utc).isoformat()
-    conn = get_connection(settings.sqlite.path)
-    try:
-        dictionary_row = fetch_dictionary(conn, dictionary_id)
-        if not can_read(dictionary_row, current_user["username"]):
-            return {"items": []}
-        rows = conn.execute(
-            """
-            SELECT c.hanzi, c.pinyin, sr.next_review_at
-            FROM characters c
-            LEFT JOIN study_records sr
-              ON sr.character_id = c.id AND sr.user_id = ? AND sr.dictionary_id = ?
-            WHERE c.dictionary_id = ?
-              AND (sr.next_review_at IS NULL OR sr.next_review_at <= ?)
-            ORDER BY sr.next_review_at IS NULL DESC, sr.next_review_at ASC
-            """,
-            (current_user["username"], dictionary_id, dictionary_id, now),
-        ).fetchall()
-        items = []
-        for row in rows:
-            items.append(
-                {
-                    "hanzi": row["hanzi"],
-                    "pinyin": row["pinyin"],
-                    "due_at": row["next_review_at"],
-                    "is_new": row["next_review_at"] is None,
-                }
-            )
-        return {"items": items}
-    finally:
-        conn.close()
+def encode_cursor(cursor: dict) -> str:
+    raw = json.dumps(cursor, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
 
 
-@router.post("/review", response_model=ReviewResponse)
-def review_card(
-    dictionary_id: int, payload: ReviewRequest, request: Request, current_user: dict = Depends(get_current_user)
-):
-    settings = get_settings(request)
-    conn = get_connection(settings.sqlite.path)
+def decode_cursor(value: str) -> dict:
     try:
-        dictionary_row = fetch_dictionary(conn, dictionary_id)
-        if not can_read(dictionary_row, current_user["username"]):
-            return {"next_review_at": "", "interval": 0, "ease_factor": 2.5}
-        row = conn.execute(
-            "SELECT id FROM characters WHERE dictionary_id = ? AND hanzi = ?",
-            (dictionary_id, payload.hanzi),
-        ).fetchone()
-        if row is None:
-            return {"next_review_at": "", "interval": 0, "ease_factor": 2.5}
-        character_id = row["id"]
-
-        sr = conn.execute(
-            """
-            SELECT ease_factor, interval, repetitions
-            FROM study_records
-            WHERE user_id = ? AND dictionary_id = ? AND character_id = ?
-            """,
-            (current_user["username"], dictionary_id, character_id),
-        ).fetchone()
-
-        ease_factor = sr["ease_factor"] if sr else 2.5
-        interval = sr["interval"] if sr else 0
-        repetitions = sr["repetitions"] if sr else 0
-
-        reviewed_at = parse_iso_datetime(payload.reviewed_at)
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+        cursor = json.loads(raw.decode("utf-8"))
+        due = cursor["due"]
+        if due is not None:
+            next_review_at, character_id = due
+            due = [int(next_review_at), int(character_id)]
+        return {
+            "now": int(cursor["now"]),
+            "new": None if cursor["new"] is None else int(cursor["new"]),
+            "due": due,
+        }
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def load_queue(
+    repo: Repository,
+    dictionary_id: int,
+    user_id: str,
+    limit: int,
+    new_limit: int,
+    cursor: Optional[dict],
+) -> dict:
+    """One page of the queue: up to ``new_limit`` new cards, then due cards.
+
+    The cursor keeps the first page's ``now`` so later pages see the same due
+    set, plus the last character id returned from the new cards and the last
+    (next_review_at, character id) returned from the due cards. A part whose
+    position is None is exhausted.
+    """
+    dictionary_row = fetch_dictionary(repo, dictionary_id)
+    if not can_read(dictionary_row, user_id):
+        return {"items": [], "next_cursor": None}
+    if cursor is None:
+        # Epoch timestamps and ids are never negative.
+        cursor = {"now": now_epoch(), "new": -1, "due": [-1, -1]}
+
+    new_cards = []
+    new_position = cursor["new"] if new_limit > 0 else None
+    if new_position is not None:
+        take = min(new_limit, limit)
+        new_cards = repo.get_new_cards(user_id, dictionary_id, new_position, take + 1)
+        if len(new_cards) > take:
+            new_cards = new_cards[:take]
+            new_position = new_cards[-1]["id"]
+        else:
+            new_position = None
+
+    due_cards = []
+    due_position = cursor["due"]
+    take = limit - len(new_cards)
+    if due_position is not None and take > 0:
+        due_cards = repo.get_due_cards(
+            user_id, dictionary_id, cursor["now"], tuple(due_position), take + 1
+        )
+        if len(due_cards) > take:
+            due_cards = due_cards[:take]
+            due_position = [due_cards[-1]["next_review_at"], due_cards[-1]["id"]]
+        else:
+            due_position = None
+
+    items = []
+    for row in new_cards:
+        items.append({"hanzi": row["hanzi"], "pinyin": row["pinyin"], "due_at": None, "is_new": True})
+    for row in due_cards:
+        items.append(
+            {
+                "hanzi": row["hanzi"],
+                "pinyin": row["pinyin"],
+                "due_at": from_epoch(row["next_review_at"]),
+                "is_new": False,
+            }
+        )
+    next_cursor = None
+    if new_position is not None or due_position is not None:
+        next_cursor = encode_cursor(
+            {"now": cursor["now"], "new": new_position, "due": due_position}
+        )
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def load_scheduler(
+    repo: Repository, user_id: str, dictionary_id: int
+) -> Tuple[str, Optional[List[float]]]:
+    """The dictionary's scheduler name and the user's fitted weights for it, if any."""
+    dictionary_row = fetch_dictionary(repo, dictionary_id)
+    name = dictionary_row["scheduler"] if dictionary_row else "sm2"
+    saved = repo.get_scheduler_parameters(user_id, name) if name == "fsrs" else None
+    return name, saved["parameters"] if saved else None
+
+
+def record_review(
+    repo: Repository,
+    user_id: str,
+    dictionary_id: int,
+    hanzi: str,
+    rating: int,
+    reviewed_at: datetime,
+    scheduler: Optional[Tuple[str, Optional[List[float]]]] = None,
+) -> Optional[ReviewResult]:
+    row = repo.get_character(dictionary_id, hanzi)
+    if row is None:
+        return None
+    character_id = row["id"]
+    if scheduler is None:
+        scheduler = load_scheduler(repo, user_id, dictionary_id)
+    name, parameters = scheduler
+
+    sr = repo.get_study_record(user_id, dictionary_id, character_id)
+
+    ease_factor = sr["ease_factor"] if sr else 2.5
+    interval = sr["interval"] if sr else 0
+    repetitions = sr["repetitions"] if sr else 0
+
+    stability = None
+    difficulty = None
+    if name == "fsrs":
+        last_reviewed_at = sr["last_reviewed_at"] if sr else None
+        fsrs_result = apply_fsrs(
+            stability=sr["stability"] if sr else None,
+            difficulty=sr["difficulty"] if sr else None,
+            repetitions=repetitions,
+            last_reviewed_at=(
+                datetime.fromtimestamp(last_reviewed_at, timezone.utc)
+                if last_reviewed_at is not None
+                else None
+            ),
+            rating=rating,
+            reviewed_at=reviewed_at,
+            parameters=parameters,
+        )
+        stability = fsrs_result.stability
+        difficulty = fsrs_result.difficulty
+        # FSRS does not use the ease factor; it is carried over unchanged.
+        result = ReviewResult(
+            ease_factor=ease_factor,
+            interval=fsrs_result.interval,
+            repetitions=fsrs_result.repetitions,
+            next_review_at=fsrs_result.next_review_at,
+        )
+    else:
         result = apply_sm2(
             ease_factor=ease_factor,
             interval=interval,
             repetitions=repetitions,
-            rating=payload.rating,
+            rating=rating,
             reviewed_at=reviewed_at,
         )
 
-        conn.execute(
-            """
-            INSERT INTO study_records (user_id, dictionary_id, character_id, ease_factor, interval, repetitions, last_reviewed_at, next_review_at, last_rating)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(user_id, dictionary_id, character_id) DO UPDATE SET
-              ease_factor = excluded.ease_factor,
-              interval = excluded.interval,
-              repetitions = excluded.repetitions,
-              last_reviewed_at = excluded.last_reviewed_at,
-              next_review_at = excluded.next_review_at,
-              last_rating = excluded.last_rating
-            """,
-            (
-                current_user["username"],
+    repo.upsert_study_record(
+        user_id,
+        dictionary_id,
+        character_id,
+        result.ease_factor,
+        result.interval,
+        result.repetitions,
+        to_epoch(reviewed_at),
+        to_epoch(result.next_review_at),
+        rating,
+        stability,
+        difficulty,
+    )
+    repo.append_review_log(
+        user_id,
+        dictionary_id,
+        character_id,
+        rating,
+        to_epoch(reviewed_at),
+        (ease_factor, interval, repetitions),
+        (result.ease_factor, result.interval, result.repetitions),
+        to_epoch(result.next_review_at),
+        is_new=sr is None,
+    )
+    return result
+
+
+def record_review_batch(
+    repo: Repository, user_id: str, dictionary_id: int, items: List[dict]
+) -> List[dict]:
+    """Apply reviews in order; items already seen by client_id return their stored result."""
+    scheduler = load_scheduler(repo, user_id, dictionary_id)
+    results = []
+    for item in items:
+        client_id = item["client_id"]
+        if client_id is not None:
+            previous = repo.get_review_submission(user_id, client_id)
+            if previous is not None:
+                results.append(
+                    {
+                        "client_id": client_id,
+                        "hanzi": previous["hanzi"],
+                        "status": "duplicate",
+                        "next_review_at": from_epoch(previous["next_review_at"]),
+                        "interval": previous["interval"],
+                        "ease_factor": previous["ease_factor"],
+                    }
+                )
+                continue
+        result = record_review(
+            repo,
+            user_id,
+            dictionary_id,
+            item["hanzi"],
+            item["rating"],
+            item["reviewed_at"],
+            scheduler,
+        )
+        if result is None:
+            results.append(
+                {
+                    "client_id": client_id,
+                    "hanzi": item["hanzi"],
+                    "status": "not_found",
+                    "next_review_at": "",
+                    "interval": 0,
+                    "ease_factor": 2.5,
+                }
+            )
+            continue
+        next_review_at = to_epoch(result.next_review_at)
+        if client_id is not None:
+            repo.save_review_submission(
+                user_id,
+                client_id,
                 dictionary_id,
-                character_id,
-                result.ease_factor,
+                item["hanzi"],
+                next_review_at,
                 result.interval,
-                result.repetitions,
-                reviewed_at.isoformat(),
-                result.next_review_at.isoformat(),
-                payload.rating,
-            ),
+                result.ease_factor,
+                now_epoch(),
+            )
+        results.append(
+            {
+                "client_id": client_id,
+                "hanzi": item["hanzi"],
+                "status": "applied",
+                "next_review_at": from_epoch(next_review_at),
+                "interval": result.interval,
+                "ease_factor": result.ease_factor,
+            }
         )
-        conn.commit()
-        return {
-            "next_review_at": result.next_review_at.isoformat(),
-            "interval": result.interval,
-            "ease_factor": result.ease_factor,
+    return results
+
+
+def insert_session(repo: Repository, user_id: str, dictionary_id: int, started_at: int) -> int:
+    return repo.create_session(user_id, dictionary_id, started_at)
+
+
+def close_session(repo: Repository, session_id: int, user_id: str, dictionary_id: int, ended_at: int) -> None:
+    repo.end_session(session_id, user_id, dictionary_id, ended_at)
+
+
+@router.get("/queue", response_model=QueueResponse)
+async def get_queue(
+    dictionary_id: int,
+    request: Request,
+    limit: int = Query(20, ge=1, le=200),
+    new_limit: int = Query(10, ge=0, le=200),
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
+):
+    position = decode_cursor(cursor) if cursor else None
+    page = await storage.read(
+        load_queue, dictionary_id, current_user["username"], limit, new_limit, position
+    )
+    includes = set(part.strip() for part in include.split(",")) if include else set()
+    if "info" in includes and page["items"]:
+        settings = get_settings(request)
+        words = await run_cpu(
+            request,
+            get_common_words(request).lookup_many,
+            [item["hanzi"] for item in page["items"]],
+            settings.dictionary.max_common_words,
+        )
+        for item in page["items"]:
+            item["common_words"] = words.get(item["hanzi"], [])
+    return page
+
+
+@router.post("/review", response_model=ReviewResponse)
+async def review_card(
+    dictionary_id: int,
+    payload: ReviewRequest,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
+):
+    dictionary_row = await storage.read(fetch_dictionary, dictionary_id)
+    if not can_read(dictionary_row, current_user["username"]):
+        return {"next_review_at": "", "interval": 0, "ease_factor": 2.5}
+    reviewed_at = parse_iso_datetime(payload.reviewed_at)
+    result = await storage.write(
+        record_review,
+        current_user["username"],
+        dictionary_id,
+        payload.hanzi,
+        payload.rating,
+        reviewed_at,
+    )
+    if result is None:
+        return {"next_review_at": "", "interval": 0, "ease_factor": 2.5}
+    return {
+        "next_review_at": result.next_review_at.isoformat(),
+        "interval": result.interval,
+        "ease_factor": result.ease_factor,
+    }
+
+
+@router.post("/reviews", response_model=ReviewBatchResponse)
+async def review_cards(
+    dictionary_id: int,
+    payload: ReviewBatchRequest,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
+):
+    dictionary_row = await storage.read(fetch_dictionary, dictionary_id)
+    if not can_read(dictionary_row, current_user["username"]):
+        return {"items": []}
+    items = [
+        {
+            "hanzi": item.hanzi,
+            "rating": item.rating,
+            "reviewed_at": parse_iso_datetime(item.reviewed_at),
+            "client_id": item.client_id,
         }
-    finally:
-        conn.close()
+        for item in payload.items
+    ]
+    results = await storage.write(
+        record_review_batch, current_user["username"], dictionary_id, items
+    )
+    return {"items": results}
 
 
 @router.post("/session/start", response_model=SessionStartResponse)
-def start_session(dictionary_id: int, request: Request, current_user: dict = Depends(get_current_user)):
-    settings = get_settings(request)
-    conn = get_connection(settings.sqlite.path)
-    try:
-        dictionary_row = fetch_dictionary(conn, dictionary_id)
-        if not can_read(dictionary_row, current_user["username"]):
-            return {"session_id": 0, "started_at": ""}
-        started_at = datetime.now(timezone.utc).isoformat()
-        cursor = conn.execute(
-            """
-            INSERT INTO study_sessions (user_id, dictionary_id, started_at)
-            VALUES (?, ?, ?)
-            """,
-            (current_user["username"], dictionary_id, started_at),
-        )
-        conn.commit()
-        return {"session_id": cursor.lastrowid, "started_at": started_at}
-    finally:
-        conn.close()
+async def start_session(
+    dictionary_id: int,
+    storage: Storage = Depends(get_storage),
+    current_user: dict = Depends(get_current_user),
+):
+    dictionary_row = await storage.read(fetch_dictionary, dictionary_id)
+    if not can_read(dictionary_row, current_user["username"]):
+        return {"session_id": 0, "started_at": ""}
+    started_at = datetime.now(timezone.utc)
+    session_id = await storage.write(
+        insert_session, current_user["username"], dictionary_id, to_epoch(started_at)
+    )
+    return {"session_id": session_id, "started_at": started_at.isoformat()}
 
 
 @router.post("/session/end", response_model=SessionEndResponse)
-def end_session(
+async def end_session(
     dictionary_id: int,
     payload: SessionEndRequest,
-    request: Request,
+    storage: Storage = Depends(get_storage),
     current_user: dict = Depends(get_current_user),
 ):
-    settings = get_settings(request)
-    conn = get_connection(settings.sqlite.path)
-    try:
-        dictionary_row = fetch_dictionary(conn, dictionary_id)
-        if not can_read(dictionary_row, current_user["username"]):
-            return {"session_id": payload.session_id, "ended_at": ""}
-        ended_at = parse_iso_datetime(payload.ended_at).isoformat()
-        conn.execute(
-            """
-            UPDATE study_sessions
-            SET ended_at = ?
-            WHERE id = ? AND user_id = ? AND dictionary_id = ?
-            """,
-            (ended_at, payload.session_id, current_user["username"], dictionary_id),
-        )
-        conn.commit()
-        return {"session_id": payload.session_id, "ended_at": ended_at}
-    finally:
-        conn.close()
-
-
-def parse_iso_datetime(value: Optional[str]) -> datetime:
-    if not value:
-        return datetime.now(timezone.utc)
-    iso_value = value.replace("Z", "+00:00")
-    for fmt in ("%Y-%m-%dT%H:%M:%S.%f%z", "%Y-%m-%dT%H:%M:%S%z"):
-        try:
-            return datetime.strptime(iso_value, fmt)
-        except ValueError:
-            continue
-    for fmt in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"):
-        try:
-            return datetime.strptime(iso_value, fmt).replace(tzinfo=timezone.utc)
-        except ValueError:
-            continue
-    return datetime.now(timezone.utc)
+    dictionary_row = await storage.read(fetch_dictionary, dictionary_id)
+    if not can_read(dictionary_row, current_user["username"]):
+        return {"session_id": payload.session_id, "ended_at": ""}
+    ended_at = parse_iso_datetime(payload.ended_at)
+    await storage.write(
+        close_session,
+        payload.session_id,
+        current_user["username"],
+        dictionary_id,
+        to_epoch(ended_at),
+    )
+    return {"session_id": payload.session_id, "ended_at": ended_at.isoformat()}
@@ -0,0 +1,98 @@
+"""Fail when an SQL statement in the API code plans a full table scan.
+
+Collects every SQL string literal from the given modules (default:
+``app/api`` and the THUOCL lookup), runs ``EXPLAIN QUERY PLAN`` for each
+against a fresh in-memory database with all migrations applied, and exits
+non-zero if any plan contains a ``SCAN`` step.
+"""
+
+import argparse
+import ast
+import os
+import re
+import sqlite3
+import sys
+from typing import Iterator, List, Tuple
+
+from app.core.migrations import apply_migrations
+from app.services.dictionary.thuocl_import import init_db as init_thuocl_db
+
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_PATHS = [
+    os.path.join(APP_DIR, "api"),
+    os.path.join(APP_DIR, "services", "dictionary", "thuocl.py"),
+    os.path.join(APP_DIR, "services", "storage", "sqlite.py"),
+]
+
+SQL_START = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+SCAN_STEP = re.compile(r"^SCAN\b(?! CONSTANT ROW)")
+
+
+def iter_python_files(paths: List[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith(".py"):
+                        yield os.path.join(root, name)
+        elif path.endswith(".py"):
+            yield path
+
+
+def iter_sql_literals(path: str) -> Iterator[Tuple[int, str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            if SQL_START.match(node.value):
+                yield node.lineno, node.value
+
+
+def build_database() -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    apply_migrations(conn)
+    init_thuocl_db(conn)
+    conn.commit()
+    return conn
+
+
+def full_scans(conn: sqlite3.Connection, sql: str) -> List[str]:
+    params = (None,) * sql.count("?")
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [row[3] for row in rows if SCAN_STEP.match(row[3])]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check query plans for full table scans.")
+    parser.add_argument("paths", nargs="*", default=DEFAULT_PATHS, help="Modules or packages to scan")
+    args = parser.parse_args()
+
+    conn = build_database()
+    checked = 0
+    failures = []
+    try:
+        for path in iter_python_files(args.paths):
+            for lineno, sql in iter_sql_literals(path):
+                checked += 1
+                try:
+                    scans = full_scans(conn, sql)
+                except sqlite3.Error as exc:
+                    failures.append((path, lineno, [f"error: {exc}"]))
+                    continue
+                if scans:
+                    failures.append((path, lineno, scans))
+    finally:
+        conn.close()
+
+    for path, lineno, details in failures:
+        print(f"{os.path.relpath(path, APP_DIR)}:{lineno}")
+        for detail in details:
+            print(f"    {detail}")
+    print(f"Checked {checked} statements, {len(failures)} with full scans.")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""Check the maintained stats counters against the raw tables.
+
+``dictionaries.character_count`` and ``user_dictionary_stats`` (known cards
+and study seconds per user and dictionary) are updated by the write paths so
+``/stats/summary`` can read them by primary key. This recomputes every
+counter from ``characters``, ``study_records`` and ``study_sessions``,
+reports any drift and, with ``--fix``, rebuilds the drifted dictionaries.
+Exits non-zero when drift is found and not fixed.
+
+The ``daily_stats`` rollups are checked the same way against ``review_log``
+and ``study_sessions``, bucketed by ``app.utc_offset_minutes``. They only
+exist from the migration that added them on, so the first ``--fix`` run
+backfills them from the review log. Reviews made before the log existed
+cannot be recovered.
+
+    python -m app.core.check_stats [--dictionary 1] [--fix]
+"""
+
+
+import argparse
+import sqlite3
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import get_config_path, load_config
+from app.core.db import connect
+from app.core.timeutil import day_to_date
+
+
+UserKey = Tuple[int, str]
+DayKey = Tuple[int, str, int]
+
+USER_COUNTERS = """
+    SELECT dictionary_id, user_id, SUM(known_count) AS known_count, SUM(study_seconds) AS study_seconds
+    FROM (
+        SELECT dictionary_id, user_id, COUNT(*) AS known_count, 0 AS study_seconds
+        FROM study_records
+        WHERE repetitions > 0 AND (? IS NULL OR dictionary_id = ?)
+        GROUP BY dictionary_id, user_id
+        UNION ALL
+        SELECT dictionary_id, user_id, 0, SUM(ended_at - started_at)
+        FROM study_sessions
+        WHERE ended_at IS NOT NULL AND (? IS NULL OR dictionary_id = ?)
+        GROUP BY dictionary_id, user_id
+    )
+    GROUP BY dictionary_id, user_id
+"""
+
+# Same definitions as upsert_study_record: a new card is a review of a card
+# without a study record (logged as is_new), a lapse a failed review of a
+# card that was known.
+DAILY_ROLLUPS = """
+    SELECT dictionary_id, user_id, day, SUM(reviews), SUM(lapses), SUM(new_cards), SUM(study_seconds)
+    FROM (
+        SELECT l.dictionary_id, l.user_id, (l.reviewed_at + ?) / 86400 AS day,
+               COUNT(*) AS reviews,
+               SUM(l.rating < 3 AND l.repetitions_before > 0) AS lapses,
+               SUM(l.is_new) AS new_cards,
+               0 AS study_seconds
+        FROM review_log l
+        WHERE ? IS NULL OR l.dictionary_id = ?
+        GROUP BY l.dictionary_id, l.user_id, day
+        UNION ALL
+        SELECT dictionary_id, user_id, (started_at + ?) / 86400, 0, 0, 0, SUM(ended_at - started_at)
+        FROM study_sessions
+        WHERE ended_at IS NOT NULL AND (? IS NULL OR dictionary_id = ?)
+        GROUP BY dictionary_id, user_id, (started_at + ?) / 86400
+    )
+    GROUP BY dictionary_id, user_id, day
+"""
+
+
+def expected_counters(
+    conn: sqlite3.Connection, dictionary_id: Optional[int] = None
+) -> Tuple[Dict[int, int], Dict[UserKey, Tuple[int, int]]]:
+    """Counters recomputed from the raw tables: ({dictionary: characters}, {(dictionary, user): (known, seconds)})."""
+    characters = {
+        row[0]: row[1]
+        for row in conn.execute(
+            """
+            SELECT d.id, (SELECT COUNT(*) FROM characters c WHERE c.dictionary_id = d.id)
+            FROM dictionaries d
+            WHERE ? IS NULL OR d.id = ?
+            """,
+            (dictionary_id, dictionary_id),
+        )
+    }
+    users = {
+        (row[0], row[1]): (row[2], row[3])
+        for row in conn.execute(
+            USER_COUNTERS, (dictionary_id, dictionary_id, dictionary_id, dictionary_id)
+        )
+    }
+    return characters, users
+
+
+def stored_counters(
+    conn: sqlite3.Connection, dictionary_id: Optional[int] = None
+) -> Tuple[Dict[int, int], Dict[UserKey, Tuple[int, int]]]:
+    characters = {
+        row[0]: row[1]
+        for row in conn.execute(
+            "SELECT id, character_count FROM dictionaries WHERE ? IS NULL OR id = ?",
+            (dictionary_id, dictionary_id),
+        )
+    }
+    users = {
+        (row[0], row[1]): (row[2], row[3])
+        for row in conn.execute(
+            """
+            SELECT dictionary_id, user_id, known_count, study_seconds
+            FROM user_dictionary_stats
+            WHERE ? IS NULL OR dictionary_id = ?
+            """,
+            (dictionary_id, dictionary_id),
+        )
+    }
+    return characters, users
+
+
+def find_drift(expected, stored) -> List[Tuple[int, str]]:
+    """(dictionary_id, description) for every counter that differs."""
+    expected_characters, expected_users = expected
+    stored_characters, stored_users = stored
+    drift = []
+    for dictionary_id, count in sorted(expected_characters.items()):
+        if stored_characters.get(dictionary_id) != count:
+            drift.append(
+                (
+                    dictionary_id,
+                    f"character_count {stored_characters.get(dictionary_id)}, expected {count}",
+                )
+            )
+    for key in sorted(set(expected_users) | set(stored_users)):
+        want = expected_users.get(key, (0, 0))
+        have = stored_users.get(key, (0, 0))
+        if want != have:
+            drift.append(
+                (
+                    key[0],
+                    f"user {key[1]}: known_count {have[0]}, expected {want[0]}; "
+                    f"study_seconds {have[1]}, expected {want[1]}",
+                )
+            )
+    return drift
+
+
+def expected_daily(
+    conn: sqlite3.Connection, utc_offset_minutes: int, dictionary_id: Optional[int] = None
+) -> Dict[DayKey, Tuple[int, int, int, int]]:
+    """{(dictionary, user, day): (reviews, lapses, new_cards, study_seconds)} from the raw tables."""
+    offset = utc_offset_minutes * 60
+    return {
+        (row[0], row[1], row[2]): tuple(row[3:])
+        for row in conn.execute(
+            DAILY_ROLLUPS,
+            (offset, dictionary_id, dictionary_id, offset, dictionary_id, dictionary_id, offset),
+        )
+    }
+
+
+def stored_daily(
+    conn: sqlite3.Connection, dictionary_id: Optional[int] = None
+) -> Dict[DayKey, Tuple[int, int, int, int]]:
+    return {
+        (row[0], row[1], row[2]): tuple(row[3:])
+        for row in conn.execute(
+            """
+            SELECT dictionary_id, user_id, day, reviews, lapses, new_cards, study_seconds
+            FROM daily_stats
+            WHERE ? IS NULL OR dictionary_id = ?
+            """,
+            (dictionary_id, dictionary_id),
+        )
+    }
+
+
+def find_daily_drift(expected, stored) -> List[Tuple[int, str]]:
+    """(dictionary_id, description) for every rollup row that differs."""
+    drift = []
+    empty = (0, 0, 0, 0)
+    for key in sorted(set(expected) | set(stored)):
+        want = expected.get(key, empty)
+        have = stored.get(key, empty)
+        if want != have:
+            drift.append(
+                (
+                    key[0],
+                    f"user {key[1]} on {day_to_date(key[2])}: "
+                    f"(reviews, lapses, new_cards, study_seconds) {have}, expected {want}",
+                )
+            )
+    return drift
+
+
+def bump_shared_version(conn: sqlite3.Connection, dictionary_id: int) -> None:
+    """Invalidate cached stats responses and due index entries for the dictionary (both check this counter)."""
+    conn.execute(
+        """
+        INSERT INTO data_versions (dictionary_id, user_id, version)
+        VALUES (?, '', 1)
+        ON CONFLICT(dictionary_id, user_id) DO UPDATE SET version = version + 1
+        """,
+        (dictionary_id,),
+    )
+
+
+def rebuild_counters(conn: sqlite3.Connection, dictionary_id: int) -> None:
+    """Recompute one dictionary's counters; the caller commits."""
+    bump_shared_version(conn, dictionary_id)
+    conn.execute(
+        """
+        UPDATE dictionaries
+        SET character_count = (SELECT COUNT(*) FROM characters c WHERE c.dictionary_id = dictionaries.id)
+        WHERE id = ?
+        """,
+        (dictionary_id,),
+    )
+    conn.execute("DELETE FROM user_dictionary_stats WHERE dictionary_id = ?", (dictionary_id,))
+    conn.execute(
+        "INSERT INTO user_dictionary_stats (dictionary_id, user_id, known_count, study_seconds) "
+        + USER_COUNTERS,
+        (dictionary_id, dictionary_id, dictionary_id, dictionary_id),
+    )
+
+
+def rebuild_daily_stats(conn: sqlite3.Connection, dictionary_id: int, utc_offset_minutes: int) -> None:
+    """Recompute one dictionary's daily rollups from the review log and sessions; the caller commits."""
+    offset = utc_offset_minutes * 60
+    bump_shared_version(conn, dictionary_id)
+    conn.execute("DELETE FROM daily_stats WHERE dictionary_id = ?", (dictionary_id,))
+    conn.execute(
+        "INSERT INTO daily_stats "
+        "(dictionary_id, user_id, day, reviews, lapses, new_cards, study_seconds) "
+        + DAILY_ROLLUPS,
+        (offset, dictionary_id, dictionary_id, offset, dictionary_id, dictionary_id, offset),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check stats counters against the raw tables.")
+    parser.add_argument("--dictionary", type=int, default=None, help="Only this dictionary")
+    parser.add_argument("--fix", action="store_true", help="Rebuild dictionaries that drifted")
+    args = parser.parse_args()
+
+    settings = load_config(get_config_path())
+    offset = settings.app.utc_offset_minutes
+    conn = connect(settings.sqlite)
+    try:
+        # One read transaction so the two snapshots agree.
+        conn.execute("BEGIN")
+        drift = find_drift(
+            expected_counters(conn, args.dictionary), stored_counters(conn, args.dictionary)
+        )
+        daily_drift = find_daily_drift(
+            expected_daily(conn, offset, args.dictionary), stored_daily(conn, args.dictionary)
+        )
+        conn.rollback()
+        for dictionary_id, detail in drift + daily_drift:
+            print(f"dictionary {dictionary_id}: {detail}")
+        drifted = sorted(set(dictionary_id for dictionary_id, _ in drift + daily_drift))
+        if drifted and args.fix:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for dictionary_id in sorted(set(dictionary_id for dictionary_id, _ in drift)):
+                    rebuild_counters(conn, dictionary_id)
+                for dictionary_id in sorted(set(dictionary_id for dictionary_id, _ in daily_drift)):
+                    rebuild_daily_stats(conn, dictionary_id, offset)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            print(f"Rebuilt counters for {len(drifted)} dictionaries.")
+    finally:
+        conn.close()
+
+    if not drifted:
+        print("All counters match.")
+    elif not args.fix:
+        print(f"Drift in {len(drifted)} dictionaries; rerun with --fix to rebuild them.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
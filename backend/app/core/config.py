@@ -8,10 +8,19 @@ import yaml
 
 
 class AppConfig:
-    def __init__(self, name: str, secret_key: str, token_expire_minutes: int) -> None:
+    def __init__(
+        self,
+        name: str,
+        secret_key: str,
+        token_expire_minutes: int,
+        cpu_workers: int = 2,
+        utc_offset_minutes: int = 0,
+    ) -> None:
         self.name = name
         self.secret_key = secret_key
         self.token_expire_minutes = token_expire_minutes
+        self.cpu_workers = cpu_workers
+        self.utc_offset_minutes = utc_offset_minutes
 
 
 class AccountConfig:
@@ -21,14 +30,59 @@ class AccountConfig:
 
 
 class SqliteConfig:
-    def __init__(self, path: str) -> None:
+    def __init__(
+        self,
+        path: str,
+        pool_timeout: float = 30.0,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        mmap_size: int = 268435456,
+        cache_size: int = -16000,
+        busy_timeout: int = 5000,
+        foreign_keys: bool = True,
+        health_check_interval: float = 30.0,
+        writer_batch_size: int = 64,
+        writer_batch_window_ms: float = 2.0,
+        executor_workers: int = 5,
+        read_pool_size: int = 5,
+    ) -> None:
         self.path = path
+        self.pool_timeout = pool_timeout
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.busy_timeout = busy_timeout
+        self.foreign_keys = foreign_keys
+        self.health_check_interval = health_check_interval
+        self.writer_batch_size = writer_batch_size
+        self.writer_batch_window_ms = writer_batch_window_ms
+        self.executor_workers = executor_workers
+        self.read_pool_size = read_pool_size
+
+
+class StorageConfig:
+    def __init__(self, backend: str = "sqlite", due_index_size: int = 256) -> None:
+        self.backend = backend
+        self.due_index_size = due_index_size
 
 
 class DictionaryConfig:
-    def __init__(self, source: str, max_common_words: int) -> None:
+    def __init__(
+        self,
+        source: str,
+        max_common_words: int,
+        pinyin_table: str,
+        common_words_cache_size: int,
+        top_words_k: int,
+        top_words_snapshot: str,
+    ) -> None:
         self.source = source
         self.max_common_words = max_common_words
+        self.pinyin_table = pinyin_table
+        self.common_words_cache_size = common_words_cache_size
+        self.top_words_k = top_words_k
+        self.top_words_snapshot = top_words_snapshot
 
 
 class CORSConfig:
@@ -53,12 +107,14 @@ class Settings:
         sqlite: SqliteConfig,
         dictionary: DictionaryConfig,
         cors: CORSConfig,
+        storage: StorageConfig,
     ) -> None:
         self.app = app
         self.accounts = accounts
         self.sqlite = sqlite
         self.dictionary = dictionary
         self.cors = cors
+        self.storage = storage
 
 
 def _require_key(data: Dict[str, Any], key: str) -> Any:
@@ -81,6 +137,8 @@ def load_config(path: str) -> Settings:
         name=_require_key(app_raw, "name"),
         secret_key=_require_key(app_raw, "secret_key"),
         token_expire_minutes=int(_require_key(app_raw, "token_expire_minutes")),
+        cpu_workers=int(app_raw.get("cpu_workers", 2)),
+        utc_offset_minutes=int(app_raw.get("utc_offset_minutes", 0)),
     )
     accounts = [
         AccountConfig(
@@ -89,14 +147,49 @@ def load_config(path: str) -> Settings:
         )
         for item in accounts_raw
     ]
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
     sqlite_path = _require_key(sqlite_raw, "path")
     if not os.path.isabs(sqlite_path):
-        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
         sqlite_path = os.path.join(base_dir, sqlite_path)
-    sqlite = SqliteConfig(path=sqlite_path)
+    # pool_size is the pre-read-pool name; it no longer sizes a pool of its own.
+    read_pool_size = int(sqlite_raw.get("read_pool_size", sqlite_raw.get("pool_size", 5)))
+    sqlite = SqliteConfig(
+        path=sqlite_path,
+        pool_timeout=float(sqlite_raw.get("pool_timeout", 30.0)),
+        journal_mode=str(sqlite_raw.get("journal_mode", "WAL")),
+        synchronous=str(sqlite_raw.get("synchronous", "NORMAL")),
+        mmap_size=int(sqlite_raw.get("mmap_size", 268435456)),
+        cache_size=int(sqlite_raw.get("cache_size", -16000)),
+        busy_timeout=int(sqlite_raw.get("busy_timeout", 5000)),
+        foreign_keys=bool(sqlite_raw.get("foreign_keys", True)),
+        health_check_interval=float(sqlite_raw.get("health_check_interval", 30.0)),
+        writer_batch_size=int(sqlite_raw.get("writer_batch_size", 64)),
+        writer_batch_window_ms=float(sqlite_raw.get("writer_batch_window_ms", 2.0)),
+        executor_workers=int(sqlite_raw.get("executor_workers", read_pool_size)),
+        read_pool_size=read_pool_size,
+    )
+    pinyin_table = str(dict_raw.get("pinyin_table", "backend/data/pinyin.bin"))
+    if not os.path.isabs(pinyin_table):
+        pinyin_table = os.path.join(base_dir, pinyin_table)
+    max_common_words = int(_require_key(dict_raw, "max_common_words"))
+    top_words_k = int(dict_raw.get("top_words_k", 10))
+    if top_words_k > 0:
+        top_words_k = max(top_words_k, max_common_words)
+    top_words_snapshot = str(dict_raw.get("top_words_snapshot", "backend/data/top_words.bin"))
+    if not os.path.isabs(top_words_snapshot):
+        top_words_snapshot = os.path.join(base_dir, top_words_snapshot)
     dictionary = DictionaryConfig(
         source=_require_key(dict_raw, "source"),
-        max_common_words=int(_require_key(dict_raw, "max_common_words")),
+        max_common_words=max_common_words,
+        pinyin_table=pinyin_table,
+        common_words_cache_size=int(dict_raw.get("common_words_cache_size", 8192)),
+        top_words_k=top_words_k,
+        top_words_snapshot=top_words_snapshot,
+    )
+    storage_raw = raw.get("storage") or {}
+    storage = StorageConfig(
+        backend=str(storage_raw.get("backend", "sqlite")),
+        due_index_size=int(storage_raw.get("due_index_size", 256)),
     )
     cors = CORSConfig(
         env=_require_key(cors_raw, "env"),
@@ -111,6 +204,7 @@ def load_config(path: str) -> Settings:
         sqlite=sqlite,
         dictionary=dictionary,
         cors=cors,
+        storage=storage,
     )
 
 
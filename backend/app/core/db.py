@@ -3,72 +3,356 @@
 
 import os
 import sqlite3
-from typing import Iterator
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from urllib.request import pathname2url
 
 
-def get_connection(db_path: str) -> sqlite3.Connection:
-    if db_path:
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    conn = sqlite3.connect(db_path)
+class PoolTimeoutError(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    """Bounded pool of pre-configured SQLite connections.
+
+    Connections are created lazily up to ``size`` and tuned once at creation
+    (WAL journal, synchronous level, mmap, page cache, busy timeout and
+    foreign keys), so requests skip connection setup and reuse a warm page
+    cache. With ``read_only`` the connections are opened ``mode=ro`` with
+    ``PRAGMA query_only`` so they can never take the write lock.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = 5,
+        timeout: float = 30.0,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        mmap_size: int = 268435456,
+        cache_size: int = -16000,
+        busy_timeout: int = 5000,
+        foreign_keys: bool = True,
+        health_check_interval: float = 30.0,
+        read_only: bool = False,
+    ) -> None:
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.busy_timeout = busy_timeout
+        self.foreign_keys = foreign_keys
+        self.health_check_interval = health_check_interval
+        self.read_only = read_only
+
+        self._cond = threading.Condition()
+        self._idle: List[sqlite3.Connection] = []
+        self._last_used: Dict[int, float] = {}
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+
+        self._acquired_total = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._timeouts = 0
+        self._replaced = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        return open_connection(
+            self.db_path,
+            journal_mode=self.journal_mode,
+            synchronous=self.synchronous,
+            mmap_size=self.mmap_size,
+            cache_size=self.cache_size,
+            busy_timeout=self.busy_timeout,
+            foreign_keys=self.foreign_keys,
+            read_only=self.read_only,
+        )
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        self._last_used.pop(id(conn), None)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def acquire(self) -> sqlite3.Connection:
+        started = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError("Connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    conn = None
+                    break
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._wait_time_total += time.monotonic() - started
+                    raise PoolTimeoutError(
+                        f"Timed out after {self.timeout}s waiting for a database connection"
+                    )
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._acquired_total += 1
+            if waited:
+                self._wait_time_total += time.monotonic() - started
+            last_used = self._last_used.get(id(conn)) if conn is not None else None
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif (
+                last_used is not None
+                and time.monotonic() - last_used > self.health_check_interval
+                and not self._is_healthy(conn)
+            ):
+                self._discard(conn)
+                conn = self._connect()
+                with self._cond:
+                    self._replaced += 1
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        healthy = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            healthy = False
+        with self._cond:
+            self._in_use -= 1
+            if healthy and not self._closed:
+                self._last_used[id(conn)] = time.monotonic()
+                self._idle.append(conn)
+            else:
+                self._created -= 1
+                self._discard(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "read_only": self.read_only,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "acquired_total": self._acquired_total,
+                "waits": self._waits,
+                "wait_time_total": round(self._wait_time_total, 6),
+                "timeouts": self._timeouts,
+                "replaced": self._replaced,
+            }
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            for conn in idle:
+                self._discard(conn)
+            self._cond.notify_all()
+
+
+def open_connection(
+    db_path: str,
+    journal_mode: str = "WAL",
+    synchronous: str = "NORMAL",
+    mmap_size: int = 268435456,
+    cache_size: int = -16000,
+    busy_timeout: int = 5000,
+    foreign_keys: bool = True,
+    isolation_level: Optional[str] = "",
+    read_only: bool = False,
+) -> sqlite3.Connection:
+    if read_only:
+        # The journal mode is persistent in the file and cannot be changed
+        # from a read-only handle; the writer sets it.
+        conn = sqlite3.connect(
+            f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro",
+            uri=True,
+            timeout=busy_timeout / 1000.0,
+            check_same_thread=False,
+            isolation_level=isolation_level,
+        )
+        journal_mode = None
+    else:
+        if db_path and db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = sqlite3.connect(
+            db_path,
+            timeout=busy_timeout / 1000.0,
+            check_same_thread=False,
+            isolation_level=isolation_level,
+        )
     conn.row_factory = sqlite3.Row
+    configure_connection(
+        conn,
+        journal_mode=journal_mode,
+        synchronous=synchronous,
+        mmap_size=mmap_size,
+        cache_size=cache_size,
+        busy_timeout=busy_timeout,
+        foreign_keys=foreign_keys,
+    )
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
     return conn
 
 
-def init_schema(conn: sqlite3.Connection) -> None:
-    conn.executescript(
-        """
-        CREATE TABLE IF NOT EXISTS dictionaries (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            owner_id TEXT NOT NULL,
-            name TEXT NOT NULL,
-            visibility TEXT NOT NULL DEFAULT 'private',
-            created_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL,
-            UNIQUE(owner_id, name)
-        );
-
-        CREATE TABLE IF NOT EXISTS characters (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            dictionary_id INTEGER NOT NULL,
-            hanzi TEXT NOT NULL,
-            pinyin TEXT NOT NULL,
-            source TEXT NOT NULL DEFAULT 'offline',
-            cached_at TEXT NOT NULL,
-            UNIQUE(dictionary_id, hanzi),
-            FOREIGN KEY(dictionary_id) REFERENCES dictionaries(id)
-        );
-
-        CREATE TABLE IF NOT EXISTS study_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            dictionary_id INTEGER NOT NULL,
-            character_id INTEGER NOT NULL,
-            ease_factor REAL NOT NULL DEFAULT 2.5,
-            interval INTEGER NOT NULL DEFAULT 0,
-            repetitions INTEGER NOT NULL DEFAULT 0,
-            last_reviewed_at TEXT,
-            next_review_at TEXT,
-            last_rating INTEGER,
-            UNIQUE(user_id, dictionary_id, character_id),
-            FOREIGN KEY(character_id) REFERENCES characters(id),
-            FOREIGN KEY(dictionary_id) REFERENCES dictionaries(id)
-        );
-
-        CREATE TABLE IF NOT EXISTS study_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            dictionary_id INTEGER NOT NULL,
-            started_at TEXT NOT NULL,
-            ended_at TEXT,
-            total_cards INTEGER NOT NULL DEFAULT 0,
-            known_count INTEGER NOT NULL DEFAULT 0,
-            unknown_count INTEGER NOT NULL DEFAULT 0,
-            FOREIGN KEY(dictionary_id) REFERENCES dictionaries(id)
-        );
-        """
+def configure_connection(
+    conn: sqlite3.Connection,
+    journal_mode: Optional[str],
+    synchronous: str,
+    mmap_size: int,
+    cache_size: int,
+    busy_timeout: int,
+    foreign_keys: bool,
+) -> None:
+    if journal_mode:
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    conn.execute(f"PRAGMA synchronous = {synchronous}")
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    conn.execute(f"PRAGMA cache_size = {int(cache_size)}")
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+    conn.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+
+
+def connect(config) -> sqlite3.Connection:
+    """One read-write connection with the configured pragmas, for migrations and CLIs.
+
+    The API never writes through a pool: reads use the read-only pool and
+    writes go through the writer thread (``app.core.writer``).
+    """
+    return open_connection(
+        config.path,
+        journal_mode=config.journal_mode,
+        synchronous=config.synchronous,
+        mmap_size=config.mmap_size,
+        cache_size=config.cache_size,
+        busy_timeout=config.busy_timeout,
+        foreign_keys=config.foreign_keys,
     )
 
 
+def create_read_pool(config) -> ConnectionPool:
+    return ConnectionPool(
+        config.path,
+        size=config.read_pool_size,
+        timeout=config.pool_timeout,
+        journal_mode=config.journal_mode,
+        synchronous=config.synchronous,
+        mmap_size=config.mmap_size,
+        cache_size=config.cache_size,
+        busy_timeout=config.busy_timeout,
+        foreign_keys=config.foreign_keys,
+        health_check_interval=config.health_check_interval,
+        read_only=True,
+    )
+
+
+# One statement per entry: executescript would commit any open transaction,
+# and the migration runner applies this inside its own.
+SCHEMA_STATEMENTS = (
+    """
+    CREATE TABLE IF NOT EXISTS dictionaries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        visibility TEXT NOT NULL DEFAULT 'private',
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        UNIQUE(owner_id, name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS characters (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        dictionary_id INTEGER NOT NULL,
+        hanzi TEXT NOT NULL,
+        pinyin TEXT NOT NULL,
+        source TEXT NOT NULL DEFAULT 'offline',
+        cached_at TEXT NOT NULL,
+        UNIQUE(dictionary_id, hanzi),
+        FOREIGN KEY(dictionary_id) REFERENCES dictionaries(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS study_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        dictionary_id INTEGER NOT NULL,
+        character_id INTEGER NOT NULL,
+        ease_factor REAL NOT NULL DEFAULT 2.5,
+        interval INTEGER NOT NULL DEFAULT 0,
+        repetitions INTEGER NOT NULL DEFAULT 0,
+        last_reviewed_at TEXT,
+        next_review_at TEXT,
+        last_rating INTEGER,
+        UNIQUE(user_id, dictionary_id, character_id),
+        FOREIGN KEY(character_id) REFERENCES characters(id),
+        FOREIGN KEY(dictionary_id) REFERENCES dictionaries(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS study_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        dictionary_id INTEGER NOT NULL,
+        started_at TEXT NOT NULL,
+        ended_at TEXT,
+        total_cards INTEGER NOT NULL DEFAULT 0,
+        known_count INTEGER NOT NULL DEFAULT 0,
+        unknown_count INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY(dictionary_id) REFERENCES dictionaries(id)
+    )
+    """,
+)
+
+
+def init_schema(conn: sqlite3.Connection) -> None:
+    for statement in SCHEMA_STATEMENTS:
+        conn.execute(statement)
+
+
 def iter_rows(conn: sqlite3.Connection, query: str, params: tuple = ()) -> Iterator[sqlite3.Row]:
     cursor = conn.execute(query, params)
     for row in cursor:
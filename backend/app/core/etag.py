@@ -0,0 +1,56 @@
+"""ETag helpers for conditional GETs.
+
+Validators are built from the ``data_versions`` counters the repository bumps
+on every write, so a matching ``If-None-Match`` is answered with 304 after
+one indexed lookup instead of running the endpoint's queries. The user and
+the storage's ``etag_epoch`` are mixed in: one browser may be shared by
+several accounts, and validators must not carry over to a different database.
+With SQLite the epoch is stored in the database, so every worker builds the
+same validator and cached responses survive restarts; the memory backend
+picks a new one per process because its counters start over.
+"""
+
+
+import hashlib
+
+from fastapi import Request, Response, status
+
+
+# Responses are per user and must be revalidated before reuse.
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(storage, *parts) -> str:
+    digest = hashlib.sha1(
+        "|".join([storage.etag_epoch] + [str(part) for part in parts]).encode("utf-8")
+    ).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # "*" is not honoured: it would answer 304 before the handler has checked
+    # that the resource exists and is readable.
+    # Weak comparison: ignore W/ prefixes on either side.
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL},
+    )
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
@@ -0,0 +1,66 @@
+"""Bounded executors for database and CPU-bound work off the event loop."""
+
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from fastapi import Request
+
+from app.core.db import ConnectionPool
+from app.core.writer import WriteQueue
+
+
+class DatabaseExecutor:
+    """Runs blocking SQLite work for async route handlers.
+
+    Reads run ``fn(conn, *args)`` on a pooled connection inside a dedicated
+    thread pool whose size caps concurrent database calls, independent of
+    Starlette's shared thread pool. Writes are handed to the single writer
+    thread and awaited without holding any thread.
+    """
+
+    def __init__(self, pool: ConnectionPool, writer: WriteQueue, max_workers: int) -> None:
+        self.pool = pool
+        self.writer = writer
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sqlite-read")
+
+    def _run_read(self, fn: Callable[..., Any], args: tuple) -> Any:
+        with self.pool.connection() as conn:
+            return fn(conn, *args)
+
+    async def read(self, fn: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, self._run_read, fn, args)
+
+    async def write(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.wrap_future(self.writer.submit(fn, *args))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+def create_db_executor(config, pool: ConnectionPool, writer: WriteQueue) -> DatabaseExecutor:
+    return DatabaseExecutor(pool, writer, max_workers=config.executor_workers)
+
+
+def create_cpu_executor(config) -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=config.cpu_workers, thread_name_prefix="cpu")
+
+
+async def run_cpu(request: Request, fn: Callable[..., Any], *args: Any) -> Any:
+    """Run CPU-bound work (bcrypt, pinyin) on its own bounded pool."""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(request.app.state.cpu_executor, fn, *args)
+
+
+def create_optimize_executor() -> ThreadPoolExecutor:
+    """One thread for FSRS parameter fits, so a long fit never occupies the CPU pool."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="optimize")
+
+
+async def run_optimize(request: Request, fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a parameter fit on the single optimizer thread."""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(request.app.state.optimize_executor, fn, *args)
@@ -2,15 +2,15 @@
 
 
 from app.core.config import get_config_path, load_config
-from app.core.db import get_connection, init_schema
+from app.core.db import connect
+from app.core.migrations import apply_migrations
 
 
 def main() -> None:
     settings = load_config(get_config_path())
-    conn = get_connection(settings.sqlite.path)
+    conn = connect(settings.sqlite)
     try:
-        init_schema(conn)
-        conn.commit()
+        apply_migrations(conn)
     finally:
         conn.close()
 
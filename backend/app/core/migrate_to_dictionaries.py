@@ -5,7 +5,6 @@ import sqlite3
 from typing import Dict, List, Tuple
 
 from app.core.config import get_config_path, load_config
-from app.core.db import get_connection
 
 
 DEFAULT_DICT_NAME = "我的字库"
@@ -228,7 +227,10 @@ def main() -> None:
 
     settings = load_config(get_config_path())
     users = [account.username for account in settings.accounts]
-    conn = get_connection(settings.sqlite.path)
+    # A plain connection: foreign keys must stay off, because the *_new tables
+    # only reference the right parents once finalize has renamed them.
+    conn = sqlite3.connect(settings.sqlite.path)
+    conn.row_factory = sqlite3.Row
     try:
         if table_exists(conn, "dictionaries"):
             raise RuntimeError("Migration already applied (dictionaries table exists).")
@@ -0,0 +1,440 @@
+"""Versioned schema migrations."""
+
+import argparse
+import sqlite3
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+from app.core.config import get_config_path, load_config
+from app.core.db import connect, init_schema
+from app.core.timeutil import to_epoch, try_parse_iso_datetime
+
+
+class Migration:
+    def __init__(self, version: int, name: str, apply: Callable[[sqlite3.Connection], None]) -> None:
+        self.version = version
+        self.name = name
+        self.apply = apply
+
+
+def table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
+        (name,),
+    ).fetchone()
+    return row is not None
+
+
+def create_hot_path_indexes(conn: sqlite3.Connection) -> None:
+    statements = [
+        # Due queue, known/due counts: equality on (user, dictionary), range on next_review_at.
+        "CREATE INDEX IF NOT EXISTS idx_study_records_due "
+        "ON study_records(user_id, dictionary_id, next_review_at)",
+        # Covers list/info lookups and the queue join without touching the table.
+        "CREATE INDEX IF NOT EXISTS idx_characters_dict_hanzi "
+        "ON characters(dictionary_id, hanzi, pinyin)",
+        # Study time summary reads only index columns.
+        "CREATE INDEX IF NOT EXISTS idx_study_sessions_user_dict "
+        "ON study_sessions(user_id, dictionary_id, ended_at, started_at)",
+        # delete_dictionary and foreign key checks on parent deletes.
+        "CREATE INDEX IF NOT EXISTS idx_study_records_dict ON study_records(dictionary_id)",
+        "CREATE INDEX IF NOT EXISTS idx_study_records_character ON study_records(character_id)",
+        "CREATE INDEX IF NOT EXISTS idx_study_sessions_dict ON study_sessions(dictionary_id)",
+        # Public half of the dictionary listing OR.
+        "CREATE INDEX IF NOT EXISTS idx_dictionaries_visibility ON dictionaries(visibility)",
+    ]
+    for statement in statements:
+        conn.execute(statement)
+
+
+def _epoch_or_none(value) -> Optional[int]:
+    if value is None or isinstance(value, int):
+        return value
+    parsed = try_parse_iso_datetime(str(value))
+    return to_epoch(parsed) if parsed is not None else None
+
+
+def _copy_converted(
+    conn: sqlite3.Connection,
+    source: str,
+    target: str,
+    columns: List[str],
+    time_columns: List[str],
+    chunk_size: int = 1000,
+) -> None:
+    column_list = ", ".join(columns)
+    placeholders = ", ".join("?" for _ in columns)
+    time_positions = [columns.index(name) for name in time_columns]
+    cursor = conn.execute(f"SELECT {column_list} FROM {source}")
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        converted = []
+        for row in rows:
+            values = list(row)
+            for pos in time_positions:
+                values[pos] = _epoch_or_none(values[pos])
+            converted.append(values)
+        conn.executemany(
+            f"INSERT INTO {target} ({column_list}) VALUES ({placeholders})", converted
+        )
+
+
+def convert_study_times_to_epoch(conn: sqlite3.Connection) -> None:
+    """Rebuild study tables with INTEGER epoch-second timestamp columns."""
+    conn.execute(
+        """
+        CREATE TABLE study_records_epoch (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            dictionary_id INTEGER NOT NULL,
+            character_id INTEGER NOT NULL,
+            ease_factor REAL NOT NULL DEFAULT 2.5,
+            interval INTEGER NOT NULL DEFAULT 0,
+            repetitions INTEGER NOT NULL DEFAULT 0,
+            last_reviewed_at INTEGER,
+            next_review_at INTEGER,
+            last_rating INTEGER,
+            UNIQUE(user_id, dictionary_id, character_id),
+            FOREIGN KEY(character_id) REFERENCES characters(id),
+            FOREIGN KEY(dictionary_id) REFERENCES dictionaries(id)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE study_sessions_epoch (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            dictionary_id INTEGER NOT NULL,
+            started_at INTEGER NOT NULL,
+            ended_at INTEGER,
+            total_cards INTEGER NOT NULL DEFAULT 0,
+            known_count INTEGER NOT NULL DEFAULT 0,
+            unknown_count INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY(dictionary_id) REFERENCES dictionaries(id)
+        )
+        """
+    )
+    _copy_converted(
+        conn,
+        "study_records",
+        "study_records_epoch",
+        [
+            "id", "user_id", "dictionary_id", "character_id", "ease_factor", "interval",
+            "repetitions", "last_reviewed_at", "next_review_at", "last_rating",
+        ],
+        ["last_reviewed_at", "next_review_at"],
+    )
+    _copy_converted(
+        conn,
+        "study_sessions",
+        "study_sessions_epoch",
+        [
+            "id", "user_id", "dictionary_id", "started_at", "ended_at",
+            "total_cards", "known_count", "unknown_count",
+        ],
+        ["started_at", "ended_at"],
+    )
+    # Unparseable start times would violate NOT NULL; those rows carry no usable data.
+    conn.execute("DELETE FROM study_sessions_epoch WHERE started_at IS NULL")
+    conn.execute("DROP TABLE study_records")
+    conn.execute("DROP TABLE study_sessions")
+    conn.execute("ALTER TABLE study_records_epoch RENAME TO study_records")
+    conn.execute("ALTER TABLE study_sessions_epoch RENAME TO study_sessions")
+    create_hot_path_indexes(conn)
+
+
+def create_queue_keyset_indexes(conn: sqlite3.Connection) -> None:
+    # Due pages seek on (next_review_at, character_id) and read them in index order.
+    conn.execute("DROP INDEX IF EXISTS idx_study_records_due")
+    conn.execute(
+        "CREATE INDEX idx_study_records_due "
+        "ON study_records(user_id, dictionary_id, next_review_at, character_id)"
+    )
+    # New-card pages walk a dictionary's characters in id order.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_characters_dict ON characters(dictionary_id)")
+
+
+def create_review_submissions(conn: sqlite3.Connection) -> None:
+    # Results of batch reviews by client-generated id, so replays are idempotent.
+    conn.execute(
+        """
+        CREATE TABLE review_submissions (
+            user_id TEXT NOT NULL,
+            client_id TEXT NOT NULL,
+            dictionary_id INTEGER NOT NULL,
+            hanzi TEXT NOT NULL,
+            next_review_at INTEGER NOT NULL,
+            interval INTEGER NOT NULL,
+            ease_factor REAL NOT NULL,
+            created_at INTEGER NOT NULL,
+            PRIMARY KEY(user_id, client_id),
+            FOREIGN KEY(dictionary_id) REFERENCES dictionaries(id)
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX idx_review_submissions_dict ON review_submissions(dictionary_id)"
+    )
+
+
+def create_review_log(conn: sqlite3.Connection) -> None:
+    # Append-only history of every review with the scheduler state around it.
+    conn.execute(
+        """
+        CREATE TABLE review_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            dictionary_id INTEGER NOT NULL,
+            character_id INTEGER NOT NULL,
+            rating INTEGER NOT NULL,
+            reviewed_at INTEGER NOT NULL,
+            ease_factor_before REAL NOT NULL,
+            interval_before INTEGER NOT NULL,
+            repetitions_before INTEGER NOT NULL,
+            ease_factor_after REAL NOT NULL,
+            interval_after INTEGER NOT NULL,
+            repetitions_after INTEGER NOT NULL,
+            next_review_at INTEGER NOT NULL
+        )
+        """
+    )
+    # Replay walks one dictionary card by card in review order.
+    conn.execute(
+        "CREATE INDEX idx_review_log_replay "
+        "ON review_log(dictionary_id, user_id, character_id, reviewed_at)"
+    )
+
+
+def add_fsrs_scheduler(conn: sqlite3.Connection) -> None:
+    conn.execute("ALTER TABLE dictionaries ADD COLUMN scheduler TEXT NOT NULL DEFAULT 'sm2'")
+    # FSRS memory state; NULL for cards last scheduled by SM-2.
+    conn.execute("ALTER TABLE study_records ADD COLUMN stability REAL")
+    conn.execute("ALTER TABLE study_records ADD COLUMN difficulty REAL")
+    # Fitted weights per user and scheduler, stored as a JSON array.
+    conn.execute(
+        """
+        CREATE TABLE scheduler_parameters (
+            user_id TEXT NOT NULL,
+            scheduler TEXT NOT NULL,
+            parameters TEXT NOT NULL,
+            review_count INTEGER NOT NULL,
+            loss REAL,
+            updated_at INTEGER NOT NULL,
+            PRIMARY KEY(user_id, scheduler)
+        )
+        """
+    )
+    # The optimizer reads one user's whole history card by card.
+    conn.execute(
+        "CREATE INDEX idx_review_log_user "
+        "ON review_log(user_id, dictionary_id, character_id, reviewed_at)"
+    )
+
+
+def create_user_dictionary_stats(conn: sqlite3.Connection) -> None:
+    # Shared by every user of the dictionary, so it lives on the dictionary row.
+    conn.execute("ALTER TABLE dictionaries ADD COLUMN character_count INTEGER NOT NULL DEFAULT 0")
+    # Keyed dictionary first so deleting a dictionary is an index range.
+    conn.execute(
+        """
+        CREATE TABLE user_dictionary_stats (
+            dictionary_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            known_count INTEGER NOT NULL DEFAULT 0,
+            study_seconds INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(dictionary_id, user_id)
+        )
+        """
+    )
+    conn.execute(
+        """
+        UPDATE dictionaries
+        SET character_count = (SELECT COUNT(*) FROM characters c WHERE c.dictionary_id = dictionaries.id)
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO user_dictionary_stats (dictionary_id, user_id, known_count, study_seconds)
+        SELECT dictionary_id, user_id, SUM(known_count), SUM(study_seconds)
+        FROM (
+            SELECT dictionary_id, user_id, COUNT(*) AS known_count, 0 AS study_seconds
+            FROM study_records
+            WHERE repetitions > 0
+            GROUP BY dictionary_id, user_id
+            UNION ALL
+            SELECT dictionary_id, user_id, 0, SUM(ended_at - started_at)
+            FROM study_sessions
+            WHERE ended_at IS NOT NULL
+            GROUP BY dictionary_id, user_id
+        )
+        GROUP BY dictionary_id, user_id
+        """
+    )
+
+
+def create_daily_stats(conn: sqlite3.Connection) -> None:
+    # One row per active local day; ``day`` counts days since 1970-01-01.
+    # Filled going forward; app.core.check_stats --fix backfills from the review log.
+    conn.execute(
+        """
+        CREATE TABLE daily_stats (
+            dictionary_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            reviews INTEGER NOT NULL DEFAULT 0,
+            lapses INTEGER NOT NULL DEFAULT 0,
+            new_cards INTEGER NOT NULL DEFAULT 0,
+            study_seconds INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(dictionary_id, user_id, day)
+        )
+        """
+    )
+
+
+def create_data_versions(conn: sqlite3.Connection) -> None:
+    # Change counters for conditional GETs: (dictionary, '') for the shared
+    # dictionary row and characters, (dictionary, user) for that user's study
+    # data, and (0, '') for the list of dictionaries.
+    conn.execute(
+        """
+        CREATE TABLE data_versions (
+            dictionary_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY(dictionary_id, user_id)
+        )
+        """
+    )
+    # Existing dictionaries start at 1; 0 is reserved for "no such dictionary".
+    conn.execute("INSERT INTO data_versions (dictionary_id, user_id, version) SELECT id, '', 1 FROM dictionaries")
+
+
+def create_app_meta(conn: sqlite3.Connection) -> None:
+    # Values fixed for the life of the database file. ``etag_epoch`` goes into
+    # every ETag next to the data versions, so all workers build the same
+    # validators and they survive restarts, but a different database (a
+    # restored backup, a fresh install) never matches old ones.
+    conn.execute(
+        """
+        CREATE TABLE app_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute("INSERT INTO app_meta (key, value) VALUES ('etag_epoch', lower(hex(randomblob(8))))")
+
+
+def add_review_log_is_new(conn: sqlite3.Connection) -> None:
+    # Whether the card had no study record before this review: the live
+    # daily_stats.new_cards definition, logged so check_stats sums the same
+    # thing. Only a card without a record is reviewed from interval 0 and
+    # repetitions 0 (every review sets interval >= 1), so that is the backfill.
+    conn.execute("ALTER TABLE review_log ADD COLUMN is_new INTEGER NOT NULL DEFAULT 0")
+    conn.execute("UPDATE review_log SET is_new = 1 WHERE interval_before = 0 AND repetitions_before = 0")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "initial schema", init_schema),
+    Migration(2, "hot-path indexes", create_hot_path_indexes),
+    Migration(3, "epoch-second study timestamps", convert_study_times_to_epoch),
+    Migration(4, "study queue keyset indexes", create_queue_keyset_indexes),
+    Migration(5, "review submissions", create_review_submissions),
+    Migration(6, "review log", create_review_log),
+    Migration(7, "fsrs scheduler", add_fsrs_scheduler),
+    Migration(8, "user dictionary stats", create_user_dictionary_stats),
+    Migration(9, "daily stats rollups", create_daily_stats),
+    Migration(10, "data versions", create_data_versions),
+    Migration(11, "app meta", create_app_meta),
+    Migration(12, "review log new-card flag", add_review_log_is_new),
+]
+
+
+def ensure_version_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+        """
+    )
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    if not table_exists(conn, "schema_version"):
+        return 0
+    row = conn.execute("SELECT MAX(version) AS v FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def pending_migrations(conn: sqlite3.Connection) -> List[Migration]:
+    version = current_version(conn)
+    return [m for m in MIGRATIONS if m.version > version]
+
+
+def apply_migrations(conn: sqlite3.Connection, target: Optional[int] = None) -> List[int]:
+    """Apply pending migrations in order, one transaction per step.
+
+    Safe to call from several processes at once: each step re-reads the
+    current version after taking the write lock.
+    """
+    if table_exists(conn, "characters") and not table_exists(conn, "dictionaries"):
+        raise RuntimeError(
+            "Legacy schema detected. Run app.core.migrate_to_dictionaries first."
+        )
+    ensure_version_table(conn)
+    conn.commit()
+    applied = []
+    for migration in MIGRATIONS:
+        if target is not None and migration.version > target:
+            break
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if migration.version <= current_version(conn):
+                conn.rollback()
+                continue
+            migration.apply(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                (migration.version, migration.name, datetime.now(timezone.utc).isoformat()),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(migration.version)
+    return applied
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations.")
+    parser.add_argument("--target", type=int, default=None, help="Stop after this version")
+    parser.add_argument("--list", action="store_true", help="Show migration status and exit")
+    args = parser.parse_args()
+
+    settings = load_config(get_config_path())
+    conn = connect(settings.sqlite)
+    try:
+        if args.list:
+            version = current_version(conn)
+            for migration in MIGRATIONS:
+                state = "applied" if migration.version <= version else "pending"
+                print(f"{migration.version:4d}  {state:8s} {migration.name}")
+            return
+        applied = apply_migrations(conn, target=args.target)
+    finally:
+        conn.close()
+
+    if applied:
+        print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        print("Schema is up to date.")
+
+
+if __name__ == "__main__":
+    main()
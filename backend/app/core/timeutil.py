@@ -0,0 +1,61 @@
+"""Timestamp helpers.
+
+Study timestamps are stored as integer epoch seconds (UTC) and exposed as
+ISO-8601 strings at the API boundary.
+"""
+
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+
+def try_parse_iso_datetime(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    iso_value = value.replace("Z", "+00:00")
+    for fmt in ("%Y-%m-%dT%H:%M:%S.%f%z", "%Y-%m-%dT%H:%M:%S%z"):
+        try:
+            return datetime.strptime(iso_value, fmt)
+        except ValueError:
+            continue
+    for fmt in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.strptime(iso_value, fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_iso_datetime(value: Optional[str]) -> datetime:
+    parsed = try_parse_iso_datetime(value)
+    if parsed is None:
+        return datetime.now(timezone.utc)
+    return parsed
+
+
+def to_epoch(value: datetime) -> int:
+    return int(value.timestamp())
+
+
+def now_epoch() -> int:
+    return to_epoch(datetime.now(timezone.utc))
+
+
+def from_epoch(value: Optional[int]) -> Optional[str]:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
+
+
+def local_day(value: int, utc_offset_minutes: int) -> int:
+    """Day number (days since 1970-01-01) of epoch ``value`` in the given time zone."""
+    return (value + utc_offset_minutes * 60) // 86400
+
+
+def day_to_date(day: int) -> str:
+    return (date(1970, 1, 1) + timedelta(days=day)).isoformat()
+
+
+def date_to_day(value: str) -> int:
+    """Day number of a ``YYYY-MM-DD`` string; raises ValueError when malformed."""
+    return (datetime.strptime(value, "%Y-%m-%d").date() - date(1970, 1, 1)).days
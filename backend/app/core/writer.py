@@ -0,0 +1,234 @@
+"""Single-writer queue with group commit."""
+
+
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from app.core.db import open_connection
+
+
+_STOP = object()
+
+
+class WriteOp:
+    def __init__(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+
+
+class WriteQueue:
+    """Serializes write operations onto one dedicated connection.
+
+    Each operation is a callable ``fn(conn, *args, **kwargs)`` that must not
+    commit. The writer thread collects operations for up to ``batch_window_ms``
+    (or ``batch_size`` operations) and runs them in one transaction, each under
+    its own savepoint so a failing operation does not undo its neighbours. The
+    caller's future resolves only after the batch has committed.
+
+    An operation may call ``after_commit(callback)`` to update in-process
+    state (caches, indexes) once its changes are durable. Callbacks run on the
+    writer thread in commit order and are dropped if the operation or the
+    batch rolls back.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        batch_size: int = 64,
+        batch_window_ms: float = 2.0,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        mmap_size: int = 268435456,
+        cache_size: int = -16000,
+        busy_timeout: int = 5000,
+        foreign_keys: bool = True,
+    ) -> None:
+        if batch_size < 1:
+            raise ValueError("Writer batch size must be at least 1")
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.batch_window = batch_window_ms / 1000.0
+        self._connect_kwargs = {
+            "journal_mode": journal_mode,
+            "synchronous": synchronous,
+            "mmap_size": mmap_size,
+            "cache_size": cache_size,
+            "busy_timeout": busy_timeout,
+            "foreign_keys": foreign_keys,
+        }
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._op_callbacks: List[Callable[[], None]] = []
+
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._batches = 0
+        self._batch_ops_total = 0
+        self._batch_size_max = 0
+        self._last_batch_size = 0
+        self._queue_depth_max = 0
+        self._commit_time_total = 0.0
+        self._callback_errors = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        if self._thread is None:
+            raise RuntimeError("Writer is not running")
+        op = WriteOp(fn, args, kwargs)
+        self._queue.put(op)
+        depth = self._queue.qsize()
+        with self._lock:
+            self._submitted += 1
+            if depth > self._queue_depth_max:
+                self._queue_depth_max = depth
+        return op.future
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """Register a callback for the running operation; writer thread only."""
+        self._op_callbacks.append(callback)
+
+    def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Submit a write and block until its batch has committed."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_depth_max": self._queue_depth_max,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "batches": self._batches,
+                "last_batch_size": self._last_batch_size,
+                "batch_size_max": self._batch_size_max,
+                "batch_size_avg": (
+                    round(self._batch_ops_total / self._batches, 3) if self._batches else 0.0
+                ),
+                "commit_time_total": round(self._commit_time_total, 6),
+                "callback_errors": self._callback_errors,
+            }
+
+    def _collect(self, first: WriteOp) -> Tuple[List[WriteOp], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        conn = open_connection(self.db_path, isolation_level=None, **self._connect_kwargs)
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch, stopping = self._collect(item)
+                self._run_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def _run_batch(self, conn: sqlite3.Connection, batch: List[WriteOp]) -> None:
+        ops = [op for op in batch if op.future.set_running_or_notify_cancel()]
+        if not ops:
+            return
+        outcomes = []
+        callbacks: List[Callable[[], None]] = []
+        started = time.monotonic()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op in ops:
+                conn.execute("SAVEPOINT write_op")
+                self._op_callbacks = []
+                try:
+                    result = op.fn(conn, *op.args, **op.kwargs)
+                except Exception as exc:
+                    conn.execute("ROLLBACK TO write_op")
+                    conn.execute("RELEASE write_op")
+                    outcomes.append((op, None, exc))
+                    continue
+                conn.execute("RELEASE write_op")
+                outcomes.append((op, result, None))
+                callbacks.extend(self._op_callbacks)
+            conn.execute("COMMIT")
+        except sqlite3.Error as exc:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            outcomes = [(op, None, exc) for op in ops]
+            callbacks = []
+        finally:
+            self._op_callbacks = []
+        elapsed = time.monotonic() - started
+
+        callback_errors = 0
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                callback_errors += 1
+
+        failed = 0
+        for op, result, exc in outcomes:
+            if exc is not None:
+                failed += 1
+                op.future.set_exception(exc)
+            else:
+                op.future.set_result(result)
+        with self._lock:
+            self._batches += 1
+            self._batch_ops_total += len(ops)
+            self._last_batch_size = len(ops)
+            if len(ops) > self._batch_size_max:
+                self._batch_size_max = len(ops)
+            self._completed += len(ops) - failed
+            self._failed += failed
+            self._commit_time_total += elapsed
+            self._callback_errors += callback_errors
+
+
+def create_writer(config) -> WriteQueue:
+    return WriteQueue(
+        config.path,
+        batch_size=config.writer_batch_size,
+        batch_window_ms=config.writer_batch_window_ms,
+        journal_mode=config.journal_mode,
+        synchronous=config.synchronous,
+        mmap_size=config.mmap_size,
+        cache_size=config.cache_size,
+        busy_timeout=config.busy_timeout,
+        foreign_keys=config.foreign_keys,
+    )
+
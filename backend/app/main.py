@@ -1,10 +1,16 @@
 """FastAPI app entrypoint."""
 
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.core.config import get_config_path, load_config
+from app.core.db import PoolTimeoutError
+from app.core.executor import create_cpu_executor, create_optimize_executor
+from app.services.dictionary.pinyin import load_pinyin_table
+from app.services.dictionary.thuocl import create_common_words
+from app.services.storage import create_storage
 from app.api.router import router as api_router
 
 
@@ -14,6 +20,14 @@ def create_app() -> FastAPI:
 
     app = FastAPI(title=settings.app.name)
     app.state.settings = settings
+    app.state.storage = create_storage(settings)
+    app.state.cpu_executor = create_cpu_executor(settings.app)
+    app.state.optimize_executor = create_optimize_executor()
+    # Mapped once per worker process; the pages are shared through the page cache.
+    load_pinyin_table(settings.dictionary.pinyin_table)
+    app.state.common_words = create_common_words(settings)
+    # user_id -> status of that user's latest FSRS optimization job.
+    app.state.fsrs_jobs = {}
     app.add_middleware(
         CORSMiddleware,
         allow_origins=(
@@ -27,10 +41,39 @@ def create_app() -> FastAPI:
     )
     app.include_router(api_router)
 
+    @app.exception_handler(PoolTimeoutError)
+    def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": "Database busy, try again."},
+        )
+
     @app.get("/health")
     def health_check():
         return {"status": "ok"}
 
+    @app.get("/health/db")
+    def db_health_check():
+        storage = app.state.storage
+        return {
+            "backend": storage.name,
+            **storage.stats(),
+            "common_words": app.state.common_words.stats(),
+        }
+
+    @app.on_event("startup")
+    def prepare_database():
+        app.state.storage.start()
+        # Load or build the common words index off the request path.
+        app.state.cpu_executor.submit(app.state.common_words.refresh)
+
+    @app.on_event("shutdown")
+    def close_storage():
+        app.state.storage.close()
+        app.state.common_words.close()
+        app.state.cpu_executor.shutdown(wait=True)
+        app.state.optimize_executor.shutdown(wait=True)
+
     return app
 
 
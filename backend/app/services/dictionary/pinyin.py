@@ -1,9 +1,76 @@
-"""Pinyin utilities (offline)."""
+"""Pinyin utilities (offline).
 
+Single characters are looked up in the precomputed table
+(``pinyin_table.py``) once ``load_pinyin_table`` has mapped it; pypinyin is
+imported only for text the table does not cover.
+"""
 
-from pypinyin import Style, pinyin
+
+import os
+from typing import List, Optional
+
+from app.services.dictionary.pinyin_table import PinyinTable
+
+
+_table: Optional[PinyinTable] = None
+
+
+def load_pinyin_table(path: str) -> bool:
+    """Map the table at ``path`` for this process; False (pypinyin only) when it is missing."""
+    global _table
+    if not os.path.exists(path):
+        return False
+    table = PinyinTable(path)
+    previous, _table = _table, table
+    if previous is not None:
+        previous.close()
+    return True
+
+
+def _pypinyin(items) -> List[str]:
+    from pypinyin import Style, pinyin
+
+    return [item[0] for item in pinyin(items, style=Style.TONE3, strict=False)]
+
+
+def _lookup(hanzi: str) -> Optional[str]:
+    if _table is None or len(hanzi) != 1:
+        return None
+    readings = _table.readings(hanzi)
+    if readings is None:
+        return None
+    # pypinyin (strict=False) returns a character without a reading unchanged.
+    return readings[0] if readings else hanzi
 
 
 def get_pinyin(hanzi: str) -> str:
-    result = pinyin(hanzi, style=Style.TONE3, strict=False)
-    return " ".join(item[0] for item in result)
+    reading = _lookup(hanzi)
+    if reading is not None:
+        return reading
+    return " ".join(_pypinyin(hanzi))
+
+
+def get_pinyin_batch(characters: List[str]) -> List[str]:
+    """Pinyin for each single character; misses go to pypinyin in one call.
+
+    A list is segmented per item, so neighbouring characters never combine
+    into a phrase reading and each result equals ``get_pinyin(c)``.
+    """
+    result = [_lookup(hanzi) for hanzi in characters]
+    missing = [i for i, reading in enumerate(result) if reading is None]
+    if missing:
+        for i, reading in zip(missing, _pypinyin([characters[i] for i in missing])):
+            result[i] = reading
+    return result
+
+
+def get_heteronyms(hanzi: str) -> List[str]:
+    """Every TONE3 reading of one character, default first."""
+    if _table is not None and len(hanzi) == 1:
+        readings = _table.readings(hanzi)
+        if readings is not None:
+            return readings
+    from pypinyin import Style, pinyin
+
+    readings = pinyin(hanzi, style=Style.TONE3, heteronym=True, strict=False)[0]
+    return [] if readings == [hanzi] else readings
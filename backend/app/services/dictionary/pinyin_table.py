@@ -0,0 +1,165 @@
+"""Precomputed hanzi -> TONE3 pinyin table, memory-mapped at startup.
+
+The build step asks pypinyin once for every code point in the CJK Unified
+Ideographs blocks and writes a little-endian binary file:
+
+    header    magic, version, range count, string count, pool size
+    ranges    (first code point, last code point, first record) per block
+    records   one uint16 string id per code point (0 = no reading)
+    offsets   uint32 start of every string in the pool, plus the end
+    pool      UTF-8 readings, heteronyms joined by "," (default first)
+
+A lookup is two ``unpack_from`` calls at computed offsets. The file is
+opened read-only with ``mmap``, so every worker process shares the same
+page-cache pages and nothing is parsed at startup.
+
+    python -m app.services.dictionary.pinyin_table [--output PATH]
+"""
+
+
+import argparse
+import mmap
+import os
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import get_config_path, load_config
+
+
+MAGIC = b"HZPY"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHII")
+RANGE = struct.Struct("<III")
+RECORD = struct.Struct("<H")
+OFFSET = struct.Struct("<I")
+
+# CJK Unified Ideographs and extensions A-H (Unicode 15).
+CJK_RANGES = [
+    (0x3400, 0x4DBF),
+    (0x4E00, 0x9FFF),
+    (0x20000, 0x2A6DF),
+    (0x2A700, 0x2B73F),
+    (0x2B740, 0x2B81F),
+    (0x2B820, 0x2CEAF),
+    (0x2CEB0, 0x2EBEF),
+    (0x30000, 0x3134F),
+    (0x31350, 0x323AF),
+]
+
+
+def compute_readings(ranges: List[Tuple[int, int]]) -> Dict[int, str]:
+    """{code point: "default,other,..."} for every code point pypinyin knows."""
+    from pypinyin import Style, pinyin
+
+    readings = {}
+    for first, last in ranges:
+        for code_point in range(first, last + 1):
+            hanzi = chr(code_point)
+            default = pinyin(hanzi, style=Style.TONE3, strict=False)[0][0]
+            if default == hanzi:
+                continue
+            heteronyms = pinyin(hanzi, style=Style.TONE3, heteronym=True, strict=False)[0]
+            readings[code_point] = ",".join([default] + [item for item in heteronyms if item != default])
+    return readings
+
+
+def pack_table(readings: Dict[int, str], ranges: List[Tuple[int, int]]) -> bytes:
+    strings = [""]
+    string_ids = {"": 0}
+    records = bytearray()
+    range_rows = []
+    for first, last in ranges:
+        range_rows.append(RANGE.pack(first, last, len(records) // RECORD.size))
+        for code_point in range(first, last + 1):
+            value = readings.get(code_point, "")
+            if value not in string_ids:
+                string_ids[value] = len(strings)
+                strings.append(value)
+            records += RECORD.pack(string_ids[value])
+    if len(strings) > 0xFFFF:
+        raise ValueError("Too many distinct readings for 16-bit records")
+    if len(records) % 4:
+        records += b"\0" * (4 - len(records) % 4)
+    offsets = bytearray()
+    pool = bytearray()
+    for value in strings:
+        offsets += OFFSET.pack(len(pool))
+        pool += value.encode("utf-8")
+    offsets += OFFSET.pack(len(pool))
+    header = HEADER.pack(MAGIC, VERSION, len(ranges), len(strings), len(pool))
+    return header + b"".join(range_rows) + bytes(records) + bytes(offsets) + bytes(pool)
+
+
+def build_table(path: str, ranges: List[Tuple[int, int]] = CJK_RANGES) -> int:
+    """Write the table to ``path`` atomically; return the number of code points with readings."""
+    readings = compute_readings(ranges)
+    data = pack_table(readings, ranges)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    # Replacing (not rewriting) keeps running workers on their old mapping.
+    os.replace(tmp_path, path)
+    return len(readings)
+
+
+class PinyinTable:
+    """Read-only view of a table file; safe to share between threads."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, range_count, string_count, pool_size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {VERSION} pinyin table")
+        self.ranges = [
+            RANGE.unpack_from(self._map, HEADER.size + i * RANGE.size) for i in range(range_count)
+        ]
+        record_count = sum(last - first + 1 for first, last, _ in self.ranges)
+        self._records = HEADER.size + range_count * RANGE.size
+        records_size = record_count * RECORD.size
+        self._offsets = self._records + records_size + (-records_size % 4)
+        self._pool = self._offsets + (string_count + 1) * OFFSET.size
+        if self._pool + pool_size != len(self._map):
+            self._map.close()
+            raise ValueError(f"{path} is truncated or corrupt")
+
+    def readings(self, hanzi: str) -> Optional[List[str]]:
+        """Readings for one character, default first; [] when it has none, None when not covered."""
+        code_point = ord(hanzi)
+        for first, last, base in self.ranges:
+            if first <= code_point <= last:
+                break
+        else:
+            return None
+        (string_id,) = RECORD.unpack_from(self._map, self._records + (base + code_point - first) * RECORD.size)
+        if string_id == 0:
+            return []
+        start, end = struct.unpack_from("<II", self._map, self._offsets + string_id * OFFSET.size)
+        return self._map[self._pool + start : self._pool + end].decode("utf-8").split(",")
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the precomputed pinyin table.")
+    parser.add_argument("--output", default=None, help="Table path (default: dictionary.pinyin_table)")
+    args = parser.parse_args()
+
+    output = args.output or load_config(get_config_path()).dictionary.pinyin_table
+    started = time.perf_counter()
+    count = build_table(output)
+    print(
+        f"Wrote {output}: {count} characters with readings, "
+        f"{os.path.getsize(output)} bytes in {time.perf_counter() - started:.1f}s."
+    )
+
+
+if __name__ == "__main__":
+    main()
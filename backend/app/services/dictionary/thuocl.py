@@ -1,25 +1,264 @@
 """THUOCL dictionary lookup."""
 
 
-from typing import List
-
-from app.core.db import get_connection
-
-
-def get_common_words(db_path: str, hanzi: str, limit: int) -> List[dict]:
-    conn = get_connection(db_path)
-    try:
-        rows = conn.execute(
-            """
-            SELECT cw.word, cw.frequency
-            FROM character_word_index cwi
-            JOIN common_words cw ON cw.id = cwi.word_id
-            WHERE cwi.hanzi = ?
-            ORDER BY cw.frequency DESC
-            LIMIT ?
-            """,
-            (hanzi, limit),
-        ).fetchall()
-        return [{"word": row["word"], "frequency": row["frequency"]} for row in rows]
-    finally:
-        conn.close()
+import heapq
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.core.db import ConnectionPool
+from app.services.dictionary.thuocl_import import read_top_words_depth, read_version
+from app.services.dictionary.top_words import TopWordsIndex, build_from_db, load_snapshot
+
+
+# ``IN (?)`` is widened to one placeholder per character.
+# The top ``limit`` words per character: a primary key range scan per
+# character, used when character_top_words is deep enough. The ORDER BY is
+# the key order, so it adds no sort step.
+TOP_WORDS_IN = """
+    SELECT hanzi, word, frequency
+    FROM character_top_words
+    WHERE hanzi IN (?) AND rank <= ?
+    ORDER BY hanzi, rank
+"""
+
+# Every word containing any of the characters, ranked in Python.
+COMMON_WORDS_IN = """
+    SELECT cwi.hanzi, cw.word, cw.frequency
+    FROM character_word_index cwi
+    JOIN common_words cw ON cw.id = cwi.word_id
+    WHERE cwi.hanzi IN (?)
+"""
+
+# Stay well under SQLITE_MAX_VARIABLE_NUMBER (999 before SQLite 3.32).
+MAX_IN_LIST = 500
+
+
+class CommonWordsService:
+    """Top THUOCL words per character, served from memory.
+
+    With ``top_k`` set, every character's top ``top_k`` words live in a
+    ``TopWordsIndex`` (loaded from ``snapshot_path`` when it matches the
+    tables, otherwise built from them and saved there), and any limit up to
+    ``top_k`` is answered from it. Larger limits, or ``top_k = 0``, go
+    through a bounded LRU keyed by (hanzi, limit); misses in a batch are
+    read together with one ``IN``-list query, from ``character_top_words``
+    when it holds enough words per character, else ranked in Python.
+    ``thuocl_import`` bumps ``thuocl_version`` when it reloads the tables;
+    the version is checked at most every ``check_interval`` seconds and a
+    change rebuilds the index and empties the cache. Safe to share between
+    threads.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        cache_size: int = 8192,
+        check_interval: float = 10.0,
+        top_k: int = 0,
+        snapshot_path: Optional[str] = None,
+    ) -> None:
+        self.pool = pool
+        self.cache_size = cache_size
+        self.check_interval = check_interval
+        self.top_k = top_k
+        self.snapshot_path = snapshot_path
+        self._index: Optional[TopWordsIndex] = None
+        self._index_seconds: Optional[float] = None
+        self._cache: "OrderedDict[tuple, List[dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._top_words_depth = 0
+        self._checked_at = float("-inf")
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def peek(self, hanzi: str, limit: int) -> Optional[List[dict]]:
+        """Words from memory without touching the database; None on a miss or when a version check is due."""
+        with self._lock:
+            if time.monotonic() - self._checked_at >= self.check_interval:
+                return None
+            index = self._index
+            if index is not None and limit <= index.k:
+                self._hits += 1
+            else:
+                index = None
+                words = self._cache.get((hanzi, limit))
+                if words is None:
+                    return None
+                self._cache.move_to_end((hanzi, limit))
+                self._hits += 1
+                return words
+        return index.lookup(hanzi, limit)
+
+    def lookup(self, hanzi: str, limit: int) -> List[dict]:
+        return self.lookup_many([hanzi], limit)[hanzi]
+
+    def lookup_many(self, hanzi_list: List[str], limit: int) -> Dict[str, List[dict]]:
+        """Top ``limit`` words for every hanzi; blocking, may query on misses."""
+        unique = list(dict.fromkeys(hanzi_list))
+        if not unique or limit <= 0:
+            return {hanzi: [] for hanzi in unique}
+        self.refresh()
+        index = self._index
+        if index is not None and limit <= index.k:
+            with self._lock:
+                self._hits += len(unique)
+            return {hanzi: index.lookup(hanzi, limit) for hanzi in unique}
+        result: Dict[str, List[dict]] = {}
+        missing = []
+        with self._lock:
+            for hanzi in unique:
+                words = self._cache.get((hanzi, limit))
+                if words is None:
+                    missing.append(hanzi)
+                else:
+                    self._cache.move_to_end((hanzi, limit))
+                    result[hanzi] = words
+            self._hits += len(result)
+            self._misses += len(missing)
+        if missing:
+            loaded = self._load(missing, limit)
+            with self._lock:
+                for hanzi in missing:
+                    self._store((hanzi, limit), loaded[hanzi])
+            result.update(loaded)
+        return {hanzi: result[hanzi] for hanzi in unique}
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            index = self._index
+            return {
+                "index": None
+                if index is None
+                else {
+                    "k": index.k,
+                    "characters": len(index.code_points),
+                    "words": len(index.frequencies),
+                    "bytes": index.nbytes(),
+                    "load_seconds": self._index_seconds,
+                },
+                "entries": len(self._cache),
+                "max_entries": self.cache_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalidations": self._invalidations,
+                "thuocl_version": self._version,
+            }
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def _store(self, key: tuple, words: List[dict]) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[key] = words
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _load(self, hanzi_list: List[str], limit: int) -> Dict[str, List[dict]]:
+        if limit <= self._top_words_depth:
+            return self._load_ranked(hanzi_list, limit)
+        candidates: Dict[str, list] = {hanzi: [] for hanzi in hanzi_list}
+        with self.pool.connection() as conn:
+            for start in range(0, len(hanzi_list), MAX_IN_LIST):
+                chunk = hanzi_list[start : start + MAX_IN_LIST]
+                sql = COMMON_WORDS_IN.replace("IN (?)", "IN (" + ", ".join("?" * len(chunk)) + ")")
+                for hanzi, word, frequency in conn.execute(sql, chunk):
+                    candidates[hanzi].append((frequency, word))
+        return {
+            hanzi: [
+                {"word": word, "frequency": frequency}
+                # Same order as TopWordsIndex: frequency, then word.
+                for frequency, word in heapq.nsmallest(limit, rows, key=lambda row: (-row[0], row[1]))
+            ]
+            for hanzi, rows in candidates.items()
+        }
+
+    def _load_ranked(self, hanzi_list: List[str], limit: int) -> Dict[str, List[dict]]:
+        result: Dict[str, List[dict]] = {hanzi: [] for hanzi in hanzi_list}
+        with self.pool.connection() as conn:
+            for start in range(0, len(hanzi_list), MAX_IN_LIST):
+                chunk = hanzi_list[start : start + MAX_IN_LIST]
+                sql = TOP_WORDS_IN.replace("IN (?)", "IN (" + ", ".join("?" * len(chunk)) + ")")
+                for hanzi, word, frequency in conn.execute(sql, chunk + [limit]):
+                    result[hanzi].append({"word": word, "frequency": frequency})
+        return result
+
+    def refresh(self) -> None:
+        """Re-read ``thuocl_version`` if the check interval passed; reload on a change. Blocking."""
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        with self._refresh_lock:
+            now = time.monotonic()
+            if now - self._checked_at < self.check_interval:
+                return
+            with self.pool.connection() as conn:
+                conn.execute("BEGIN")
+                try:
+                    version = read_version(conn)
+                    depth = read_top_words_depth(conn)
+                    index = self._index
+                    if self.top_k > 0 and (version != self._version or index is None):
+                        index = self._load_index(conn, version)
+                finally:
+                    conn.rollback()
+            with self._lock:
+                if self._version is not None and version != self._version:
+                    self._cache.clear()
+                    self._invalidations += 1
+                self._version = version
+                self._top_words_depth = depth
+                self._index = index
+                self._checked_at = now
+
+    def _load_index(self, conn, version: int) -> Optional[TopWordsIndex]:
+        started = time.perf_counter()
+        index = None
+        if self.snapshot_path:
+            index = load_snapshot(self.snapshot_path, self.top_k, version)
+        if index is None:
+            try:
+                index = build_from_db(conn, self.top_k)
+            except sqlite3.OperationalError:
+                # No THUOCL tables yet; lookups fall back to the query path.
+                return None
+            if self.snapshot_path:
+                try:
+                    index.save(self.snapshot_path)
+                except OSError:
+                    pass
+        self._index_seconds = round(time.perf_counter() - started, 6)
+        return index
+
+
+def create_common_words(settings) -> CommonWordsService:
+    """THUOCL lookups always read the sqlite file, whatever the storage backend."""
+    config = settings.sqlite
+    pool = ConnectionPool(
+        config.path,
+        size=settings.app.cpu_workers,
+        timeout=config.pool_timeout,
+        mmap_size=config.mmap_size,
+        cache_size=config.cache_size,
+        busy_timeout=config.busy_timeout,
+        health_check_interval=config.health_check_interval,
+        read_only=True,
+    )
+    dictionary = settings.dictionary
+    return CommonWordsService(
+        pool,
+        cache_size=dictionary.common_words_cache_size,
+        top_k=dictionary.top_words_k,
+        snapshot_path=dictionary.top_words_snapshot,
+    )
@@ -1,8 +1,136 @@
-"""Import THUOCL word list into SQLite and build character index."""
+"""Import THUOCL word list into SQLite and build character index.
+
+Each file is a category (``THUOCL_animal.txt`` -> ``animal``) and every
+word keeps its frequency per category in ``word_categories``;
+``common_words.frequency`` is the highest of them. The ``thuocl_files``
+manifest records each file's size, mtime and SHA-256, so a re-run only
+parses files whose content changed and applies the difference: words
+entering or leaving a category, changed frequencies, and the
+``character_word_index`` rows of words that appear or disappear.
+
+Also materializes ``character_top_words``: the top N words per character
+(by frequency, then word) keyed by (hanzi, rank), so lookups are primary
+key range scans. It is built in a shadow table and swapped in with a
+rename, so running servers never see it half built.
+
+``--bulk`` rebuilds all of it from the files instead: files are parsed
+in a process pool, loaded with ``executemany`` into a temp table, and the
+word tables are derived from it with set-based SQL into new tables that
+get their indexes after the load and replace the old ones in the same
+transaction.
+"""
 
 import argparse
+import hashlib
+import heapq
 import os
 import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+DEFAULT_TOP_WORDS = 10
+
+# Connection-scoped, so they end with the import. synchronous=OFF trades
+# crash safety of this one run for speed; a failed import is just rerun.
+BULK_PRAGMAS = (
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -262144",  # KiB, i.e. 256 MiB
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Same columns as init_db, but the UNIQUE constraints become indexes that
+# are created after the rows are in. (executescript would commit first.)
+BULK_SCHEMA = (
+    "DROP TABLE IF EXISTS common_words_new",
+    "DROP TABLE IF EXISTS character_word_index_new",
+    "DROP TABLE IF EXISTS word_categories_new",
+    """
+    CREATE TABLE common_words_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        word TEXT NOT NULL,
+        frequency INTEGER NOT NULL DEFAULT 0,
+        source TEXT NOT NULL DEFAULT 'thuocl'
+    )
+    """,
+    """
+    CREATE TABLE character_word_index_new (
+        hanzi TEXT NOT NULL,
+        word_id INTEGER NOT NULL,
+        FOREIGN KEY(word_id) REFERENCES common_words(id)
+    )
+    """,
+    """
+    CREATE TABLE word_categories_new (
+        word_id INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        frequency INTEGER NOT NULL,
+        PRIMARY KEY (category, word_id)
+    ) WITHOUT ROWID
+    """,
+)
+
+# Ids are assigned in file order.
+BULK_WORDS = """
+    INSERT INTO common_words_new (word, frequency)
+    SELECT word, MAX(frequency)
+    FROM temp.thuocl_staging
+    GROUP BY word
+    ORDER BY MIN(seq)
+"""
+
+# (hanzi, word_id) for every distinct character of the words in {words}
+# (id, word): a character is taken only at its first position in the
+# word, which is cheaper than DISTINCT.
+WORD_CHARACTERS = """
+    WITH RECURSIVE positions(pos) AS (
+        SELECT 1
+        UNION ALL
+        SELECT pos + 1 FROM positions
+        WHERE pos < (SELECT MAX(length(word)) FROM {words})
+    )
+    SELECT substr(cw.word, p.pos, 1), cw.id
+    FROM positions p
+    CROSS JOIN {words} cw
+    WHERE p.pos <= length(cw.word)
+      AND instr(cw.word, substr(cw.word, p.pos, 1)) = p.pos
+"""
+
+BULK_INDEX = "INSERT INTO character_word_index_new (hanzi, word_id)" + WORD_CHARACTERS.format(
+    words="common_words_new"
+)
+
+BULK_SWAP = (
+    "DROP TABLE IF EXISTS character_word_index",
+    "DROP TABLE IF EXISTS common_words",
+    "DROP TABLE IF EXISTS word_categories",
+    "ALTER TABLE common_words_new RENAME TO common_words",
+    "ALTER TABLE character_word_index_new RENAME TO character_word_index",
+    "ALTER TABLE word_categories_new RENAME TO word_categories",
+)
+
+# The unique (hanzi, word_id) index also serves lookups by hanzi, so the
+# separate idx_cwi_hanzi from init_db is not rebuilt.
+BULK_INDEXES = (
+    "CREATE UNIQUE INDEX idx_cw_word ON common_words(word)",
+    "CREATE INDEX idx_cw_frequency ON common_words(frequency)",
+    "CREATE UNIQUE INDEX idx_cwi_hanzi_word ON character_word_index(hanzi, word_id)",
+)
+
+# Needs idx_cw_word, so it runs after BULK_INDEXES; the GROUP BY output is
+# already in primary key order.
+BULK_CATEGORIES = (
+    """
+    INSERT INTO word_categories (word_id, category, frequency)
+    SELECT cw.id, s.category, MAX(s.frequency)
+    FROM temp.thuocl_staging s
+    JOIN common_words cw ON cw.word = s.word
+    GROUP BY s.category, cw.id
+    """,
+    "CREATE INDEX idx_word_categories_word ON word_categories(word_id)",
+)
 
 
 def init_db(conn: sqlite3.Connection) -> None:
@@ -24,8 +152,74 @@ def init_db(conn: sqlite3.Connection) -> None:
 
         CREATE INDEX IF NOT EXISTS idx_cwi_hanzi ON character_word_index(hanzi);
         CREATE INDEX IF NOT EXISTS idx_cw_frequency ON common_words(frequency);
+
+        CREATE TABLE IF NOT EXISTS thuocl_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS character_top_words (
+            hanzi TEXT NOT NULL,
+            rank INTEGER NOT NULL,
+            word TEXT NOT NULL,
+            frequency INTEGER NOT NULL,
+            PRIMARY KEY (hanzi, rank)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS word_categories (
+            word_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            frequency INTEGER NOT NULL,
+            PRIMARY KEY (category, word_id)
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS idx_word_categories_word ON word_categories(word_id);
+
+        CREATE TABLE IF NOT EXISTS thuocl_files (
+            category TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            words INTEGER NOT NULL,
+            imported_at TEXT NOT NULL
+        );
+        """
+    )
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(thuocl_version)")]
+    if "top_words" not in columns:
+        # Words per character in character_top_words (0 = not built).
+        conn.execute("ALTER TABLE thuocl_version ADD COLUMN top_words INTEGER NOT NULL DEFAULT 0")
+    conn.commit()
+
+
+def read_version(conn: sqlite3.Connection) -> int:
+    try:
+        row = conn.execute("SELECT version FROM thuocl_version WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        # Tables imported before the version row existed.
+        return 0
+    return row[0] if row else 0
+
+
+def read_top_words_depth(conn: sqlite3.Connection) -> int:
+    """N of the current ``character_top_words`` table, 0 when it has not been built."""
+    try:
+        row = conn.execute("SELECT top_words FROM thuocl_version WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+
+def bump_version(conn: sqlite3.Connection) -> None:
+    """Tell running servers (CommonWordsService) that the word tables changed."""
+    conn.execute(
+        """
+        INSERT INTO thuocl_version (id, version) VALUES (1, 1)
+        ON CONFLICT(id) DO UPDATE SET version = version + 1
         """
     )
+    conn.commit()
 
 
 def iter_thuocl_files(thuocl_dir: str):
@@ -55,57 +249,504 @@ def parse_line(line: str):
     return word, freq
 
 
-def import_words(conn: sqlite3.Connection, thuocl_dir: str) -> int:
-    cursor = conn.cursor()
-    count = 0
+def file_category(thuocl_dir: str, path: str) -> str:
+    """``THUOCL_animal.txt`` -> ``animal``; subdirectories stay in the name (``extra/animal``)."""
+    directory, name = os.path.split(os.path.relpath(path, thuocl_dir))
+    stem = os.path.splitext(name)[0]
+    if stem.startswith("THUOCL_"):
+        stem = stem[len("THUOCL_") :]
+    return "/".join(directory.split(os.sep) + [stem]) if directory else stem
+
+
+def scan_files(thuocl_dir: str) -> List[Tuple[str, str, int, int]]:
+    """(category, path, size, mtime_ns) per file, in ``iter_thuocl_files`` order."""
+    files = []
+    paths: Dict[str, str] = {}
     for path in iter_thuocl_files(thuocl_dir):
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                word, freq = parse_line(line)
-                if not word:
-                    continue
-                cursor.execute(
-                    "INSERT OR IGNORE INTO common_words (word, frequency) VALUES (?, ?)",
-                    (word, freq),
-                )
-                count += 1
+        category = file_category(thuocl_dir, path)
+        if category in paths:
+            raise ValueError(f"{paths[category]} and {path} are both category {category!r}")
+        paths[category] = path
+        stat = os.stat(path)
+        files.append((category, path, stat.st_size, stat.st_mtime_ns))
+    return files
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_file(path: str) -> List[Tuple[str, int]]:
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            word, freq = parse_line(line)
+            if word:
+                rows.append((word, freq))
+    return rows
+
+
+def parse_files(paths: List[str], workers: int) -> List[List[Tuple[str, int]]]:
+    """Rows of every file, in ``paths`` order."""
+    if workers <= 1 or len(paths) <= 1:
+        return [parse_file(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+        return list(executor.map(parse_file, paths))
+
+
+class PhaseTimer:
+    def __init__(self) -> None:
+        self.phases: List[Tuple[str, float]] = []
+        self._started = time.perf_counter()
+
+    def mark(self, name: str) -> None:
+        now = time.perf_counter()
+        self.phases.append((name, now - self._started))
+        self._started = now
+
+    def report(self) -> str:
+        total = sum(seconds for _, seconds in self.phases)
+        lines = [f"  {name:<12} {seconds:7.3f}s" for name, seconds in self.phases]
+        lines.append(f"  {'total':<12} {total:7.3f}s")
+        return "\n".join(lines)
+
+
+def record_files(conn: sqlite3.Connection, thuocl_dir: str, files: List[Tuple[str, str, int, int, str, int]]) -> None:
+    """Upsert manifest rows from (category, path, size, mtime_ns, sha256, words)."""
+    imported_at = datetime.now(timezone.utc).isoformat()
+    conn.executemany(
+        """
+        INSERT INTO thuocl_files (category, path, size, mtime_ns, sha256, words, imported_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(category) DO UPDATE SET
+            path = excluded.path,
+            size = excluded.size,
+            mtime_ns = excluded.mtime_ns,
+            sha256 = excluded.sha256,
+            words = excluded.words,
+            imported_at = excluded.imported_at
+        """,
+        [
+            (category, os.path.relpath(path, thuocl_dir), size, mtime_ns, digest, words, imported_at)
+            for category, path, size, mtime_ns, digest, words in files
+        ],
+    )
+
+
+def update_stats(conn: sqlite3.Connection, files: List[Tuple[str, str, int, int]]) -> None:
+    """Refresh the stat of files whose content matched the manifest hash."""
+    conn.executemany(
+        "UPDATE thuocl_files SET path = ?, size = ?, mtime_ns = ? WHERE category = ?",
+        [(path, size, mtime_ns, category) for category, path, size, mtime_ns in files],
+    )
+
+
+def highest_frequencies(rows: List[Tuple[str, int]]) -> Dict[str, int]:
+    """{word: frequency} of one file; a word listed twice keeps its higher frequency."""
+    words: Dict[str, int] = {}
+    for word, frequency in rows:
+        if word not in words or frequency > words[word]:
+            words[word] = frequency
+    return words
+
+
+def bulk_import(conn: sqlite3.Connection, thuocl_dir: str, workers: int, timer: PhaseTimer) -> Tuple[int, int, int]:
+    """Rebuild the word tables and the manifest from the files; (lines, words, index rows).
+
+    Words no longer in the files are dropped and ids are reassigned. The
+    write lock is only taken for the set-based phases, and readers see the
+    old tables until the commit.
+    """
+    for pragma in BULK_PRAGMAS:
+        conn.execute(pragma)
+    files = scan_files(thuocl_dir)
+    parsed = parse_files([path for _, path, _, _ in files], workers)
+    digests = [file_digest(path) for _, path, _, _ in files]
+    timer.mark("parse")
+
+    conn.execute("DROP TABLE IF EXISTS temp.thuocl_staging")
+    conn.execute(
+        """
+        CREATE TEMP TABLE thuocl_staging (
+            seq INTEGER PRIMARY KEY,
+            category TEXT NOT NULL,
+            word TEXT NOT NULL,
+            frequency INTEGER NOT NULL
+        )
+        """
+    )
+    conn.executemany(
+        "INSERT INTO temp.thuocl_staging (category, word, frequency) VALUES (?, ?, ?)",
+        (
+            (category, word, frequency)
+            for (category, _, _, _), rows in zip(files, parsed)
+            for word, frequency in rows
+        ),
+    )
     conn.commit()
-    return count
-
-
-def build_index(conn: sqlite3.Connection) -> int:
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, word FROM common_words")
-    rows = cursor.fetchall()
-    inserts = 0
-    for word_id, word in rows:
-        for ch in word:
-            cursor.execute(
-                "INSERT OR IGNORE INTO character_word_index (hanzi, word_id) VALUES (?, ?)",
-                (ch, word_id),
+    lines = sum(len(rows) for rows in parsed)
+    manifest = [
+        file + (digest, len({word for word, _ in rows})) for file, digest, rows in zip(files, digests, parsed)
+    ]
+    del parsed
+    timer.mark("load")
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for statement in BULK_SCHEMA:
+            conn.execute(statement)
+        words = conn.execute(BULK_WORDS).rowcount
+        timer.mark("words")
+        indexed = conn.execute(BULK_INDEX).rowcount
+        timer.mark("char index")
+        for statement in BULK_SWAP + BULK_INDEXES:
+            conn.execute(statement)
+        timer.mark("indexes")
+        for statement in BULK_CATEGORIES:
+            conn.execute(statement)
+        conn.execute("DELETE FROM thuocl_files")
+        record_files(conn, thuocl_dir, manifest)
+        timer.mark("categories")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    conn.execute("DROP TABLE temp.thuocl_staging")
+    timer.mark("commit")
+    return lines, words, indexed
+
+
+def incremental_import(conn: sqlite3.Connection, thuocl_dir: str, workers: int, timer: PhaseTimer) -> dict:
+    """Apply added, changed and removed files to the word tables; returns what changed.
+
+    Files whose size and mtime match the manifest are not read; the rest
+    are hashed and only those whose hash changed are parsed. A database
+    without a manifest (imported before it existed) has every word
+    re-checked, so words no file contains any more are dropped.
+    """
+    files = scan_files(thuocl_dir)
+    manifest = {
+        row[0]: row[1:] for row in conn.execute("SELECT category, size, mtime_ns, sha256 FROM thuocl_files")
+    }
+    restat = []
+    changed = []
+    for category, path, size, mtime_ns in files:
+        known = manifest.get(category)
+        if known is not None and known[:2] == (size, mtime_ns):
+            continue
+        digest = file_digest(path)
+        if known is not None and known[2] == digest:
+            restat.append((category, os.path.relpath(path, thuocl_dir), size, mtime_ns))
+        else:
+            changed.append((category, path, size, mtime_ns, digest))
+    present = {category for category, _, _, _ in files}
+    removed = [category for category in manifest if category not in present]
+    parsed = [highest_frequencies(rows) for rows in parse_files([file[1] for file in changed], workers)]
+    timer.mark("scan")
+
+    result = {
+        "files": len(files),
+        "parsed": len(changed),
+        "removed": removed,
+        "categories": [],
+        "words_added": 0,
+        "words_removed": 0,
+        "index_added": 0,
+        "index_removed": 0,
+    }
+    if not changed and not removed:
+        if restat:
+            update_stats(conn, restat)
+            conn.commit()
+        return result
+
+    for table, columns in (
+        ("thuocl_words", "word TEXT PRIMARY KEY, frequency INTEGER NOT NULL"),
+        ("thuocl_delta", "word_id INTEGER PRIMARY KEY, frequency INTEGER NOT NULL"),
+        ("thuocl_touched", "word_id INTEGER PRIMARY KEY"),
+        ("thuocl_changed_words", "id INTEGER PRIMARY KEY, word TEXT NOT NULL"),
+    ):
+        conn.execute(f"DROP TABLE IF EXISTS temp.{table}")
+        conn.execute(f"CREATE TEMP TABLE {table} ({columns})")
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        watermark = conn.execute("SELECT COALESCE(MAX(id), 0) FROM common_words").fetchone()[0]
+        if not manifest:
+            conn.execute("INSERT INTO temp.thuocl_touched (word_id) SELECT id FROM common_words")
+        for (category, _, _, _, _), words in zip(changed, parsed):
+            result["categories"].append((category,) + apply_category(conn, category, words))
+        for category in removed:
+            conn.execute(
+                "INSERT OR IGNORE INTO temp.thuocl_touched (word_id) SELECT word_id FROM word_categories WHERE category = ?",
+                (category,),
             )
-            inserts += 1
+            left = conn.execute("DELETE FROM word_categories WHERE category = ?", (category,)).rowcount
+            conn.execute("DELETE FROM thuocl_files WHERE category = ?", (category,))
+            result["categories"].append((category, 0, left, 0))
+        timer.mark("categories")
+
+        # Words no category lists any more.
+        conn.execute(
+            """
+            INSERT INTO temp.thuocl_changed_words (id, word)
+            SELECT cw.id, cw.word
+            FROM temp.thuocl_touched t
+            JOIN common_words cw ON cw.id = t.word_id
+            WHERE NOT EXISTS (SELECT 1 FROM word_categories wc WHERE wc.word_id = t.word_id)
+            """
+        )
+        # Point deletes: a row-value IN only seeks on hanzi and walks each
+        # character's whole index range.
+        pairs = conn.execute(WORD_CHARACTERS.format(words="temp.thuocl_changed_words")).fetchall()
+        result["index_removed"] = conn.executemany(
+            "DELETE FROM character_word_index WHERE hanzi = ? AND word_id = ?", pairs
+        ).rowcount
+        result["words_removed"] = conn.execute(
+            "DELETE FROM common_words WHERE id IN (SELECT id FROM temp.thuocl_changed_words)"
+        ).rowcount
+        conn.execute(
+            """
+            UPDATE common_words
+            SET frequency = (SELECT MAX(frequency) FROM word_categories wc WHERE wc.word_id = common_words.id)
+            WHERE id IN (SELECT word_id FROM temp.thuocl_touched)
+            """
+        )
+
+        # Words new to the table; AUTOINCREMENT keeps their ids above the watermark.
+        conn.execute("DELETE FROM temp.thuocl_changed_words")
+        result["words_added"] = conn.execute(
+            "INSERT INTO temp.thuocl_changed_words (id, word) SELECT id, word FROM common_words WHERE id > ?",
+            (watermark,),
+        ).rowcount
+        result["index_added"] = conn.execute(
+            "INSERT OR IGNORE INTO character_word_index (hanzi, word_id)"
+            + WORD_CHARACTERS.format(words="temp.thuocl_changed_words")
+        ).rowcount
+        timer.mark("words")
+
+        record_files(
+            conn,
+            thuocl_dir,
+            [file + (len(words),) for file, words in zip(changed, parsed)],
+        )
+        update_stats(conn, restat)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    for table in ("thuocl_words", "thuocl_delta", "thuocl_touched", "thuocl_changed_words"):
+        conn.execute(f"DROP TABLE temp.{table}")
+    timer.mark("commit")
+    return result
+
+
+def apply_category(conn: sqlite3.Connection, category: str, words: Dict[str, int]) -> Tuple[int, int, int]:
+    """Make ``category``'s rows in word_categories equal ``words``; (entered, left, changed).
+
+    Every word whose categories change is added to temp.thuocl_touched.
+    Runs inside incremental_import's transaction.
+    """
+    conn.execute("DELETE FROM temp.thuocl_words")
+    conn.execute("DELETE FROM temp.thuocl_delta")
+    conn.executemany("INSERT INTO temp.thuocl_words (word, frequency) VALUES (?, ?)", words.items())
+    conn.execute("INSERT OR IGNORE INTO common_words (word, frequency) SELECT word, frequency FROM temp.thuocl_words")
+    conn.execute(
+        """
+        INSERT INTO temp.thuocl_delta (word_id, frequency)
+        SELECT cw.id, w.frequency
+        FROM temp.thuocl_words w
+        JOIN common_words cw ON cw.word = w.word
+        """
+    )
+
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO temp.thuocl_touched (word_id)
+        SELECT word_id FROM word_categories
+        WHERE category = ? AND word_id NOT IN (SELECT word_id FROM temp.thuocl_delta)
+        """,
+        (category,),
+    )
+    left = conn.execute(
+        "DELETE FROM word_categories WHERE category = ? AND word_id NOT IN (SELECT word_id FROM temp.thuocl_delta)",
+        (category,),
+    ).rowcount
+
+    entered, changed = conn.execute(
+        """
+        SELECT COALESCE(SUM(wc.frequency IS NULL), 0),
+               COALESCE(SUM(wc.frequency != d.frequency), 0)
+        FROM temp.thuocl_delta d
+        LEFT JOIN word_categories wc ON wc.category = ? AND wc.word_id = d.word_id
+        """,
+        (category,),
+    ).fetchone()
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO temp.thuocl_touched (word_id)
+        SELECT d.word_id
+        FROM temp.thuocl_delta d
+        LEFT JOIN word_categories wc ON wc.category = ? AND wc.word_id = d.word_id
+        WHERE wc.frequency IS NULL OR wc.frequency != d.frequency
+        """,
+        (category,),
+    )
+    # WHERE 1 keeps the parser from reading ON CONFLICT as a join constraint.
+    conn.execute(
+        """
+        INSERT INTO word_categories (word_id, category, frequency)
+        SELECT word_id, ?, frequency FROM temp.thuocl_delta WHERE 1
+        ON CONFLICT(category, word_id) DO UPDATE SET frequency = excluded.frequency
+        WHERE frequency != excluded.frequency
+        """,
+        (category,),
+    )
+    return entered, left, changed
+
+
+def rank_top_words(
+    words: Iterable[Tuple[str, int]], n: int
+) -> Iterator[Tuple[str, List[Tuple[int, str]]]]:
+    """(hanzi, [(-frequency, word), ...]) per character in hanzi order, best first.
+
+    ``words`` must be unique; each counts once per distinct character, like
+    ``character_word_index``.
+    """
+    candidates: Dict[str, list] = {}
+    for word, frequency in words:
+        for hanzi in set(word):
+            candidates.setdefault(hanzi, []).append((-frequency, word))
+    for hanzi in sorted(candidates):
+        yield hanzi, heapq.nsmallest(n, candidates[hanzi])
+
+
+def build_top_words(conn: sqlite3.Connection, n: int) -> int:
+    """Rebuild ``character_top_words`` with ``n`` words per character; returns rows written.
+
+    Ranking needs window functions before SQLite 3.25, so it is done here.
+    Readers see the old table until the rename commits.
+    """
+    conn.commit()
+    conn.execute("DROP TABLE IF EXISTS character_top_words_new")
+    conn.execute(
+        """
+        CREATE TABLE character_top_words_new (
+            hanzi TEXT NOT NULL,
+            rank INTEGER NOT NULL,
+            word TEXT NOT NULL,
+            frequency INTEGER NOT NULL,
+            PRIMARY KEY (hanzi, rank)
+        ) WITHOUT ROWID
+        """
+    )
+    ranked = rank_top_words(conn.execute("SELECT word, frequency FROM common_words").fetchall(), n)
+    rows = (
+        (hanzi, rank, word, -negative_frequency)
+        for hanzi, words in ranked
+        for rank, (negative_frequency, word) in enumerate(words, 1)
+    )
+    cursor = conn.executemany(
+        "INSERT INTO character_top_words_new (hanzi, rank, word, frequency) VALUES (?, ?, ?, ?)", rows
+    )
+    written = cursor.rowcount
     conn.commit()
-    return inserts
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DROP TABLE character_top_words")
+        conn.execute("ALTER TABLE character_top_words_new RENAME TO character_top_words")
+        conn.execute(
+            """
+            INSERT INTO thuocl_version (id, version, top_words) VALUES (1, 0, ?)
+            ON CONFLICT(id) DO UPDATE SET top_words = excluded.top_words
+            """,
+            (n,),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return written
+
+
+def configured_minimum() -> int:
+    """dictionary.max_common_words when the app config is importable (run with -m), else 1."""
+    try:
+        from app.core.config import get_config_path, load_config
+
+        return load_config(get_config_path()).dictionary.max_common_words
+    except (ImportError, OSError, KeyError):
+        return 1
 
 
 def main():
     parser = argparse.ArgumentParser(description="Import THUOCL word list into SQLite.")
     parser.add_argument("--db-path", required=True, help="Path to SQLite database file")
     parser.add_argument("--thuocl-dir", required=True, help="Directory containing THUOCL word list files")
+    parser.add_argument(
+        "--top-words",
+        type=int,
+        default=DEFAULT_TOP_WORDS,
+        help=f"Words per character in character_top_words (default {DEFAULT_TOP_WORDS})",
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Rebuild the word tables from the files (parallel parse, set-based index build)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Parser processes for --bulk (default: CPU count)",
+    )
     args = parser.parse_args()
+    minimum = configured_minimum()
+    if args.top_words < minimum:
+        parser.error(f"--top-words must be at least {minimum} (dictionary.max_common_words)")
 
     os.makedirs(os.path.dirname(args.db_path), exist_ok=True)
+    timer = PhaseTimer()
+    ranked: Optional[int] = None
     conn = sqlite3.connect(args.db_path)
     try:
         init_db(conn)
-        imported = import_words(conn, args.thuocl_dir)
-        indexed = build_index(conn)
+        if args.bulk:
+            imported, words, indexed = bulk_import(conn, args.thuocl_dir, args.workers, timer)
+            modified = True
+        else:
+            result = incremental_import(conn, args.thuocl_dir, args.workers, timer)
+            modified = bool(result["categories"])
+        if modified or read_top_words_depth(conn) != args.top_words:
+            ranked = build_top_words(conn, args.top_words)
+            timer.mark("top words")
+            bump_version(conn)
     finally:
         conn.close()
 
-    print(f"Imported lines: {imported}")
-    print(f"Indexed entries: {indexed}")
+    if args.bulk:
+        print(f"Imported lines: {imported}")
+        print(f"Distinct words: {words}")
+        print(f"Indexed entries: {indexed}")
+    else:
+        print(
+            f"Files: {result['files']} ({result['parsed']} parsed, "
+            f"{len(result['removed'])} removed, {result['files'] - result['parsed']} unchanged)"
+        )
+        for category, entered, left, changed in result["categories"]:
+            print(f"  {category}: +{entered} -{left} ~{changed}")
+        print(f"Words: +{result['words_added']} -{result['words_removed']}")
+        print(f"Indexed entries: +{result['index_added']} -{result['index_removed']}")
+    if ranked is None:
+        print("Top words: up to date")
+    else:
+        print(f"Top words: {ranked} ({args.top_words} per character)")
+    print("Timing:")
+    print(timer.report())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,304 @@
+"""Compact in-memory top-K common words per character.
+
+Built once from the THUOCL files or the SQLite tables, then every lookup is
+a binary search and a few array reads:
+
+    code_points   sorted code points of every indexed character
+    char_offsets  entries[char_offsets[i]:char_offsets[i + 1]] are character
+                  i's word ids, most frequent first (ties by word)
+    word_offsets  blob[word_offsets[w]:word_offsets[w + 1]] is word w
+    frequencies   frequency of word w
+    blob          every kept word, concatenated
+
+Only words that make some character's top K are kept. A snapshot file
+holds the same arrays, stamped with the ``thuocl_version`` it was built
+from, so a server can skip the rebuild on startup.
+
+    python -m app.services.dictionary.top_words --db-path backend/data/app.db
+    python -m app.services.dictionary.top_words --thuocl-dir backend/data/thuocl --snapshot /tmp/top.bin
+"""
+
+
+import argparse
+import os
+import sqlite3
+import struct
+import sys
+import time
+import tracemalloc
+from array import array
+from bisect import bisect_left
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.services.dictionary.thuocl_import import (
+    iter_thuocl_files,
+    parse_file,
+    rank_top_words,
+    read_top_words_depth,
+    read_version,
+)
+
+
+MAGIC = b"HZTW"
+FORMAT_VERSION = 1
+# magic, format, k, characters, words, entries, blob bytes, thuocl_version
+HEADER = struct.Struct("<4sHHIIIIq")
+# Snapshot built from the text files rather than a versioned database.
+UNVERSIONED = -1
+
+
+class TopWordsIndex:
+    def __init__(
+        self,
+        k: int,
+        code_points: array,
+        char_offsets: array,
+        entries: array,
+        word_offsets: array,
+        frequencies: array,
+        blob: str,
+        version: int = UNVERSIONED,
+    ) -> None:
+        self.k = k
+        self.code_points = code_points
+        self.char_offsets = char_offsets
+        self.entries = entries
+        self.word_offsets = word_offsets
+        self.frequencies = frequencies
+        self.blob = blob
+        self.version = version
+
+    def lookup(self, hanzi: str, limit: int) -> List[dict]:
+        """Top ``min(limit, k)`` words for one character."""
+        if len(hanzi) != 1 or limit <= 0:
+            return []
+        code_point = ord(hanzi)
+        i = bisect_left(self.code_points, code_point)
+        if i == len(self.code_points) or self.code_points[i] != code_point:
+            return []
+        start = self.char_offsets[i]
+        end = min(self.char_offsets[i + 1], start + limit)
+        words = []
+        for word_id in self.entries[start:end]:
+            words.append(
+                {
+                    "word": self.blob[self.word_offsets[word_id] : self.word_offsets[word_id + 1]],
+                    "frequency": self.frequencies[word_id],
+                }
+            )
+        return words
+
+    def nbytes(self) -> int:
+        arrays = (self.code_points, self.char_offsets, self.entries, self.word_offsets, self.frequencies)
+        return sum(a.itemsize * len(a) for a in arrays) + sys.getsizeof(self.blob)
+
+    def save(self, path: str) -> None:
+        """Write a snapshot atomically (readers see the old file or the new one)."""
+        blob = self.blob.encode("utf-8")
+        header = HEADER.pack(
+            MAGIC,
+            FORMAT_VERSION,
+            self.k,
+            len(self.code_points),
+            len(self.word_offsets) - 1,
+            len(self.entries),
+            len(blob),
+            self.version,
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            for a in (self.code_points, self.char_offsets, self.entries, self.word_offsets, self.frequencies):
+                f.write(_little_endian(a).tobytes())
+            f.write(blob)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TopWordsIndex":
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, format_version, k, char_count, word_count, entry_count, blob_size, version = (
+            HEADER.unpack_from(data, 0)
+        )
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} top words snapshot")
+        position = HEADER.size
+        arrays = []
+        for typecode, length in (
+            ("I", char_count),
+            ("I", char_count + 1),
+            ("I", entry_count),
+            ("I", word_count + 1),
+            ("q", word_count),
+        ):
+            a = array(typecode)
+            size = a.itemsize * length
+            a.frombytes(data[position : position + size])
+            arrays.append(_little_endian(a))
+            position += size
+        if position + blob_size != len(data):
+            raise ValueError(f"{path} is truncated or corrupt")
+        blob = data[position:].decode("utf-8")
+        return cls(k, *arrays, blob=blob, version=version)
+
+
+def _little_endian(a: array) -> array:
+    """Snapshots are little-endian; swap on big-endian hosts (either direction)."""
+    if sys.byteorder == "big":
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a
+
+
+def build_index(words: Iterable[Tuple[str, int]], k: int, version: int = UNVERSIONED) -> TopWordsIndex:
+    """Rank (word, frequency) pairs into a TopWordsIndex; words must be unique."""
+    return pack_ranked(
+        ((hanzi, [(word, -negative) for negative, word in best]) for hanzi, best in rank_top_words(words, k)),
+        k,
+        version,
+    )
+
+
+def pack_ranked(
+    ranked: Iterable[Tuple[str, List[Tuple[str, int]]]], k: int, version: int = UNVERSIONED
+) -> TopWordsIndex:
+    """Pack (hanzi, [(word, frequency), ...]) lists, in hanzi order and best first."""
+    code_points = array("I")
+    char_offsets = array("I", [0])
+    entries = array("I")
+    word_offsets = array("I", [0])
+    frequencies = array("q")
+    word_ids: Dict[str, int] = {}
+    parts: List[str] = []
+    length = 0
+    for hanzi, words in ranked:
+        for word, frequency in words[:k]:
+            word_id = word_ids.get(word)
+            if word_id is None:
+                word_id = word_ids[word] = len(frequencies)
+                parts.append(word)
+                length += len(word)
+                word_offsets.append(length)
+                frequencies.append(frequency)
+            entries.append(word_id)
+        code_points.append(ord(hanzi))
+        char_offsets.append(len(entries))
+    return TopWordsIndex(
+        k, code_points, char_offsets, entries, word_offsets, frequencies, "".join(parts), version
+    )
+
+
+def read_thuocl_files(thuocl_dir: str) -> Dict[str, int]:
+    """{word: frequency} the way thuocl_import loads it (highest frequency across files)."""
+    words: Dict[str, int] = {}
+    for path in iter_thuocl_files(thuocl_dir):
+        for word, frequency in parse_file(path):
+            if word not in words or frequency > words[word]:
+                words[word] = frequency
+    return words
+
+
+def build_from_db(conn: sqlite3.Connection, k: int) -> TopWordsIndex:
+    """Index the THUOCL tables; call inside a read transaction so the version matches.
+
+    Reads ``character_top_words`` when it holds at least ``k`` words per
+    character, otherwise ranks the whole ``common_words`` table.
+    """
+    version = read_version(conn)
+    if read_top_words_depth(conn) >= k:
+        cursor = conn.execute(
+            "SELECT hanzi, word, frequency FROM character_top_words WHERE rank <= ? ORDER BY hanzi, rank",
+            (k,),
+        )
+        cursor.arraysize = 4096
+        return pack_ranked(
+            (
+                (hanzi, [(row[1], row[2]) for row in rows])
+                for hanzi, rows in groupby(cursor, key=lambda row: row[0])
+            ),
+            k,
+            version,
+        )
+    cursor = conn.execute("SELECT word, frequency FROM common_words")
+    cursor.arraysize = 4096
+    return build_index(((row[0], row[1]) for row in cursor), k, version)
+
+
+def build_from_files(thuocl_dir: str, k: int) -> TopWordsIndex:
+    return build_index(read_thuocl_files(thuocl_dir).items(), k)
+
+
+def load_snapshot(path: str, k: int, version: int) -> Optional[TopWordsIndex]:
+    """The snapshot at ``path`` if it was built from ``version`` with at least ``k`` words per character."""
+    try:
+        index = TopWordsIndex.load(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    if index.version != version or index.k < k:
+        return None
+    return index
+
+
+def build(args) -> Tuple[TopWordsIndex, int, float]:
+    """(index, source words, seconds spent reading files) for the CLI arguments."""
+    if args.thuocl_dir:
+        started = time.perf_counter()
+        words = read_thuocl_files(args.thuocl_dir)
+        read_time = time.perf_counter() - started
+        return build_index(words.items(), args.k), len(words), read_time
+    conn = sqlite3.connect(args.db_path)
+    try:
+        conn.execute("BEGIN")
+        source_words = conn.execute("SELECT COUNT(*) FROM common_words").fetchone()[0]
+        return build_from_db(conn, args.k), source_words, 0.0
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the top-K common words index and report its cost.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--thuocl-dir", help="Directory of THUOCL word list files")
+    source.add_argument("--db-path", help="SQLite file with imported THUOCL tables")
+    parser.add_argument("--k", type=int, default=10, help="Words kept per character")
+    parser.add_argument("--snapshot", default=None, help="Also write a snapshot here and time loading it")
+    parser.add_argument("--peak", action="store_true", help="Build again under tracemalloc for peak memory")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index, source_words, read_time = build(args)
+    build_time = time.perf_counter() - started
+    print(
+        f"{source_words} words -> {len(index.code_points)} characters, "
+        f"{len(index.frequencies)} kept words, {len(index.entries)} entries (k={index.k})"
+    )
+    print(f"build {build_time:.2f}s (reading files {read_time:.2f}s)")
+    print(f"index {index.nbytes() / 1048576:.2f} MiB in memory")
+    if args.peak:
+        tracemalloc.start()
+        build(args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"peak {peak / 1048576:.1f} MiB allocated while building")
+
+    sample = [chr(code_point) for code_point in index.code_points]
+    started = time.perf_counter()
+    for hanzi in sample:
+        index.lookup(hanzi, 3)
+    if sample:
+        print(f"lookup(limit=3): {(time.perf_counter() - started) / len(sample) * 1e6:.1f} us per character")
+
+    if args.snapshot:
+        index.save(args.snapshot)
+        started = time.perf_counter()
+        TopWordsIndex.load(args.snapshot)
+        print(
+            f"snapshot {args.snapshot}: {os.path.getsize(args.snapshot) / 1048576:.2f} MiB, "
+            f"loads in {(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""In-process due-card index per (user, dictionary).
+
+Each loaded entry keeps the user's queue for one dictionary in memory:
+never-reviewed character ids in id order and reviewed cards as a sorted
+list of (next_review_at, character_id). Due counts and queue pages are
+answered with ``bisect`` in O(log n) plus the page size, without touching
+SQLite. A sorted list is used rather than a heap because queue pages seek to
+a keyset cursor, which a heap cannot do. Updates find their place in
+O(log n) but the list insert and delete move O(n) references (one
+``memmove``); at a few thousand cards per dictionary that stays far below
+the cost of the SQLite write that triggers it.
+
+Entries are loaded lazily from the tables and kept in an LRU bounded by
+``max_entries``; evicted entries are simply rebuilt on the next request, so a
+restart only costs one load per active user. Writers update entries after
+commit (see ``WriteQueue.after_commit``).
+
+Other processes (more API workers, ``replay``, ``check_stats --fix``) write
+the same tables without touching this index, so every entry remembers the
+persisted ``data_versions`` pair (shared, user) it was loaded at and each
+query passes the current pair: an entry whose pair has moved is reloaded.
+Writes made here advance the pair in place, but only by one step, so a write
+from elsewhere in between still shows up as a gap and forces a reload.
+"""
+
+
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+Key = Tuple[str, int]
+# (shared, user) counters from ``data_versions``.
+Version = Tuple[int, int]
+
+SECONDS_PER_DAY = 86400
+
+
+class DueEntry:
+    def __init__(self, rows: List[tuple], version: Version = (0, 0)) -> None:
+        """``rows`` are (character_id, hanzi, pinyin, has_record, next_review_at)."""
+        self.version = version
+        self.cards: Dict[int, Tuple[str, str]] = {}
+        self.next_review: Dict[int, int] = {}
+        self.new_ids: List[int] = []
+        self.due: List[Tuple[int, int]] = []
+        for character_id, hanzi, pinyin, has_record, next_review_at in rows:
+            self.cards[character_id] = (hanzi, pinyin)
+            if not has_record:
+                self.new_ids.append(character_id)
+            elif next_review_at is not None:
+                self.next_review[character_id] = next_review_at
+                self.due.append((next_review_at, character_id))
+        self.new_ids.sort()
+        self.due.sort()
+
+    def add_character(self, character_id: int, hanzi: str, pinyin: str) -> None:
+        if character_id in self.cards:
+            return
+        self.cards[character_id] = (hanzi, pinyin)
+        if not self.new_ids or character_id > self.new_ids[-1]:
+            self.new_ids.append(character_id)
+        else:
+            insort(self.new_ids, character_id)
+
+    def set_next_review(self, character_id: int, next_review_at: int) -> None:
+        pos = bisect_left(self.new_ids, character_id)
+        if pos < len(self.new_ids) and self.new_ids[pos] == character_id:
+            del self.new_ids[pos]
+        previous = self.next_review.get(character_id)
+        if previous is not None:
+            pos = bisect_left(self.due, (previous, character_id))
+            del self.due[pos]
+        self.next_review[character_id] = next_review_at
+        insort(self.due, (next_review_at, character_id))
+
+    def new_cards(self, after_id: int, limit: int) -> List[dict]:
+        start = bisect_right(self.new_ids, after_id)
+        items = []
+        for character_id in self.new_ids[start:start + limit]:
+            hanzi, pinyin = self.cards[character_id]
+            items.append({"id": character_id, "hanzi": hanzi, "pinyin": pinyin})
+        return items
+
+    def due_cards(self, now: int, after: Tuple[int, int], limit: int) -> List[dict]:
+        start = bisect_right(self.due, tuple(after))
+        end = min(self._due_end(now), start + limit)
+        items = []
+        for next_review_at, character_id in self.due[start:end]:
+            hanzi, pinyin = self.cards[character_id]
+            items.append(
+                {
+                    "id": character_id,
+                    "hanzi": hanzi,
+                    "pinyin": pinyin,
+                    "next_review_at": next_review_at,
+                }
+            )
+        return items
+
+    def count_due(self, now: int) -> int:
+        return self._due_end(now)
+
+    def next_due_after(self, now: int) -> Optional[int]:
+        pos = self._due_end(now)
+        return self.due[pos][0] if pos < len(self.due) else None
+
+    def count_due_by_day(self, start: int, days: int) -> List[int]:
+        counts = []
+        previous = 0
+        for day in range(1, days + 1):
+            end = bisect_left(self.due, (start + day * SECONDS_PER_DAY,))
+            counts.append(end - previous)
+            previous = end
+        return counts
+
+    def _due_end(self, now: int) -> int:
+        return bisect_right(self.due, (now, float("inf")))
+
+
+class DueIndex:
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Key, DueEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._loads = 0
+        self._reloads = 0
+        self._evictions = 0
+
+    def query(
+        self,
+        user_id: str,
+        dictionary_id: int,
+        version: Version,
+        load: Callable[[], Tuple[Version, List[tuple]]],
+        fn: Callable[[DueEntry], object],
+    ):
+        """Run ``fn(entry)`` on the entry for (user, dictionary), loading it if needed.
+
+        ``version`` is the persisted pair as of this request; ``load`` returns
+        the pair and the rows read in one snapshot.
+        """
+        key = (user_id, dictionary_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.version == tuple(version):
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return fn(entry)
+                self._reloads += 1
+
+        loaded_version, rows = load()
+        entry = DueEntry(rows, tuple(loaded_version))
+
+        with self._lock:
+            self._loads += 1
+            current = self._entries.get(key)
+            # A concurrent load may have cached a newer snapshot already.
+            if current is None or current.version < entry.version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+            return fn(entry)
+
+    @staticmethod
+    def _advance(entry: DueEntry, user_id: str, version: int) -> None:
+        # Only by one step: a gap means a write from elsewhere the entry lacks.
+        shared, own = entry.version
+        if user_id == "":
+            if shared == version - 1:
+                entry.version = (version, own)
+        elif own == version - 1:
+            entry.version = (shared, version)
+
+    def version_bumped(self, dictionary_id: int, user_id: str, version: int) -> None:
+        """Advance entries past a write that changed no card (user ``''`` is the shared counter)."""
+        with self._lock:
+            for (entry_user_id, entry_dictionary_id), entry in self._entries.items():
+                if entry_dictionary_id == dictionary_id and user_id in ("", entry_user_id):
+                    self._advance(entry, user_id, version)
+
+    def characters_added(
+        self, dictionary_id: int, rows: List[Tuple[int, str, str]], version: int
+    ) -> None:
+        """Add the cards and advance the shared counter to ``version`` in one step."""
+        with self._lock:
+            for (_, entry_dictionary_id), entry in self._entries.items():
+                if entry_dictionary_id != dictionary_id:
+                    continue
+                for character_id, hanzi, pinyin in rows:
+                    entry.add_character(character_id, hanzi, pinyin)
+                self._advance(entry, "", version)
+
+    def reviewed(
+        self, user_id: str, dictionary_id: int, character_id: int, next_review_at: int, version: int
+    ) -> None:
+        """Move the card and advance the user counter to ``version`` in one step.
+
+        Doing both under one lock means a concurrent load can never end up
+        cached at ``version`` without this review.
+        """
+        with self._lock:
+            entry = self._entries.get((user_id, dictionary_id))
+            if entry is None:
+                return
+            if character_id not in entry.cards:
+                # Should not happen; drop the entry so it reloads from the tables.
+                del self._entries[(user_id, dictionary_id)]
+                return
+            entry.set_next_review(character_id, next_review_at)
+            self._advance(entry, user_id, version)
+
+    def dictionary_removed(self, dictionary_id: int) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == dictionary_id]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "loads": self._loads,
+                "reloads": self._reloads,
+                "evictions": self._evictions,
+            }
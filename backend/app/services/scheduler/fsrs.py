@@ -0,0 +1,147 @@
+"""FSRS scheduling algorithm (v4.5 model).
+
+Each card carries a memory stability (days until recall probability drops to
+90%) and a difficulty in [1, 10]. Reviews update both from the grade and the
+recall probability at review time; the next interval is the time until
+recall probability falls to ``desired_retention``. The 17 weights can be fit
+per user from the review log (see ``fsrs_optimize``); ``DEFAULT_PARAMETERS``
+are the published population defaults.
+
+Ratings use the app's 0-5 scale and map to FSRS grades with ``to_grade``.
+"""
+
+
+import math
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Sequence, Tuple
+
+
+DECAY = -0.5
+FACTOR = 19 / 81
+DESIRED_RETENTION = 0.9
+MIN_STABILITY = 0.01
+MAX_INTERVAL = 36500
+SECONDS_PER_DAY = 86400
+
+DEFAULT_PARAMETERS: List[float] = [
+    0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+    0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755,
+]
+
+# (low, high) for each weight; the optimizer clips to these after every step.
+PARAMETER_BOUNDS: List[Tuple[float, float]] = [
+    (0.1, 100.0), (0.1, 100.0), (0.1, 100.0), (0.1, 100.0),
+    (1.0, 10.0), (0.1, 5.0), (0.1, 5.0), (0.0, 0.5), (0.0, 3.0),
+    (0.1, 0.8), (0.01, 2.5), (0.5, 5.0), (0.01, 0.2), (0.01, 0.9),
+    (0.01, 2.0), (0.0, 1.0), (1.0, 4.0),
+]
+
+
+class FsrsResult:
+    def __init__(
+        self,
+        stability: float,
+        difficulty: float,
+        interval: int,
+        repetitions: int,
+        next_review_at: datetime,
+    ) -> None:
+        self.stability = stability
+        self.difficulty = difficulty
+        self.interval = interval
+        self.repetitions = repetitions
+        self.next_review_at = next_review_at
+
+
+def to_grade(rating: int) -> int:
+    """Map a 0-5 rating to an FSRS grade: 1 again, 2 hard, 3 good, 4 easy."""
+    if rating < 3:
+        return 1
+    return min(rating, 5) - 1
+
+
+def retrievability(elapsed_days: float, stability: float) -> float:
+    return (1 + FACTOR * elapsed_days / stability) ** DECAY
+
+
+def initial_stability(w: Sequence[float], grade: int) -> float:
+    return max(w[grade - 1], MIN_STABILITY)
+
+
+def initial_difficulty(w: Sequence[float], grade: int) -> float:
+    return min(max(w[4] - (grade - 3) * w[5], 1.0), 10.0)
+
+
+def next_difficulty(w: Sequence[float], difficulty: float, grade: int) -> float:
+    # Mean reversion towards the initial difficulty of a "good" first review.
+    value = w[7] * w[4] + (1 - w[7]) * (difficulty - w[6] * (grade - 3))
+    return min(max(value, 1.0), 10.0)
+
+
+def next_stability(
+    w: Sequence[float], stability: float, difficulty: float, recall: float, grade: int
+) -> float:
+    if grade > 1:
+        hard_penalty = w[15] if grade == 2 else 1.0
+        easy_bonus = w[16] if grade == 4 else 1.0
+        value = stability * (
+            1
+            + math.exp(w[8])
+            * (11 - difficulty)
+            * stability ** -w[9]
+            * (math.exp(w[10] * (1 - recall)) - 1)
+            * hard_penalty
+            * easy_bonus
+        )
+    else:
+        value = (
+            w[11]
+            * difficulty ** -w[12]
+            * ((stability + 1) ** w[13] - 1)
+            * math.exp(w[14] * (1 - recall))
+        )
+    return min(max(value, MIN_STABILITY), MAX_INTERVAL)
+
+
+def next_interval(stability: float, desired_retention: float = DESIRED_RETENTION) -> int:
+    days = stability / FACTOR * (desired_retention ** (1 / DECAY) - 1)
+    return min(max(int(round(days)), 1), MAX_INTERVAL)
+
+
+def apply_fsrs(
+    *,
+    stability: Optional[float],
+    difficulty: Optional[float],
+    repetitions: int,
+    last_reviewed_at: Optional[datetime],
+    rating: int,
+    reviewed_at: Optional[datetime] = None,
+    parameters: Optional[Sequence[float]] = None,
+    desired_retention: float = DESIRED_RETENTION,
+) -> FsrsResult:
+    if reviewed_at is None:
+        reviewed_at = datetime.now(timezone.utc)
+    w = parameters or DEFAULT_PARAMETERS
+    grade = to_grade(rating)
+
+    # A card without FSRS state (new, or last scheduled by SM-2) starts fresh.
+    if stability is None or difficulty is None or last_reviewed_at is None:
+        stability = initial_stability(w, grade)
+        difficulty = initial_difficulty(w, grade)
+    else:
+        elapsed = max((reviewed_at - last_reviewed_at).total_seconds(), 0) / SECONDS_PER_DAY
+        recall = retrievability(elapsed, stability)
+        stability, difficulty = (
+            next_stability(w, stability, difficulty, recall, grade),
+            next_difficulty(w, difficulty, grade),
+        )
+
+    repetitions = repetitions + 1 if grade > 1 else 0
+    interval = next_interval(stability, desired_retention)
+    return FsrsResult(
+        stability=stability,
+        difficulty=difficulty,
+        interval=interval,
+        repetitions=repetitions,
+        next_review_at=reviewed_at + timedelta(days=interval),
+    )
@@ -0,0 +1,114 @@
+"""Benchmark the FSRS optimizer on synthetic review histories.
+
+Histories are simulated with the scalar scheduler and a perturbed set of
+"true" weights, so a good fit should approach the true weights' loss. Also
+checks the analytic gradient against central finite differences.
+
+    python -m app.services.scheduler.fsrs_bench --reviews 100000
+"""
+
+
+import argparse
+import time
+
+import numpy as np
+
+from app.services.scheduler.fsrs import (
+    DEFAULT_PARAMETERS,
+    PARAMETER_BOUNDS,
+    SECONDS_PER_DAY,
+    initial_difficulty,
+    initial_stability,
+    next_difficulty,
+    next_interval,
+    next_stability,
+    retrievability,
+)
+from app.services.scheduler.fsrs_optimize import build_history, loss_and_gradient, optimize_parameters
+
+
+# Grade -> app rating (0-5), the inverse of fsrs.to_grade.
+RATINGS = {1: 1, 2: 3, 3: 4, 4: 5}
+
+
+def true_parameters(seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    w = np.array(DEFAULT_PARAMETERS) * rng.uniform(0.7, 1.3, len(DEFAULT_PARAMETERS))
+    return np.clip(w, [b[0] for b in PARAMETER_BOUNDS], [b[1] for b in PARAMETER_BOUNDS])
+
+
+def simulate_history(w, reviews: int, seed: int):
+    """Review log rows for cards studied on schedule with jittered delays."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    character_id = 0
+    while len(rows) < reviews:
+        character_id += 1
+        length = int(rng.integers(2, 25))
+        now = 1700000000 + int(rng.integers(0, 30 * SECONDS_PER_DAY))
+        grade = int(rng.choice([1, 2, 3, 4], p=[0.3, 0.1, 0.5, 0.1]))
+        stability = initial_stability(w, grade)
+        difficulty = initial_difficulty(w, grade)
+        rows.append((1, character_id, RATINGS[grade], now))
+        for _ in range(length - 1):
+            delay = next_interval(stability) * rng.uniform(0.8, 1.6)
+            now += int(delay * SECONDS_PER_DAY)
+            recall = retrievability(delay, stability)
+            if rng.random() < recall:
+                grade = int(rng.choice([2, 3, 4], p=[0.15, 0.7, 0.15]))
+            else:
+                grade = 1
+            stability, difficulty = (
+                next_stability(w, stability, difficulty, recall, grade),
+                next_difficulty(w, difficulty, grade),
+            )
+            rows.append((1, character_id, RATINGS[grade], now))
+    return rows[:reviews]
+
+
+def gradient_error(w: np.ndarray, history, step: float = 1e-6) -> float:
+    """Largest relative difference between the analytic and numeric gradient."""
+    _, analytic = loss_and_gradient(w, history)
+    numeric = np.zeros_like(w)
+    for i in range(len(w)):
+        up = w.copy()
+        down = w.copy()
+        up[i] += step
+        down[i] -= step
+        numeric[i] = (loss_and_gradient(up, history)[0] - loss_and_gradient(down, history)[0]) / (2 * step)
+    return float(np.max(np.abs(analytic - numeric) / np.maximum(np.abs(numeric), 1e-4)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time the FSRS optimizer on synthetic data.")
+    parser.add_argument("--reviews", type=int, default=100000)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    w_true = true_parameters(args.seed)
+    rows = simulate_history(w_true, args.reviews, args.seed)
+
+    started = time.perf_counter()
+    history = build_history(rows)
+    build_time = time.perf_counter() - started
+    print(
+        f"{history.review_count} reviews, {history.card_count} cards, "
+        f"{len(history.grades)} positions; layout {build_time:.3f}s"
+    )
+
+    started = time.perf_counter()
+    loss_and_gradient(np.array(DEFAULT_PARAMETERS), history)
+    print(f"one loss+gradient pass: {time.perf_counter() - started:.3f}s")
+    print(f"gradient check (max relative error): {gradient_error(np.array(DEFAULT_PARAMETERS), history):.2e}")
+
+    result = optimize_parameters(history, iterations=args.iterations)
+    true_loss, _ = loss_and_gradient(w_true, history)
+    print(
+        f"fit stopped after {result.iterations} iterations in {result.seconds:.2f}s: "
+        f"default {result.initial_loss:.4f} -> fitted {result.loss:.4f} (true weights {true_loss:.4f})"
+    )
+
+
+if __name__ == "__main__":
+    main()
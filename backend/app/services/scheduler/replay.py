@@ -0,0 +1,336 @@
+"""Recompute study_records from the review log.
+
+Streams ``review_log`` for one dictionary (optionally one user) in card and
+review order, replays each card's history through a scheduler from the
+initial state and upserts the final state in bulk. Memory is bounded by
+``--chunk-size``; each flush is one transaction. The dictionary's own
+scheduler is used unless ``--scheduler`` is given; FSRS uses each user's
+fitted weights when they exist. With NumPy installed SM-2 goes through
+``replay_sm2_batch``, advancing a chunk of whole cards one review at a time.
+
+Cards with study records but no log rows (reviews made before the log
+existed) are left untouched. The dictionary's stats counters are rebuilt
+afterwards. Each flush bumps the dictionary's data version, which running
+API workers check before serving their in-memory due index.
+
+    python -m app.services.scheduler.replay --dictionary 1 [--user luosu] [--scheduler sm2]
+"""
+
+
+import argparse
+import json
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.check_stats import bump_shared_version, rebuild_counters
+from app.core.config import get_config_path, load_config
+from app.core.db import connect
+from app.core.timeutil import to_epoch
+from app.services.scheduler.fsrs import apply_fsrs
+from app.services.scheduler.sm2 import apply_sm2
+
+try:
+    from app.services.scheduler.sm2_batch import replay_sm2_batch
+except ImportError:  # NumPy is optional; SM-2 then replays card by card.
+    replay_sm2_batch = None
+
+
+# (ease_factor, interval, repetitions, stability, difficulty, last_reviewed_at)
+State = Tuple[float, int, int, Optional[float], Optional[float], Optional[int]]
+Step = Callable[[State, int, int], Tuple[State, int]]
+
+INITIAL_STATE: State = (2.5, 0, 0, None, None, None)
+
+
+def sm2_step(state: State, rating: int, reviewed_at: int) -> Tuple[State, int]:
+    ease_factor, interval, repetitions = state[:3]
+    result = apply_sm2(
+        ease_factor=ease_factor,
+        interval=interval,
+        repetitions=repetitions,
+        rating=rating,
+        reviewed_at=datetime.fromtimestamp(reviewed_at, timezone.utc),
+    )
+    next_review_at = to_epoch(result.next_review_at)
+    return (
+        (result.ease_factor, result.interval, result.repetitions, None, None, reviewed_at),
+        next_review_at,
+    )
+
+
+def make_sm2_step(parameters: Optional[Sequence[float]]) -> Step:
+    return sm2_step
+
+
+def make_fsrs_step(parameters: Optional[Sequence[float]]) -> Step:
+    def fsrs_step(state: State, rating: int, reviewed_at: int) -> Tuple[State, int]:
+        ease_factor, _, repetitions, stability, difficulty, last_reviewed_at = state
+        result = apply_fsrs(
+            stability=stability,
+            difficulty=difficulty,
+            repetitions=repetitions,
+            last_reviewed_at=(
+                datetime.fromtimestamp(last_reviewed_at, timezone.utc)
+                if last_reviewed_at is not None
+                else None
+            ),
+            rating=rating,
+            reviewed_at=datetime.fromtimestamp(reviewed_at, timezone.utc),
+            parameters=parameters,
+        )
+        return (
+            (
+                ease_factor,
+                result.interval,
+                result.repetitions,
+                result.stability,
+                result.difficulty,
+                reviewed_at,
+            ),
+            to_epoch(result.next_review_at),
+        )
+
+    return fsrs_step
+
+
+# Scheduler name -> factory taking the user's fitted weights (or None).
+SCHEDULERS: Dict[str, Callable[[Optional[Sequence[float]]], Step]] = {
+    "sm2": make_sm2_step,
+    "fsrs": make_fsrs_step,
+}
+
+LOG_BY_DICTIONARY = """
+    SELECT user_id, character_id, rating, reviewed_at
+    FROM review_log
+    WHERE dictionary_id = ?
+    ORDER BY user_id, character_id, reviewed_at, id
+"""
+
+LOG_BY_DICTIONARY_USER = """
+    SELECT user_id, character_id, rating, reviewed_at
+    FROM review_log
+    WHERE dictionary_id = ? AND user_id = ?
+    ORDER BY user_id, character_id, reviewed_at, id
+"""
+
+UPSERT_RECORD = """
+    INSERT INTO study_records (user_id, dictionary_id, character_id, ease_factor, interval, repetitions, stability, difficulty, last_reviewed_at, next_review_at, last_rating)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, dictionary_id, character_id) DO UPDATE SET
+      ease_factor = excluded.ease_factor,
+      interval = excluded.interval,
+      repetitions = excluded.repetitions,
+      stability = excluded.stability,
+      difficulty = excluded.difficulty,
+      last_reviewed_at = excluded.last_reviewed_at,
+      next_review_at = excluded.next_review_at,
+      last_rating = excluded.last_rating
+"""
+
+
+def flush(conn: sqlite3.Connection, dictionary_id: int, pending: List[tuple]) -> None:
+    if not pending:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(UPSERT_RECORD, pending)
+        bump_shared_version(conn, dictionary_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    pending.clear()
+
+
+def refresh_counters(conn: sqlite3.Connection, dictionary_id: int) -> None:
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rebuild_counters(conn, dictionary_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def open_log(read_conn: sqlite3.Connection, dictionary_id: int, user_id: Optional[str]) -> sqlite3.Cursor:
+    if user_id is None:
+        return read_conn.execute(LOG_BY_DICTIONARY, (dictionary_id,))
+    return read_conn.execute(LOG_BY_DICTIONARY_USER, (dictionary_id, user_id))
+
+
+def replay_dictionary(
+    read_conn: sqlite3.Connection,
+    write_conn: sqlite3.Connection,
+    dictionary_id: int,
+    user_id: Optional[str],
+    step_for_user: Callable[[str], Step],
+    chunk_size: int = 5000,
+) -> Tuple[int, int]:
+    """Replay one dictionary; return (cards written, log rows replayed)."""
+    cursor = open_log(read_conn, dictionary_id, user_id)
+    pending: List[tuple] = []
+    cards = 0
+    reviews = 0
+    key = None
+    state = INITIAL_STATE
+    last = None
+
+    def finish_card() -> None:
+        rating, reviewed_at, next_review_at = last
+        pending.append(
+            (key[0], dictionary_id, key[1]) + tuple(state[:5]) + (reviewed_at, next_review_at, rating)
+        )
+
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row_user, character_id, rating, reviewed_at in rows:
+            if (row_user, character_id) != key:
+                if key is not None:
+                    finish_card()
+                    cards += 1
+                key = (row_user, character_id)
+                state = INITIAL_STATE
+                step = step_for_user(row_user)
+            state, next_review_at = step(state, rating, reviewed_at)
+            last = (rating, reviewed_at, next_review_at)
+            reviews += 1
+        if len(pending) >= chunk_size:
+            flush(write_conn, dictionary_id, pending)
+    if key is not None:
+        finish_card()
+        cards += 1
+    flush(write_conn, dictionary_id, pending)
+    # Replayed repetitions can change which cards count as known.
+    refresh_counters(write_conn, dictionary_id)
+    return cards, reviews
+
+
+def replay_dictionary_sm2_batch(
+    read_conn: sqlite3.Connection,
+    write_conn: sqlite3.Connection,
+    dictionary_id: int,
+    user_id: Optional[str],
+    chunk_size: int = 5000,
+) -> Tuple[int, int]:
+    """``replay_dictionary`` for SM-2 through ``replay_sm2_batch``, whole cards per chunk."""
+    cursor = open_log(read_conn, dictionary_id, user_id)
+    keys: List[Tuple[str, int]] = []
+    offsets = [0]
+    ratings: List[int] = []
+    times: List[int] = []
+    cards = 0
+    reviews = 0
+
+    def flush_cards() -> None:
+        ease_factor, interval, repetitions, next_review_at = replay_sm2_batch(offsets, ratings, times)
+        pending = [
+            (card_user, dictionary_id, character_id, ef, iv, rep, None, None, times[end - 1], due, ratings[end - 1])
+            for (card_user, character_id), end, ef, iv, rep, due in zip(
+                keys,
+                offsets[1:],
+                ease_factor.tolist(),
+                interval.tolist(),
+                repetitions.tolist(),
+                next_review_at.tolist(),
+            )
+        ]
+        flush(write_conn, dictionary_id, pending)
+        del keys[:], offsets[1:], ratings[:], times[:]
+
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row_user, character_id, rating, reviewed_at in rows:
+            if not keys or keys[-1] != (row_user, character_id):
+                if keys:
+                    offsets.append(len(ratings))
+                    if len(ratings) >= chunk_size:
+                        cards += len(keys)
+                        flush_cards()
+                keys.append((row_user, character_id))
+            ratings.append(rating)
+            times.append(reviewed_at)
+            reviews += 1
+    if keys:
+        offsets.append(len(ratings))
+        cards += len(keys)
+        flush_cards()
+    refresh_counters(write_conn, dictionary_id)
+    return cards, reviews
+
+
+def load_parameters(conn: sqlite3.Connection, user_id: str, scheduler: str) -> Optional[List[float]]:
+    row = conn.execute(
+        "SELECT parameters FROM scheduler_parameters WHERE user_id = ? AND scheduler = ?",
+        (user_id, scheduler),
+    ).fetchone()
+    return json.loads(row["parameters"]) if row else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recompute study records from the review log.")
+    parser.add_argument("--dictionary", type=int, default=None, help="Dictionary id")
+    parser.add_argument("--user", default=None, help="Only this user's records")
+    parser.add_argument(
+        "--scheduler",
+        choices=sorted(SCHEDULERS),
+        default=None,
+        help="Override the dictionary's scheduler",
+    )
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+    if args.dictionary is None and args.user is None:
+        parser.error("Pass --dictionary, --user or both.")
+
+    settings = load_config(get_config_path())
+    # WAL (set by connect) lets the streaming read and the bulk writes proceed side by side.
+    read_conn = connect(settings.sqlite)
+    write_conn = connect(settings.sqlite)
+    steps: Dict[Tuple[str, str], Step] = {}
+    started = time.monotonic()
+    total_cards = 0
+    total_reviews = 0
+    try:
+        if args.dictionary is not None:
+            dictionaries = read_conn.execute(
+                "SELECT id, scheduler FROM dictionaries WHERE id = ?", (args.dictionary,)
+            ).fetchall()
+        else:
+            dictionaries = read_conn.execute("SELECT id, scheduler FROM dictionaries").fetchall()
+        for dictionary in dictionaries:
+            scheduler = args.scheduler or dictionary["scheduler"]
+
+            def step_for_user(user_id: str) -> Step:
+                key = (scheduler, user_id)
+                if key not in steps:
+                    steps[key] = SCHEDULERS[scheduler](load_parameters(read_conn, user_id, scheduler))
+                return steps[key]
+
+            if scheduler == "sm2" and replay_sm2_batch is not None:
+                cards, reviews = replay_dictionary_sm2_batch(
+                    read_conn, write_conn, dictionary["id"], args.user, args.chunk_size
+                )
+            else:
+                cards, reviews = replay_dictionary(
+                    read_conn, write_conn, dictionary["id"], args.user, step_for_user, args.chunk_size
+                )
+            total_cards += cards
+            total_reviews += reviews
+    finally:
+        read_conn.close()
+        write_conn.close()
+
+    elapsed = time.monotonic() - started
+    print(
+        f"Replayed {total_reviews} reviews into {total_cards} cards "
+        f"from {len(dictionaries)} dictionaries in {elapsed:.1f}s."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Reschedule or reset every card of a dictionary.
+
+``--rating R`` applies one SM-2 review with rating R at ``--at`` (default
+now) to every reviewed card of the dictionary, optionally one user's, with
+``apply_sm2_batch``: e.g. ``--rating 5`` after importing characters a child
+already knows, or ``--rating 0`` to relearn everything after a long break.
+``--include-new`` (needs ``--user``) also reviews the user's never-reviewed
+cards. Cards are streamed in chunks of ``--chunk-size``; each chunk is one
+transaction.
+
+``--reset`` deletes the study records instead, so every card is new again.
+Neither touches ``review_log``: the rescheduled reviews are not real ones,
+and ``replay`` can rebuild the records from the log afterwards. The
+dictionary's stats counters are rebuilt and its data version bumped, so
+running API workers reload their due index. ``--rating`` needs NumPy and
+an SM-2 dictionary.
+
+    python -m app.services.scheduler.reschedule --dictionary 1 [--user luosu] (--rating 5 [--at 2024-01-01T08:00:00Z] [--include-new] | --reset)
+"""
+
+
+import argparse
+import sqlite3
+import time
+from typing import Optional
+
+from app.core.check_stats import rebuild_counters
+from app.core.config import get_config_path, load_config
+from app.core.db import connect
+from app.core.timeutil import parse_iso_datetime, to_epoch
+from app.services.scheduler.replay import flush, refresh_counters
+
+
+RECORDS = """
+    SELECT user_id, character_id, ease_factor, interval, repetitions
+    FROM study_records
+    WHERE dictionary_id = ? AND (? IS NULL OR user_id = ?)
+    ORDER BY user_id, character_id
+"""
+
+NEW_CARDS = """
+    SELECT ? AS user_id, c.id AS character_id, 2.5 AS ease_factor, 0 AS interval, 0 AS repetitions
+    FROM characters c
+    WHERE c.dictionary_id = ?
+      AND NOT EXISTS (
+          SELECT 1 FROM study_records sr
+          WHERE sr.user_id = ? AND sr.dictionary_id = c.dictionary_id AND sr.character_id = c.id
+      )
+    ORDER BY c.id
+"""
+
+
+def reschedule_cursor(
+    cursor: sqlite3.Cursor,
+    write_conn: sqlite3.Connection,
+    dictionary_id: int,
+    rating: int,
+    reviewed_at: int,
+    chunk_size: int,
+) -> int:
+    """Review every card from ``cursor`` once with ``rating``; return how many were written."""
+    from app.services.scheduler.sm2_batch import apply_sm2_batch
+
+    written = 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return written
+        ease_factor, interval, repetitions, next_review_at = apply_sm2_batch(
+            [row["ease_factor"] for row in rows],
+            [row["interval"] for row in rows],
+            [row["repetitions"] for row in rows],
+            rating,
+            reviewed_at,
+        )
+        pending = [
+            (row["user_id"], dictionary_id, row["character_id"], ef, iv, rep, None, None, reviewed_at, due, rating)
+            for row, ef, iv, rep, due in zip(
+                rows,
+                ease_factor.tolist(),
+                interval.tolist(),
+                repetitions.tolist(),
+                next_review_at.tolist(),
+            )
+        ]
+        written += len(pending)
+        flush(write_conn, dictionary_id, pending)
+
+
+def reschedule_dictionary(
+    read_conn: sqlite3.Connection,
+    write_conn: sqlite3.Connection,
+    dictionary_id: int,
+    user_id: Optional[str],
+    rating: int,
+    reviewed_at: int,
+    include_new: bool = False,
+    chunk_size: int = 5000,
+) -> int:
+    """Review every card once; return how many records were written."""
+    cursor = read_conn.execute(RECORDS, (dictionary_id, user_id, user_id))
+    written = reschedule_cursor(cursor, write_conn, dictionary_id, rating, reviewed_at, chunk_size)
+    # After the existing records, so the new cards' fresh records are not reviewed twice.
+    if include_new:
+        cursor = read_conn.execute(NEW_CARDS, (user_id, dictionary_id, user_id))
+        written += reschedule_cursor(cursor, write_conn, dictionary_id, rating, reviewed_at, chunk_size)
+    refresh_counters(write_conn, dictionary_id)
+    return written
+
+
+def reset_dictionary(conn: sqlite3.Connection, dictionary_id: int, user_id: Optional[str]) -> int:
+    """Delete the study records; return how many were removed."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        removed = conn.execute(
+            "DELETE FROM study_records WHERE dictionary_id = ? AND (? IS NULL OR user_id = ?)",
+            (dictionary_id, user_id, user_id),
+        ).rowcount
+        rebuild_counters(conn, dictionary_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return removed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reschedule or reset every card of a dictionary.")
+    parser.add_argument("--dictionary", type=int, required=True, help="Dictionary id")
+    parser.add_argument("--user", default=None, help="Only this user's cards")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--rating", type=int, choices=range(6), help="Review every card with this rating")
+    action.add_argument("--reset", action="store_true", help="Delete the study records")
+    parser.add_argument("--at", default=None, help="Review time, ISO-8601 (default now)")
+    parser.add_argument("--include-new", action="store_true", help="Also review never-reviewed cards")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+    if args.include_new and args.user is None:
+        parser.error("--include-new needs --user.")
+
+    settings = load_config(get_config_path())
+    read_conn = connect(settings.sqlite)
+    write_conn = connect(settings.sqlite)
+    started = time.monotonic()
+    try:
+        dictionary = read_conn.execute(
+            "SELECT id, scheduler FROM dictionaries WHERE id = ?", (args.dictionary,)
+        ).fetchone()
+        if dictionary is None:
+            parser.error(f"Dictionary {args.dictionary} not found.")
+        if args.reset:
+            removed = reset_dictionary(write_conn, args.dictionary, args.user)
+            summary = f"Reset {removed} cards"
+        else:
+            if dictionary["scheduler"] != "sm2":
+                parser.error("--rating only supports SM-2 dictionaries.")
+            reviewed_at = to_epoch(parse_iso_datetime(args.at))
+            written = reschedule_dictionary(
+                read_conn,
+                write_conn,
+                args.dictionary,
+                args.user,
+                args.rating,
+                reviewed_at,
+                args.include_new,
+                args.chunk_size,
+            )
+            summary = f"Rescheduled {written} cards"
+    finally:
+        read_conn.close()
+        write_conn.close()
+
+    print(f"{summary} in dictionary {args.dictionary} in {time.monotonic() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
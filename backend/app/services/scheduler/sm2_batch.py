@@ -0,0 +1,137 @@
+"""Vectorized SM-2 for bulk rescheduling and simulation.
+
+Mirrors ``apply_sm2`` element-wise on NumPy arrays and returns exactly what
+the scalar function would, with timestamps as integer epoch seconds (the
+storage format). Requires NumPy, which is optional for the web app; import
+this module only from code paths that need it.
+"""
+
+
+from typing import Tuple
+
+import numpy as np
+
+
+SECONDS_PER_DAY = 86400
+MIN_EASE_FACTOR = 1.3
+
+
+def apply_sm2_batch(
+    ease_factor: np.ndarray,
+    interval: np.ndarray,
+    repetitions: np.ndarray,
+    rating: np.ndarray,
+    reviewed_at: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Apply one review to every card.
+
+    Inputs broadcast against each other; ``reviewed_at`` is epoch seconds.
+    Returns (ease_factor, interval, repetitions, next_review_at) as new
+    float64/int64 arrays; the inputs are not modified.
+    """
+    ease_factor = np.asarray(ease_factor, dtype=np.float64)
+    interval = np.asarray(interval, dtype=np.int64)
+    repetitions = np.asarray(repetitions, dtype=np.int64)
+    rating = np.asarray(rating, dtype=np.int64)
+    reviewed_at = np.asarray(reviewed_at, dtype=np.int64)
+
+    passed = rating >= 3
+    new_repetitions = np.where(passed, repetitions + 1, 0)
+
+    # round() and np.rint both round half to even, so this matches
+    # int(round(interval * ease_factor)) with the pre-update ease factor.
+    grown = np.rint(interval * ease_factor).astype(np.int64)
+    new_interval = np.where(
+        passed,
+        np.where(new_repetitions == 1, 1, np.where(new_repetitions == 2, 6, grown)),
+        1,
+    )
+
+    # Same operation order as the scalar code so the floats are bit-identical.
+    miss = 5 - rating
+    new_ease = ease_factor + (0.1 - miss * (0.08 + miss * 0.02))
+    new_ease = np.maximum(new_ease, MIN_EASE_FACTOR)
+
+    next_review_at = reviewed_at + new_interval * SECONDS_PER_DAY
+    return new_ease, new_interval, new_repetitions, next_review_at
+
+
+def replay_sm2_batch(
+    offsets: np.ndarray, rating: np.ndarray, reviewed_at: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Replay each card's reviews from the initial state.
+
+    Card ``i`` owns ``rating[offsets[i]:offsets[i + 1]]`` and the matching
+    ``reviewed_at``, in review order. Cards are sorted by review count so
+    step ``k`` updates a prefix of them; loops over review positions, not
+    cards. Returns the final (ease_factor, interval, repetitions,
+    next_review_at) per card, in input order.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    rating = np.asarray(rating, dtype=np.int64)
+    reviewed_at = np.asarray(reviewed_at, dtype=np.int64)
+    lengths = np.diff(offsets)
+    order = np.argsort(-lengths, kind="stable")
+    starts = offsets[:-1][order]
+    descending = -lengths[order]
+
+    count = len(lengths)
+    ease_factor = np.full(count, 2.5)
+    interval = np.zeros(count, dtype=np.int64)
+    repetitions = np.zeros(count, dtype=np.int64)
+    next_review_at = np.zeros(count, dtype=np.int64)
+    for step in range(int(-descending[0]) if count else 0):
+        # Cards with more than ``step`` reviews.
+        active = int(np.searchsorted(descending, -step, side="left"))
+        index = starts[:active] + step
+        (
+            ease_factor[:active],
+            interval[:active],
+            repetitions[:active],
+            next_review_at[:active],
+        ) = apply_sm2_batch(
+            ease_factor[:active], interval[:active], repetitions[:active], rating[index], reviewed_at[index]
+        )
+
+    results = []
+    for values in (ease_factor, interval, repetitions, next_review_at):
+        unsorted = np.empty_like(values)
+        unsorted[order] = values
+        results.append(unsorted)
+    return tuple(results)
+
+
+def simulate_due_counts(
+    ease_factor: np.ndarray,
+    interval: np.ndarray,
+    repetitions: np.ndarray,
+    next_review_at: np.ndarray,
+    start: int,
+    days: int,
+    rating: int = 4,
+) -> np.ndarray:
+    """Reviews per day for ``days`` days from ``start`` if every due card is rated ``rating``.
+
+    Cards due before ``start`` count on day 0. Loops over days, not cards.
+    """
+    ease_factor = np.array(ease_factor, dtype=np.float64)
+    interval = np.array(interval, dtype=np.int64)
+    repetitions = np.array(repetitions, dtype=np.int64)
+    next_review_at = np.array(next_review_at, dtype=np.int64)
+    counts = np.zeros(days, dtype=np.int64)
+    for day in range(days):
+        day_start = start + day * SECONDS_PER_DAY
+        due = next_review_at < day_start + SECONDS_PER_DAY
+        counts[day] = int(due.sum())
+        if not counts[day]:
+            continue
+        reviewed_at = np.maximum(next_review_at[due], day_start)
+        (
+            ease_factor[due],
+            interval[due],
+            repetitions[due],
+            next_review_at[due],
+        ) = apply_sm2_batch(
+            ease_factor[due], interval[due], repetitions[due], rating, reviewed_at
+        )
+    return counts
@@ -0,0 +1,75 @@
+"""Benchmark and cross-check the vectorized SM-2 against apply_sm2.
+
+    python -m app.services.scheduler.sm2_bench --cards 100000 1000000
+"""
+
+
+import argparse
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.core.timeutil import to_epoch
+from app.services.scheduler.sm2 import apply_sm2
+from app.services.scheduler.sm2_batch import apply_sm2_batch
+
+
+def random_cards(count: int, seed: int):
+    rng = np.random.default_rng(seed)
+    repetitions = rng.integers(0, 12, count)
+    interval = np.where(repetitions == 0, 0, rng.integers(1, 400, count))
+    # Multiples of 0.01 around the usual range, like persisted ease factors.
+    ease_factor = np.round(rng.uniform(1.3, 3.0, count), 2)
+    rating = rng.integers(0, 6, count)
+    reviewed_at = rng.integers(1577836800, 1893456000, count)
+    return ease_factor, interval, repetitions, rating, reviewed_at
+
+
+def run_scalar(ease_factor, interval, repetitions, rating, reviewed_at):
+    out_ease = np.empty(len(rating), dtype=np.float64)
+    out_interval = np.empty(len(rating), dtype=np.int64)
+    out_repetitions = np.empty(len(rating), dtype=np.int64)
+    out_next = np.empty(len(rating), dtype=np.int64)
+    for i, (ef, iv, rep, r, ts) in enumerate(
+        zip(ease_factor.tolist(), interval.tolist(), repetitions.tolist(), rating.tolist(), reviewed_at.tolist())
+    ):
+        result = apply_sm2(
+            ease_factor=ef,
+            interval=iv,
+            repetitions=rep,
+            rating=r,
+            reviewed_at=datetime.fromtimestamp(ts, timezone.utc),
+        )
+        out_ease[i] = result.ease_factor
+        out_interval[i] = result.interval
+        out_repetitions[i] = result.repetitions
+        out_next[i] = to_epoch(result.next_review_at)
+    return out_ease, out_interval, out_repetitions, out_next
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare scalar and vectorized SM-2.")
+    parser.add_argument("--cards", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'cards':>9}  {'scalar s':>9}  {'batch s':>9}  {'speedup':>8}  match")
+    for count in args.cards:
+        cards = random_cards(count, args.seed)
+
+        started = time.perf_counter()
+        expected = run_scalar(*cards)
+        scalar_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        actual = apply_sm2_batch(*cards)
+        batch_time = time.perf_counter() - started
+
+        match = all(np.array_equal(e, a) for e, a in zip(expected, actual))
+        speedup = scalar_time / batch_time if batch_time else float("inf")
+        print(f"{count:>9}  {scalar_time:>9.3f}  {batch_time:>9.4f}  {speedup:>7.0f}x  {match}")
+
+
+if __name__ == "__main__":
+    main()
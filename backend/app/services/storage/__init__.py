@@ -0,0 +1,30 @@
+"""Pluggable storage backends."""
+
+
+from fastapi import Request
+
+from app.services.storage.base import DuplicateNameError, Repository, Storage
+
+
+def create_storage(settings) -> Storage:
+    backend = settings.storage.backend
+    if backend == "sqlite":
+        from app.services.storage.sqlite import SqliteStorage
+
+        return SqliteStorage(
+            settings.sqlite,
+            due_index_size=settings.storage.due_index_size,
+            utc_offset_minutes=settings.app.utc_offset_minutes,
+        )
+    if backend == "memory":
+        from app.services.storage.memory import MemoryStorage
+
+        return MemoryStorage(utc_offset_minutes=settings.app.utc_offset_minutes)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def get_storage(request: Request) -> Storage:
+    return request.app.state.storage
+
+
+__all__ = ["DuplicateNameError", "Repository", "Storage", "create_storage", "get_storage"]
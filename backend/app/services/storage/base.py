@@ -0,0 +1,249 @@
+"""Storage backend interface.
+
+Route code talks to a ``Storage`` and never sees SQL. Work is expressed as
+plain functions ``fn(repo, *args)`` that receive a ``Repository`` bound to
+the backend; ``Storage.read`` and ``Storage.write`` decide where and how
+those functions run (thread pool, writer thread, inline).
+
+Rows cross this boundary as plain dicts. Timestamps on study records and
+sessions are integer epoch seconds.
+"""
+
+
+from typing import Any, Callable, List, Optional, Tuple
+
+
+# Dictionary id under which the catalog (set of dictionaries) version is kept.
+CATALOG = 0
+
+
+class DuplicateNameError(Exception):
+    """A dictionary with the same owner and name already exists."""
+
+
+class Repository:
+    # Dictionaries
+
+    def get_dictionary(self, dictionary_id: int) -> Optional[dict]:
+        """Return {id, owner_id, name, visibility, scheduler} or None."""
+        raise NotImplementedError
+
+    def count_owned_dictionaries(self, owner_id: str) -> int:
+        raise NotImplementedError
+
+    def list_visible_dictionaries(self, user_id: str) -> List[dict]:
+        """Owned and public dictionaries, owned first, then by name."""
+        raise NotImplementedError
+
+    def create_dictionary(
+        self, owner_id: str, name: str, visibility: str, now: str, scheduler: str = "sm2"
+    ) -> int:
+        raise NotImplementedError
+
+    def update_dictionary(
+        self, dictionary_id: int, name: str, visibility: str, scheduler: str, now: str
+    ) -> None:
+        raise NotImplementedError
+
+    def delete_dictionary(self, dictionary_id: int) -> None:
+        """Delete a dictionary with its characters, study records, sessions, review log and review submissions."""
+        raise NotImplementedError
+
+    # Characters
+
+    def get_character(self, dictionary_id: int, hanzi: str) -> Optional[dict]:
+        """Return {id, hanzi, pinyin} or None."""
+        raise NotImplementedError
+
+    def insert_character(self, dictionary_id: int, hanzi: str, pinyin: str, now: str) -> bool:
+        """Insert unless present; return True when a row was added."""
+        raise NotImplementedError
+
+    def insert_characters(self, dictionary_id: int, items: List[Tuple[str, str]], now: str) -> int:
+        """Insert (hanzi, pinyin) pairs not yet present; return how many were added."""
+        raise NotImplementedError
+
+    def list_characters(self, dictionary_id: int) -> List[dict]:
+        """All {hanzi, pinyin} in the dictionary ordered by hanzi."""
+        raise NotImplementedError
+
+    # Study records
+
+    def get_study_record(self, user_id: str, dictionary_id: int, character_id: int) -> Optional[dict]:
+        """Return {ease_factor, interval, repetitions, last_reviewed_at, next_review_at, last_rating, stability, difficulty}."""
+        raise NotImplementedError
+
+    def upsert_study_record(
+        self,
+        user_id: str,
+        dictionary_id: int,
+        character_id: int,
+        ease_factor: float,
+        interval: int,
+        repetitions: int,
+        last_reviewed_at: int,
+        next_review_at: int,
+        last_rating: int,
+        stability: Optional[float] = None,
+        difficulty: Optional[float] = None,
+    ) -> None:
+        raise NotImplementedError
+
+    def get_new_cards(self, user_id: str, dictionary_id: int, after_id: int, limit: int) -> List[dict]:
+        """Characters the user has never reviewed with id > ``after_id``, in id order.
+
+        Items are {id, hanzi, pinyin}.
+        """
+        raise NotImplementedError
+
+    def get_due_cards(
+        self, user_id: str, dictionary_id: int, now: int, after: Tuple[int, int], limit: int
+    ) -> List[dict]:
+        """Cards due by ``now`` with (next_review_at, character id) > ``after``, in that order.
+
+        Items are {id, hanzi, pinyin, next_review_at}.
+        """
+        raise NotImplementedError
+
+    def get_user_dictionary_stats(self, user_id: str, dictionary_id: int) -> Optional[dict]:
+        """Maintained counters: {character_count, known_count, study_seconds}, or None without the dictionary.
+
+        Kept up to date by ``insert_character``, ``upsert_study_record``,
+        ``end_session`` and ``delete_dictionary``; a card is known once its
+        repetitions are above zero.
+        """
+        raise NotImplementedError
+
+    def get_daily_stats(self, user_id: str, dictionary_id: int, first_day: int, last_day: int) -> List[dict]:
+        """Daily rollups {day, reviews, lapses, new_cards, study_seconds} in ``first_day``..``last_day``.
+
+        Only days with activity have rows, ordered by day. ``day`` is the local
+        day number (days since 1970-01-01 in the storage's UTC offset). Each
+        ``upsert_study_record`` counts a review on the day of
+        ``last_reviewed_at``, a new card when the card had no record and a
+        lapse when a known card is rated below 3; ``end_session`` adds the
+        session's seconds to the day it started.
+        """
+        raise NotImplementedError
+
+    def count_due(self, user_id: str, dictionary_id: int, now: int) -> int:
+        raise NotImplementedError
+
+    def count_due_by_day(self, user_id: str, dictionary_id: int, start: int, days: int) -> List[int]:
+        """Cards due in each of ``days`` 24-hour buckets from ``start``; overdue cards count on day 0."""
+        raise NotImplementedError
+
+    def get_schedule_states(self, user_id: str, dictionary_id: int) -> List[Tuple[float, int, int, int]]:
+        """Every reviewed card as (ease_factor, interval, repetitions, next_review_at), for simulation."""
+        raise NotImplementedError
+
+    def append_review_log(
+        self,
+        user_id: str,
+        dictionary_id: int,
+        character_id: int,
+        rating: int,
+        reviewed_at: int,
+        before: Tuple[float, int, int],
+        after: Tuple[float, int, int],
+        next_review_at: int,
+        is_new: bool = False,
+    ) -> None:
+        """Append one review; ``before``/``after`` are (ease_factor, interval, repetitions).
+
+        ``is_new`` marks a review of a card without a study record, which is
+        what ``get_daily_stats`` counts as a new card.
+        """
+        raise NotImplementedError
+
+    def get_review_history(self, user_id: str) -> List[Tuple[int, int, int, int]]:
+        """The user's whole review log as (dictionary_id, character_id, rating, reviewed_at).
+
+        Ordered by dictionary, character and review time. Tuples rather than
+        dicts because this feeds bulk jobs over up to hundreds of thousands of rows.
+        """
+        raise NotImplementedError
+
+    def get_review_submission(self, user_id: str, client_id: str) -> Optional[dict]:
+        """Return {dictionary_id, hanzi, next_review_at, interval, ease_factor} or None."""
+        raise NotImplementedError
+
+    def save_review_submission(
+        self,
+        user_id: str,
+        client_id: str,
+        dictionary_id: int,
+        hanzi: str,
+        next_review_at: int,
+        interval: int,
+        ease_factor: float,
+        created_at: int,
+    ) -> None:
+        raise NotImplementedError
+
+    # Scheduler parameters
+
+    def get_scheduler_parameters(self, user_id: str, scheduler: str) -> Optional[dict]:
+        """Return {parameters, review_count, loss, updated_at} or None."""
+        raise NotImplementedError
+
+    def save_scheduler_parameters(
+        self,
+        user_id: str,
+        scheduler: str,
+        parameters: List[float],
+        review_count: int,
+        loss: Optional[float],
+        updated_at: int,
+    ) -> None:
+        raise NotImplementedError
+
+    # Data versions
+
+    def get_data_versions(self, dictionary_id: int, user_id: str) -> Tuple[int, int]:
+        """(shared, user) change counters for a dictionary; 0 when never written.
+
+        The shared counter moves with the dictionary row and its characters
+        and is at least 1 while the dictionary exists; the user counter moves
+        with that user's study records and sessions.
+        """
+        raise NotImplementedError
+
+    def get_catalog_version(self) -> int:
+        """Change counter for the set of dictionaries (create, update, delete)."""
+        raise NotImplementedError
+
+    def next_due_after(self, user_id: str, dictionary_id: int, now: int) -> Optional[int]:
+        """Earliest ``next_review_at`` later than ``now``; with the data versions it pins the due count."""
+        raise NotImplementedError
+
+    # Sessions
+
+    def create_session(self, user_id: str, dictionary_id: int, started_at: int) -> int:
+        raise NotImplementedError
+
+    def end_session(self, session_id: int, user_id: str, dictionary_id: int, ended_at: int) -> None:
+        raise NotImplementedError
+
+
+class Storage:
+    name = "base"
+    # Mixed into every ETag (see ``app.core.etag``); each backend sets its own.
+    etag_epoch = ""
+
+    def start(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+    async def read(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(repo, *args)`` for a read and return its result."""
+        raise NotImplementedError
+
+    async def write(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(repo, *args)`` atomically for a write and return its result."""
+        raise NotImplementedError
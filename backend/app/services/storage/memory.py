@@ -0,0 +1,497 @@
+"""In-memory storage backend.
+
+Keeps every table in Python dicts with sorted secondary indexes maintained by
+``bisect``. Useful for tests, demos and benchmarking the API layer without
+disk I/O. Nothing is persisted; data is lost when the process exits.
+
+All operations run inline under one lock, so each ``read``/``write`` call is
+atomic with respect to other requests. There is no rollback: a write function
+that raises part way leaves its earlier changes in place.
+"""
+
+
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.timeutil import local_day
+from app.services.storage.base import CATALOG, DuplicateNameError, Repository, Storage
+
+
+class MemoryRepository(Repository):
+    def __init__(self, utc_offset_minutes: int = 0) -> None:
+        self.utc_offset_minutes = utc_offset_minutes
+        self.dictionaries: Dict[int, dict] = {}
+        self.dictionary_names: Dict[Tuple[str, str], int] = {}
+        self.characters: Dict[int, dict] = {}
+        # dictionary_id -> sorted [(hanzi, character_id)]
+        self.characters_by_dict: Dict[int, List[Tuple[str, int]]] = {}
+        # dictionary_id -> [character_id], ascending since ids only grow
+        self.character_id_order: Dict[int, List[int]] = {}
+        self.character_ids: Dict[Tuple[int, str], int] = {}
+        self.study_records: Dict[Tuple[str, int, int], dict] = {}
+        # (user_id, dictionary_id) -> sorted [(next_review_at, character_id)]
+        self.due_index: Dict[Tuple[str, int], List[Tuple[int, int]]] = {}
+        self.review_submissions: Dict[Tuple[str, str], dict] = {}
+        self.review_log: List[dict] = []
+        self.scheduler_parameters: Dict[Tuple[str, str], dict] = {}
+        # (dictionary_id, user_id) -> {known_count, study_seconds}
+        self.user_stats: Dict[Tuple[int, str], dict] = {}
+        # (dictionary_id, user_id) -> {day: rollup dict}
+        self.daily_stats: Dict[Tuple[int, str], Dict[int, dict]] = {}
+        # (dictionary_id, user_id or "") -> change counter
+        self.data_versions: Dict[Tuple[int, str], int] = {}
+        self.sessions: Dict[int, dict] = {}
+        self.sessions_by_key: Dict[Tuple[str, int], List[int]] = {}
+        self._next_ids = {"dictionaries": 1, "characters": 1, "study_sessions": 1, "review_log": 1}
+
+    def _next_id(self, table: str) -> int:
+        value = self._next_ids[table]
+        self._next_ids[table] = value + 1
+        return value
+
+    # Dictionaries
+
+    def get_dictionary(self, dictionary_id: int) -> Optional[dict]:
+        row = self.dictionaries.get(dictionary_id)
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "owner_id": row["owner_id"],
+            "name": row["name"],
+            "visibility": row["visibility"],
+            "scheduler": row["scheduler"],
+        }
+
+    def count_owned_dictionaries(self, owner_id: str) -> int:
+        return sum(1 for row in self.dictionaries.values() if row["owner_id"] == owner_id)
+
+    def list_visible_dictionaries(self, user_id: str) -> List[dict]:
+        rows = [
+            self.get_dictionary(row["id"])
+            for row in self.dictionaries.values()
+            if row["owner_id"] == user_id or row["visibility"] == "public"
+        ]
+        rows.sort(key=lambda row: (row["owner_id"] != user_id, row["name"]))
+        return rows
+
+    def create_dictionary(
+        self, owner_id: str, name: str, visibility: str, now: str, scheduler: str = "sm2"
+    ) -> int:
+        if (owner_id, name) in self.dictionary_names:
+            raise DuplicateNameError(name)
+        dictionary_id = self._next_id("dictionaries")
+        self.dictionaries[dictionary_id] = {
+            "id": dictionary_id,
+            "owner_id": owner_id,
+            "name": name,
+            "visibility": visibility,
+            "scheduler": scheduler,
+            "character_count": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.dictionary_names[(owner_id, name)] = dictionary_id
+        self.characters_by_dict[dictionary_id] = []
+        self.character_id_order[dictionary_id] = []
+        self._bump_version(CATALOG)
+        self._bump_version(dictionary_id)
+        return dictionary_id
+
+    def update_dictionary(
+        self, dictionary_id: int, name: str, visibility: str, scheduler: str, now: str
+    ) -> None:
+        row = self.dictionaries.get(dictionary_id)
+        if row is None:
+            return
+        existing = self.dictionary_names.get((row["owner_id"], name))
+        if existing is not None and existing != dictionary_id:
+            raise DuplicateNameError(name)
+        del self.dictionary_names[(row["owner_id"], row["name"])]
+        row["name"] = name
+        row["visibility"] = visibility
+        row["scheduler"] = scheduler
+        row["updated_at"] = now
+        self.dictionary_names[(row["owner_id"], name)] = dictionary_id
+        self._bump_version(CATALOG)
+        self._bump_version(dictionary_id)
+
+    def delete_dictionary(self, dictionary_id: int) -> None:
+        row = self.dictionaries.pop(dictionary_id, None)
+        if row is None:
+            return
+        del self.dictionary_names[(row["owner_id"], row["name"])]
+        self.character_id_order.pop(dictionary_id, None)
+        for hanzi, character_id in self.characters_by_dict.pop(dictionary_id, []):
+            del self.characters[character_id]
+            del self.character_ids[(dictionary_id, hanzi)]
+        for key in [k for k in self.study_records if k[1] == dictionary_id]:
+            del self.study_records[key]
+        for key in [k for k in self.due_index if k[1] == dictionary_id]:
+            del self.due_index[key]
+        for key in [k for k in self.user_stats if k[0] == dictionary_id]:
+            del self.user_stats[key]
+        for key in [k for k in self.daily_stats if k[0] == dictionary_id]:
+            del self.daily_stats[key]
+        for key in [k for k in self.data_versions if k[0] == dictionary_id]:
+            del self.data_versions[key]
+        self._bump_version(CATALOG)
+        self.review_log = [row for row in self.review_log if row["dictionary_id"] != dictionary_id]
+        for key in [
+            k for k, v in self.review_submissions.items() if v["dictionary_id"] == dictionary_id
+        ]:
+            del self.review_submissions[key]
+        for key in [k for k in self.sessions_by_key if k[1] == dictionary_id]:
+            for session_id in self.sessions_by_key.pop(key):
+                del self.sessions[session_id]
+
+    # Characters
+
+    def get_character(self, dictionary_id: int, hanzi: str) -> Optional[dict]:
+        character_id = self.character_ids.get((dictionary_id, hanzi))
+        if character_id is None:
+            return None
+        row = self.characters[character_id]
+        return {"id": row["id"], "hanzi": row["hanzi"], "pinyin": row["pinyin"]}
+
+    def insert_character(self, dictionary_id: int, hanzi: str, pinyin: str, now: str) -> bool:
+        if (dictionary_id, hanzi) in self.character_ids:
+            return False
+        character_id = self._next_id("characters")
+        self.characters[character_id] = {
+            "id": character_id,
+            "dictionary_id": dictionary_id,
+            "hanzi": hanzi,
+            "pinyin": pinyin,
+            "cached_at": now,
+        }
+        self.character_ids[(dictionary_id, hanzi)] = character_id
+        insort(self.characters_by_dict.setdefault(dictionary_id, []), (hanzi, character_id))
+        self.character_id_order.setdefault(dictionary_id, []).append(character_id)
+        self.dictionaries[dictionary_id]["character_count"] += 1
+        self._bump_version(dictionary_id)
+        return True
+
+    def insert_characters(self, dictionary_id: int, items: List[Tuple[str, str]], now: str) -> int:
+        return sum(1 for hanzi, pinyin in items if self.insert_character(dictionary_id, hanzi, pinyin, now))
+
+    def list_characters(self, dictionary_id: int) -> List[dict]:
+        return [
+            {"hanzi": hanzi, "pinyin": self.characters[character_id]["pinyin"]}
+            for hanzi, character_id in self.characters_by_dict.get(dictionary_id, [])
+        ]
+
+    # Study records
+
+    def get_study_record(self, user_id: str, dictionary_id: int, character_id: int) -> Optional[dict]:
+        row = self.study_records.get((user_id, dictionary_id, character_id))
+        return dict(row) if row else None
+
+    def upsert_study_record(
+        self,
+        user_id: str,
+        dictionary_id: int,
+        character_id: int,
+        ease_factor: float,
+        interval: int,
+        repetitions: int,
+        last_reviewed_at: int,
+        next_review_at: int,
+        last_rating: int,
+        stability: Optional[float] = None,
+        difficulty: Optional[float] = None,
+    ) -> None:
+        key = (user_id, dictionary_id, character_id)
+        due = self.due_index.setdefault((user_id, dictionary_id), [])
+        previous = self.study_records.get(key)
+        if previous is not None:
+            due.remove((previous["next_review_at"], character_id))
+        was_known = previous is not None and previous["repetitions"] > 0
+        if (repetitions > 0) != was_known:
+            self._bump_user_stats(user_id, dictionary_id, known=1 if repetitions > 0 else -1)
+        self._bump_daily_stats(
+            user_id,
+            dictionary_id,
+            local_day(last_reviewed_at, self.utc_offset_minutes),
+            reviews=1,
+            lapses=1 if was_known and last_rating < 3 else 0,
+            new_cards=1 if previous is None else 0,
+        )
+        self._bump_version(dictionary_id, user_id)
+        self.study_records[key] = {
+            "ease_factor": ease_factor,
+            "interval": interval,
+            "repetitions": repetitions,
+            "last_reviewed_at": last_reviewed_at,
+            "next_review_at": next_review_at,
+            "last_rating": last_rating,
+            "stability": stability,
+            "difficulty": difficulty,
+        }
+        insort(due, (next_review_at, character_id))
+
+    def get_new_cards(self, user_id: str, dictionary_id: int, after_id: int, limit: int) -> List[dict]:
+        ids = self.character_id_order.get(dictionary_id, [])
+        items = []
+        for character_id in ids[bisect_right(ids, after_id):]:
+            if len(items) >= limit:
+                break
+            if (user_id, dictionary_id, character_id) in self.study_records:
+                continue
+            row = self.characters[character_id]
+            items.append({"id": character_id, "hanzi": row["hanzi"], "pinyin": row["pinyin"]})
+        return items
+
+    def get_due_cards(
+        self, user_id: str, dictionary_id: int, now: int, after: Tuple[int, int], limit: int
+    ) -> List[dict]:
+        due = self.due_index.get((user_id, dictionary_id), [])
+        start = bisect_right(due, tuple(after))
+        end = min(self._due_end(due, now), start + limit)
+        items = []
+        for next_review_at, character_id in due[start:end]:
+            row = self.characters[character_id]
+            items.append(
+                {
+                    "id": character_id,
+                    "hanzi": row["hanzi"],
+                    "pinyin": row["pinyin"],
+                    "next_review_at": next_review_at,
+                }
+            )
+        return items
+
+    @staticmethod
+    def _due_end(due: List[Tuple[int, int]], now: int) -> int:
+        return bisect_right(due, (now, float("inf")))
+
+    def get_user_dictionary_stats(self, user_id: str, dictionary_id: int) -> Optional[dict]:
+        row = self.dictionaries.get(dictionary_id)
+        if row is None:
+            return None
+        stats = self.user_stats.get((dictionary_id, user_id), {})
+        return {
+            "character_count": row["character_count"],
+            "known_count": stats.get("known_count", 0),
+            "study_seconds": stats.get("study_seconds", 0),
+        }
+
+    def _bump_user_stats(self, user_id: str, dictionary_id: int, known: int = 0, seconds: int = 0) -> None:
+        stats = self.user_stats.setdefault(
+            (dictionary_id, user_id), {"known_count": 0, "study_seconds": 0}
+        )
+        stats["known_count"] += known
+        stats["study_seconds"] += seconds
+
+    def get_daily_stats(self, user_id: str, dictionary_id: int, first_day: int, last_day: int) -> List[dict]:
+        days = self.daily_stats.get((dictionary_id, user_id), {})
+        return [dict(days[day]) for day in sorted(days) if first_day <= day <= last_day]
+
+    def _bump_daily_stats(
+        self,
+        user_id: str,
+        dictionary_id: int,
+        day: int,
+        reviews: int = 0,
+        lapses: int = 0,
+        new_cards: int = 0,
+        seconds: int = 0,
+    ) -> None:
+        row = self.daily_stats.setdefault((dictionary_id, user_id), {}).setdefault(
+            day,
+            {"day": day, "reviews": 0, "lapses": 0, "new_cards": 0, "study_seconds": 0},
+        )
+        row["reviews"] += reviews
+        row["lapses"] += lapses
+        row["new_cards"] += new_cards
+        row["study_seconds"] += seconds
+
+    def count_due(self, user_id: str, dictionary_id: int, now: int) -> int:
+        return self._due_end(self.due_index.get((user_id, dictionary_id), []), now)
+
+    def count_due_by_day(self, user_id: str, dictionary_id: int, start: int, days: int) -> List[int]:
+        due = self.due_index.get((user_id, dictionary_id), [])
+        counts = []
+        previous = 0
+        for day in range(1, days + 1):
+            end = bisect_left(due, (start + day * 86400,))
+            counts.append(end - previous)
+            previous = end
+        return counts
+
+    def get_schedule_states(self, user_id: str, dictionary_id: int) -> List[Tuple[float, int, int, int]]:
+        return [
+            (row["ease_factor"], row["interval"], row["repetitions"], row["next_review_at"])
+            for key, row in self.study_records.items()
+            if key[0] == user_id and key[1] == dictionary_id and row["next_review_at"] is not None
+        ]
+
+    def append_review_log(
+        self,
+        user_id: str,
+        dictionary_id: int,
+        character_id: int,
+        rating: int,
+        reviewed_at: int,
+        before: Tuple[float, int, int],
+        after: Tuple[float, int, int],
+        next_review_at: int,
+        is_new: bool = False,
+    ) -> None:
+        self.review_log.append(
+            {
+                "id": self._next_id("review_log"),
+                "user_id": user_id,
+                "dictionary_id": dictionary_id,
+                "character_id": character_id,
+                "rating": rating,
+                "reviewed_at": reviewed_at,
+                "before": tuple(before),
+                "after": tuple(after),
+                "next_review_at": next_review_at,
+                "is_new": is_new,
+            }
+        )
+
+    def get_review_history(self, user_id: str) -> List[Tuple[int, int, int, int]]:
+        rows = [row for row in self.review_log if row["user_id"] == user_id]
+        rows.sort(key=lambda row: (row["dictionary_id"], row["character_id"], row["reviewed_at"], row["id"]))
+        return [
+            (row["dictionary_id"], row["character_id"], row["rating"], row["reviewed_at"])
+            for row in rows
+        ]
+
+    def get_review_submission(self, user_id: str, client_id: str) -> Optional[dict]:
+        row = self.review_submissions.get((user_id, client_id))
+        return dict(row) if row else None
+
+    def save_review_submission(
+        self,
+        user_id: str,
+        client_id: str,
+        dictionary_id: int,
+        hanzi: str,
+        next_review_at: int,
+        interval: int,
+        ease_factor: float,
+        created_at: int,
+    ) -> None:
+        self.review_submissions[(user_id, client_id)] = {
+            "dictionary_id": dictionary_id,
+            "hanzi": hanzi,
+            "next_review_at": next_review_at,
+            "interval": interval,
+            "ease_factor": ease_factor,
+        }
+
+    # Scheduler parameters
+
+    def get_scheduler_parameters(self, user_id: str, scheduler: str) -> Optional[dict]:
+        row = self.scheduler_parameters.get((user_id, scheduler))
+        if row is None:
+            return None
+        result = dict(row)
+        result["parameters"] = list(row["parameters"])
+        return result
+
+    def save_scheduler_parameters(
+        self,
+        user_id: str,
+        scheduler: str,
+        parameters: List[float],
+        review_count: int,
+        loss: Optional[float],
+        updated_at: int,
+    ) -> None:
+        self.scheduler_parameters[(user_id, scheduler)] = {
+            "parameters": list(parameters),
+            "review_count": review_count,
+            "loss": loss,
+            "updated_at": updated_at,
+        }
+
+    # Data versions
+
+    def get_data_versions(self, dictionary_id: int, user_id: str) -> Tuple[int, int]:
+        return (
+            self.data_versions.get((dictionary_id, ""), 0),
+            self.data_versions.get((dictionary_id, user_id), 0),
+        )
+
+    def get_catalog_version(self) -> int:
+        return self.data_versions.get((CATALOG, ""), 0)
+
+    def next_due_after(self, user_id: str, dictionary_id: int, now: int) -> Optional[int]:
+        due = self.due_index.get((user_id, dictionary_id), [])
+        pos = self._due_end(due, now)
+        return due[pos][0] if pos < len(due) else None
+
+    def _bump_version(self, dictionary_id: int, user_id: str = "") -> None:
+        key = (dictionary_id, user_id)
+        self.data_versions[key] = self.data_versions.get(key, 0) + 1
+
+    # Sessions
+
+    def create_session(self, user_id: str, dictionary_id: int, started_at: int) -> int:
+        session_id = self._next_id("study_sessions")
+        self.sessions[session_id] = {
+            "id": session_id,
+            "user_id": user_id,
+            "dictionary_id": dictionary_id,
+            "started_at": started_at,
+            "ended_at": None,
+        }
+        self.sessions_by_key.setdefault((user_id, dictionary_id), []).append(session_id)
+        self._bump_version(dictionary_id, user_id)
+        return session_id
+
+    def end_session(self, session_id: int, user_id: str, dictionary_id: int, ended_at: int) -> None:
+        row = self.sessions.get(session_id)
+        if not row or row["user_id"] != user_id or row["dictionary_id"] != dictionary_id:
+            return
+        previous = row["ended_at"] - row["started_at"] if row["ended_at"] is not None else 0
+        row["ended_at"] = ended_at
+        self._bump_version(dictionary_id, user_id)
+        seconds = ended_at - row["started_at"] - previous
+        if seconds:
+            self._bump_user_stats(user_id, dictionary_id, seconds=seconds)
+            self._bump_daily_stats(
+                user_id,
+                dictionary_id,
+                local_day(row["started_at"], self.utc_offset_minutes),
+                seconds=seconds,
+            )
+
+
+class MemoryStorage(Storage):
+    name = "memory"
+
+    def __init__(self, utc_offset_minutes: int = 0) -> None:
+        self.repo = MemoryRepository(utc_offset_minutes)
+        # The counters restart with the process, so old validators must not match.
+        self.etag_epoch = os.urandom(8).hex()
+        self._lock = threading.Lock()
+        self._reads = 0
+        self._writes = 0
+
+    def stats(self) -> dict:
+        return {
+            "reads": self._reads,
+            "writes": self._writes,
+            "dictionaries": len(self.repo.dictionaries),
+            "characters": len(self.repo.characters),
+            "study_records": len(self.repo.study_records),
+            "sessions": len(self.repo.sessions),
+        }
+
+    async def read(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            self._reads += 1
+            return fn(self.repo, *args)
+
+    async def write(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            self._writes += 1
+            return fn(self.repo, *args)
@@ -0,0 +1,720 @@
+"""SQLite storage backend."""
+
+
+import json
+import sqlite3
+from typing import Any, Callable, List, Optional, Tuple
+
+from app.core.db import connect, create_read_pool
+from app.core.executor import DatabaseExecutor, create_db_executor
+from app.core.migrations import apply_migrations
+from app.core.timeutil import local_day
+from app.core.writer import create_writer
+from app.services.scheduler.due_index import DueIndex
+from app.services.storage.base import CATALOG, DuplicateNameError, Repository, Storage
+
+
+class SqliteRepository(Repository):
+    """Repository over one connection.
+
+    With a ``due_index`` the queue and due-count reads are served from memory;
+    writes made on the writer thread pass ``after_commit`` so the index is
+    updated once they are durable.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        due_index: Optional[DueIndex] = None,
+        after_commit: Optional[Callable[[Callable[[], None]], None]] = None,
+        utc_offset_minutes: int = 0,
+    ) -> None:
+        self.conn = conn
+        self.due_index = due_index
+        self.after_commit = after_commit
+        self.utc_offset_minutes = utc_offset_minutes
+
+    def _on_commit(self, callback: Callable[[], None]) -> None:
+        if self.due_index is not None and self.after_commit is not None:
+            self.after_commit(callback)
+
+    # Dictionaries
+
+    def get_dictionary(self, dictionary_id: int) -> Optional[dict]:
+        row = self.conn.execute(
+            "SELECT id, owner_id, name, visibility, scheduler FROM dictionaries WHERE id = ?",
+            (dictionary_id,),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def count_owned_dictionaries(self, owner_id: str) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) AS c FROM dictionaries WHERE owner_id = ?",
+            (owner_id,),
+        ).fetchone()["c"]
+
+    def list_visible_dictionaries(self, user_id: str) -> List[dict]:
+        rows = self.conn.execute(
+            """
+            SELECT id, owner_id, name, visibility, scheduler
+            FROM dictionaries
+            WHERE owner_id = ? OR visibility = 'public'
+            ORDER BY owner_id = ? DESC, name ASC
+            """,
+            (user_id, user_id),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def create_dictionary(
+        self, owner_id: str, name: str, visibility: str, now: str, scheduler: str = "sm2"
+    ) -> int:
+        try:
+            cursor = self.conn.execute(
+                """
+                INSERT INTO dictionaries (owner_id, name, visibility, scheduler, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (owner_id, name, visibility, scheduler, now, now),
+            )
+        except sqlite3.IntegrityError:
+            raise DuplicateNameError(name)
+        self._bump_version(CATALOG)
+        self._bump_version(cursor.lastrowid)
+        return cursor.lastrowid
+
+    def update_dictionary(
+        self, dictionary_id: int, name: str, visibility: str, scheduler: str, now: str
+    ) -> None:
+        try:
+            self.conn.execute(
+                """
+                UPDATE dictionaries
+                SET name = ?, visibility = ?, scheduler = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (name, visibility, scheduler, now, dictionary_id),
+            )
+        except sqlite3.IntegrityError:
+            raise DuplicateNameError(name)
+        self._bump_version(CATALOG)
+        self._bump_version(dictionary_id)
+
+    def delete_dictionary(self, dictionary_id: int) -> None:
+        self.conn.execute(
+            "DELETE FROM user_dictionary_stats WHERE dictionary_id = ?",
+            (dictionary_id,),
+        )
+        self.conn.execute(
+            "DELETE FROM daily_stats WHERE dictionary_id = ?",
+            (dictionary_id,),
+        )
+        self.conn.execute(
+            "DELETE FROM data_versions WHERE dictionary_id = ?",
+            (dictionary_id,),
+        )
+        self._bump_version(CATALOG)
+        self.conn.execute(
+            "DELETE FROM review_log WHERE dictionary_id = ?",
+            (dictionary_id,),
+        )
+        self.conn.execute(
+            "DELETE FROM review_submissions WHERE dictionary_id = ?",
+            (dictionary_id,),
+        )
+        self.conn.execute(
+            "DELETE FROM study_records WHERE dictionary_id = ?",
+            (dictionary_id,),
+        )
+        self.conn.execute(
+            "DELETE FROM study_sessions WHERE dictionary_id = ?",
+            (dictionary_id,),
+        )
+        self.conn.execute(
+            "DELETE FROM characters WHERE dictionary_id = ?",
+            (dictionary_id,),
+        )
+        self.conn.execute(
+            "DELETE FROM dictionaries WHERE id = ?",
+            (dictionary_id,),
+        )
+        self._on_commit(lambda: self.due_index.dictionary_removed(dictionary_id))
+
+    # Characters
+
+    def get_character(self, dictionary_id: int, hanzi: str) -> Optional[dict]:
+        row = self.conn.execute(
+            "SELECT id, hanzi, pinyin FROM characters WHERE dictionary_id = ? AND hanzi = ?",
+            (dictionary_id, hanzi),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def insert_character(self, dictionary_id: int, hanzi: str, pinyin: str, now: str) -> bool:
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO characters (dictionary_id, hanzi, pinyin, cached_at) VALUES (?, ?, ?, ?)",
+            (dictionary_id, hanzi, pinyin, now),
+        )
+        if cursor.rowcount <= 0:
+            return False
+        self.conn.execute(
+            "UPDATE dictionaries SET character_count = character_count + 1 WHERE id = ?",
+            (dictionary_id,),
+        )
+        version = self._next_version(dictionary_id)
+        rows = [(cursor.lastrowid, hanzi, pinyin)]
+        self._on_commit(lambda: self.due_index.characters_added(dictionary_id, rows, version))
+        return True
+
+    def insert_characters(self, dictionary_id: int, items: List[Tuple[str, str]], now: str) -> int:
+        if not items:
+            return 0
+        # ids are AUTOINCREMENT and this is the only writer, so everything
+        # above the current maximum was added by this statement.
+        last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM characters").fetchone()[0]
+        cursor = self.conn.executemany(
+            "INSERT OR IGNORE INTO characters (dictionary_id, hanzi, pinyin, cached_at) VALUES (?, ?, ?, ?)",
+            [(dictionary_id, hanzi, pinyin, now) for hanzi, pinyin in items],
+        )
+        inserted = cursor.rowcount
+        if inserted <= 0:
+            return 0
+        self.conn.execute(
+            "UPDATE dictionaries SET character_count = character_count + ? WHERE id = ?",
+            (inserted, dictionary_id),
+        )
+        version = self._next_version(dictionary_id)
+        if self.due_index is not None:
+            rows = [
+                tuple(row)
+                for row in self.conn.execute(
+                    "SELECT id, hanzi, pinyin FROM characters WHERE id > ? AND dictionary_id = ?",
+                    (last_id, dictionary_id),
+                )
+            ]
+            self._on_commit(lambda: self.due_index.characters_added(dictionary_id, rows, version))
+        return inserted
+
+    def list_characters(self, dictionary_id: int) -> List[dict]:
+        rows = self.conn.execute(
+            "SELECT hanzi, pinyin FROM characters WHERE dictionary_id = ? ORDER BY hanzi ASC",
+            (dictionary_id,),
+        ).fetchall()
+        return [{"hanzi": row["hanzi"], "pinyin": row["pinyin"]} for row in rows]
+
+    # Study records
+
+    def get_study_record(self, user_id: str, dictionary_id: int, character_id: int) -> Optional[dict]:
+        row = self.conn.execute(
+            """
+            SELECT ease_factor, interval, repetitions, last_reviewed_at, next_review_at, last_rating,
+                   stability, difficulty
+            FROM study_records
+            WHERE user_id = ? AND dictionary_id = ? AND character_id = ?
+            """,
+            (user_id, dictionary_id, character_id),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def upsert_study_record(
+        self,
+        user_id: str,
+        dictionary_id: int,
+        character_id: int,
+        ease_factor: float,
+        interval: int,
+        repetitions: int,
+        last_reviewed_at: int,
+        next_review_at: int,
+        last_rating: int,
+        stability: Optional[float] = None,
+        difficulty: Optional[float] = None,
+    ) -> None:
+        previous = self.conn.execute(
+            """
+            SELECT repetitions
+            FROM study_records
+            WHERE user_id = ? AND dictionary_id = ? AND character_id = ?
+            """,
+            (user_id, dictionary_id, character_id),
+        ).fetchone()
+        was_known = previous is not None and previous["repetitions"] > 0
+        self.conn.execute(
+            """
+            INSERT INTO study_records (user_id, dictionary_id, character_id, ease_factor, interval, repetitions, last_reviewed_at, next_review_at, last_rating, stability, difficulty)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, dictionary_id, character_id) DO UPDATE SET
+              ease_factor = excluded.ease_factor,
+              interval = excluded.interval,
+              repetitions = excluded.repetitions,
+              last_reviewed_at = excluded.last_reviewed_at,
+              next_review_at = excluded.next_review_at,
+              last_rating = excluded.last_rating,
+              stability = excluded.stability,
+              difficulty = excluded.difficulty
+            """,
+            (
+                user_id,
+                dictionary_id,
+                character_id,
+                ease_factor,
+                interval,
+                repetitions,
+                last_reviewed_at,
+                next_review_at,
+                last_rating,
+                stability,
+                difficulty,
+            ),
+        )
+        if (repetitions > 0) != was_known:
+            self._bump_user_stats(user_id, dictionary_id, known=1 if repetitions > 0 else -1)
+        self._bump_daily_stats(
+            user_id,
+            dictionary_id,
+            local_day(last_reviewed_at, self.utc_offset_minutes),
+            reviews=1,
+            lapses=1 if was_known and last_rating < 3 else 0,
+            new_cards=1 if previous is None else 0,
+        )
+        version = self._next_version(dictionary_id, user_id)
+        self._on_commit(
+            lambda: self.due_index.reviewed(
+                user_id, dictionary_id, character_id, next_review_at, version
+            )
+        )
+
+    def _load_due_entry(self, user_id: str, dictionary_id: int) -> Tuple[Tuple[int, int], List[tuple]]:
+        # One read transaction so the version pair matches the rows.
+        self.conn.execute("BEGIN")
+        try:
+            version = self.get_data_versions(dictionary_id, user_id)
+            rows = self.conn.execute(
+                """
+                SELECT c.id, c.hanzi, c.pinyin, sr.id IS NOT NULL AS has_record, sr.next_review_at
+                FROM characters c
+                LEFT JOIN study_records sr
+                  ON sr.character_id = c.id AND sr.user_id = ? AND sr.dictionary_id = ?
+                WHERE c.dictionary_id = ?
+                """,
+                (user_id, dictionary_id, dictionary_id),
+            ).fetchall()
+        finally:
+            self.conn.rollback()
+        return version, [tuple(row) for row in rows]
+
+    def _query_due_index(self, user_id: str, dictionary_id: int, fn: Callable[[Any], Any]) -> Any:
+        return self.due_index.query(
+            user_id,
+            dictionary_id,
+            self.get_data_versions(dictionary_id, user_id),
+            lambda: self._load_due_entry(user_id, dictionary_id),
+            fn,
+        )
+
+    def get_new_cards(self, user_id: str, dictionary_id: int, after_id: int, limit: int) -> List[dict]:
+        if self.due_index is not None:
+            return self._query_due_index(
+                user_id, dictionary_id, lambda entry: entry.new_cards(after_id, limit)
+            )
+        rows = self.conn.execute(
+            """
+            SELECT c.id, c.hanzi, c.pinyin
+            FROM characters c
+            WHERE c.dictionary_id = ? AND c.id > ?
+              AND NOT EXISTS (
+                SELECT 1 FROM study_records sr
+                WHERE sr.user_id = ? AND sr.dictionary_id = ? AND sr.character_id = c.id
+              )
+            ORDER BY c.id ASC
+            LIMIT ?
+            """,
+            (dictionary_id, after_id, user_id, dictionary_id, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_due_cards(
+        self, user_id: str, dictionary_id: int, now: int, after: Tuple[int, int], limit: int
+    ) -> List[dict]:
+        if self.due_index is not None:
+            return self._query_due_index(
+                user_id, dictionary_id, lambda entry: entry.due_cards(now, after, limit)
+            )
+        rows = self.conn.execute(
+            """
+            SELECT c.id, c.hanzi, c.pinyin, sr.next_review_at
+            FROM study_records sr
+            JOIN characters c ON c.id = sr.character_id
+            WHERE sr.user_id = ? AND sr.dictionary_id = ?
+              AND (sr.next_review_at, sr.character_id) > (?, ?)
+              AND sr.next_review_at <= ?
+            ORDER BY sr.next_review_at ASC, sr.character_id ASC
+            LIMIT ?
+            """,
+            (user_id, dictionary_id, after[0], after[1], now, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_user_dictionary_stats(self, user_id: str, dictionary_id: int) -> Optional[dict]:
+        row = self.conn.execute(
+            """
+            SELECT d.character_count,
+                   COALESCE(s.known_count, 0) AS known_count,
+                   COALESCE(s.study_seconds, 0) AS study_seconds
+            FROM dictionaries d
+            LEFT JOIN user_dictionary_stats s ON s.dictionary_id = d.id AND s.user_id = ?
+            WHERE d.id = ?
+            """,
+            (user_id, dictionary_id),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def _bump_user_stats(self, user_id: str, dictionary_id: int, known: int = 0, seconds: int = 0) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO user_dictionary_stats (dictionary_id, user_id, known_count, study_seconds)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(dictionary_id, user_id) DO UPDATE SET
+              known_count = known_count + excluded.known_count,
+              study_seconds = study_seconds + excluded.study_seconds
+            """,
+            (dictionary_id, user_id, known, seconds),
+        )
+
+    def get_daily_stats(self, user_id: str, dictionary_id: int, first_day: int, last_day: int) -> List[dict]:
+        rows = self.conn.execute(
+            """
+            SELECT day, reviews, lapses, new_cards, study_seconds
+            FROM daily_stats
+            WHERE dictionary_id = ? AND user_id = ? AND day BETWEEN ? AND ?
+            ORDER BY day
+            """,
+            (dictionary_id, user_id, first_day, last_day),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _bump_daily_stats(
+        self,
+        user_id: str,
+        dictionary_id: int,
+        day: int,
+        reviews: int = 0,
+        lapses: int = 0,
+        new_cards: int = 0,
+        seconds: int = 0,
+    ) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO daily_stats (dictionary_id, user_id, day, reviews, lapses, new_cards, study_seconds)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(dictionary_id, user_id, day) DO UPDATE SET
+              reviews = reviews + excluded.reviews,
+              lapses = lapses + excluded.lapses,
+              new_cards = new_cards + excluded.new_cards,
+              study_seconds = study_seconds + excluded.study_seconds
+            """,
+            (dictionary_id, user_id, day, reviews, lapses, new_cards, seconds),
+        )
+
+    def count_due(self, user_id: str, dictionary_id: int, now: int) -> int:
+        if self.due_index is not None:
+            return self._query_due_index(user_id, dictionary_id, lambda entry: entry.count_due(now))
+        return self.conn.execute(
+            """
+            SELECT COUNT(*) AS c
+            FROM study_records
+            WHERE user_id = ? AND dictionary_id = ? AND next_review_at <= ?
+            """,
+            (user_id, dictionary_id, now),
+        ).fetchone()["c"]
+
+    def count_due_by_day(self, user_id: str, dictionary_id: int, start: int, days: int) -> List[int]:
+        if self.due_index is not None:
+            return self._query_due_index(
+                user_id, dictionary_id, lambda entry: entry.count_due_by_day(start, days)
+            )
+        # One range scan of idx_study_records_due, bucketed in SQL.
+        rows = self.conn.execute(
+            """
+            SELECT CASE WHEN next_review_at < ? THEN 0 ELSE (next_review_at - ?) / 86400 END AS day,
+                   COUNT(*) AS c
+            FROM study_records
+            WHERE user_id = ? AND dictionary_id = ? AND next_review_at < ?
+            GROUP BY day
+            """,
+            (start, start, user_id, dictionary_id, start + days * 86400),
+        ).fetchall()
+        counts = [0] * days
+        for row in rows:
+            counts[row["day"]] = row["c"]
+        return counts
+
+    def get_schedule_states(self, user_id: str, dictionary_id: int) -> List[Tuple[float, int, int, int]]:
+        # Plain tuples straight from the cursor; building Row objects for
+        # tens of thousands of cards costs more than the query.
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        return cursor.execute(
+            """
+            SELECT ease_factor, interval, repetitions, next_review_at
+            FROM study_records
+            WHERE user_id = ? AND dictionary_id = ? AND next_review_at IS NOT NULL
+            """,
+            (user_id, dictionary_id),
+        ).fetchall()
+
+    def append_review_log(
+        self,
+        user_id: str,
+        dictionary_id: int,
+        character_id: int,
+        rating: int,
+        reviewed_at: int,
+        before: Tuple[float, int, int],
+        after: Tuple[float, int, int],
+        next_review_at: int,
+        is_new: bool = False,
+    ) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO review_log (
+                user_id, dictionary_id, character_id, rating, reviewed_at,
+                ease_factor_before, interval_before, repetitions_before,
+                ease_factor_after, interval_after, repetitions_after, next_review_at, is_new
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (user_id, dictionary_id, character_id, rating, reviewed_at) + tuple(before) + tuple(after)
+            + (next_review_at, 1 if is_new else 0),
+        )
+
+    def get_review_history(self, user_id: str) -> List[Tuple[int, int, int, int]]:
+        rows = self.conn.execute(
+            """
+            SELECT dictionary_id, character_id, rating, reviewed_at
+            FROM review_log
+            WHERE user_id = ?
+            ORDER BY dictionary_id, character_id, reviewed_at, id
+            """,
+            (user_id,),
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def get_review_submission(self, user_id: str, client_id: str) -> Optional[dict]:
+        row = self.conn.execute(
+            """
+            SELECT dictionary_id, hanzi, next_review_at, interval, ease_factor
+            FROM review_submissions
+            WHERE user_id = ? AND client_id = ?
+            """,
+            (user_id, client_id),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def save_review_submission(
+        self,
+        user_id: str,
+        client_id: str,
+        dictionary_id: int,
+        hanzi: str,
+        next_review_at: int,
+        interval: int,
+        ease_factor: float,
+        created_at: int,
+    ) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO review_submissions (user_id, client_id, dictionary_id, hanzi, next_review_at, interval, ease_factor, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (user_id, client_id, dictionary_id, hanzi, next_review_at, interval, ease_factor, created_at),
+        )
+
+    # Scheduler parameters
+
+    def get_scheduler_parameters(self, user_id: str, scheduler: str) -> Optional[dict]:
+        row = self.conn.execute(
+            """
+            SELECT parameters, review_count, loss, updated_at
+            FROM scheduler_parameters
+            WHERE user_id = ? AND scheduler = ?
+            """,
+            (user_id, scheduler),
+        ).fetchone()
+        if row is None:
+            return None
+        result = dict(row)
+        result["parameters"] = json.loads(row["parameters"])
+        return result
+
+    def save_scheduler_parameters(
+        self,
+        user_id: str,
+        scheduler: str,
+        parameters: List[float],
+        review_count: int,
+        loss: Optional[float],
+        updated_at: int,
+    ) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO scheduler_parameters (user_id, scheduler, parameters, review_count, loss, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, scheduler) DO UPDATE SET
+              parameters = excluded.parameters,
+              review_count = excluded.review_count,
+              loss = excluded.loss,
+              updated_at = excluded.updated_at
+            """,
+            (user_id, scheduler, json.dumps(list(parameters)), review_count, loss, updated_at),
+        )
+
+    # Data versions
+
+    def get_data_versions(self, dictionary_id: int, user_id: str) -> Tuple[int, int]:
+        rows = self.conn.execute(
+            """
+            SELECT user_id, version
+            FROM data_versions
+            WHERE dictionary_id = ? AND user_id IN ('', ?)
+            """,
+            (dictionary_id, user_id),
+        ).fetchall()
+        versions = {row["user_id"]: row["version"] for row in rows}
+        return versions.get("", 0), versions.get(user_id, 0)
+
+    def get_catalog_version(self) -> int:
+        return self.get_data_versions(CATALOG, "")[0]
+
+    def next_due_after(self, user_id: str, dictionary_id: int, now: int) -> Optional[int]:
+        if self.due_index is not None:
+            return self._query_due_index(user_id, dictionary_id, lambda entry: entry.next_due_after(now))
+        return self.conn.execute(
+            """
+            SELECT MIN(next_review_at) AS next_review_at
+            FROM study_records
+            WHERE user_id = ? AND dictionary_id = ? AND next_review_at > ?
+            """,
+            (user_id, dictionary_id, now),
+        ).fetchone()["next_review_at"]
+
+    def _next_version(self, dictionary_id: int, user_id: str = "") -> Optional[int]:
+        """Bump a change counter; return its new value when the due index needs it."""
+        self.conn.execute(
+            """
+            INSERT INTO data_versions (dictionary_id, user_id, version)
+            VALUES (?, ?, 1)
+            ON CONFLICT(dictionary_id, user_id) DO UPDATE SET version = version + 1
+            """,
+            (dictionary_id, user_id),
+        )
+        if self.due_index is None or self.after_commit is None or dictionary_id == CATALOG:
+            return None
+        return self.conn.execute(
+            "SELECT version FROM data_versions WHERE dictionary_id = ? AND user_id = ?",
+            (dictionary_id, user_id),
+        ).fetchone()["version"]
+
+    def _bump_version(self, dictionary_id: int, user_id: str = "") -> None:
+        """Bump a change counter for a write that leaves the due index as it is."""
+        version = self._next_version(dictionary_id, user_id)
+        if version is not None:
+            self._on_commit(lambda: self.due_index.version_bumped(dictionary_id, user_id, version))
+
+    # Sessions
+
+    def create_session(self, user_id: str, dictionary_id: int, started_at: int) -> int:
+        cursor = self.conn.execute(
+            """
+            INSERT INTO study_sessions (user_id, dictionary_id, started_at)
+            VALUES (?, ?, ?)
+            """,
+            (user_id, dictionary_id, started_at),
+        )
+        self._bump_version(dictionary_id, user_id)
+        return cursor.lastrowid
+
+    def end_session(self, session_id: int, user_id: str, dictionary_id: int, ended_at: int) -> None:
+        row = self.conn.execute(
+            """
+            SELECT started_at, ended_at
+            FROM study_sessions
+            WHERE id = ? AND user_id = ? AND dictionary_id = ?
+            """,
+            (session_id, user_id, dictionary_id),
+        ).fetchone()
+        if row is None:
+            return
+        self.conn.execute(
+            "UPDATE study_sessions SET ended_at = ? WHERE id = ?",
+            (ended_at, session_id),
+        )
+        # Ending a session twice replaces its duration rather than adding to it.
+        previous = row["ended_at"] - row["started_at"] if row["ended_at"] is not None else 0
+        seconds = ended_at - row["started_at"] - previous
+        self._bump_version(dictionary_id, user_id)
+        if seconds:
+            self._bump_user_stats(user_id, dictionary_id, seconds=seconds)
+            self._bump_daily_stats(
+                user_id,
+                dictionary_id,
+                local_day(row["started_at"], self.utc_offset_minutes),
+                seconds=seconds,
+            )
+
+
+class SqliteStorage(Storage):
+    """Read-only pooled readers on a bounded executor, writes on the group-commit writer.
+
+    Every ``read`` goes through the read-only pool, so a read function that
+    tries to write fails instead of silently taking the write lock. Startup
+    migrations use one short-lived read-write connection.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, config, due_index_size: int = 256, utc_offset_minutes: int = 0) -> None:
+        self.config = config
+        self.utc_offset_minutes = utc_offset_minutes
+        self.due_index: Optional[DueIndex] = DueIndex(due_index_size) if due_index_size > 0 else None
+        self.read_pool = create_read_pool(config)
+        self.writer = create_writer(config)
+        self.executor: DatabaseExecutor = create_db_executor(config, self.read_pool, self.writer)
+
+    def start(self) -> None:
+        conn = connect(self.config)
+        try:
+            apply_migrations(conn)
+            self.etag_epoch = conn.execute(
+                "SELECT value FROM app_meta WHERE key = 'etag_epoch'"
+            ).fetchone()["value"]
+        finally:
+            conn.close()
+        self.writer.start()
+
+    def close(self) -> None:
+        self.executor.shutdown()
+        self.writer.stop()
+        self.read_pool.close()
+
+    def stats(self) -> dict:
+        return {
+            "read_pool": self.read_pool.stats(),
+            "writer": self.writer.stats(),
+            "due_index": self.due_index.stats() if self.due_index is not None else None,
+        }
+
+    def _run_read(self, conn: sqlite3.Connection, fn: Callable[..., Any], *args: Any) -> Any:
+        return fn(
+            SqliteRepository(conn, self.due_index, utc_offset_minutes=self.utc_offset_minutes), *args
+        )
+
+    def _run_write(self, conn: sqlite3.Connection, fn: Callable[..., Any], *args: Any) -> Any:
+        return fn(
+            SqliteRepository(conn, self.due_index, self.writer.after_commit, self.utc_offset_minutes),
+            *args,
+        )
+
+    async def read(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await self.executor.read(self._run_read, fn, *args)
+
+    async def write(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await self.executor.write(self._run_write, fn, *args)
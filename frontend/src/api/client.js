@@ -55,6 +55,48 @@ async function request(path, options = {}) {
   return response.json();
 }
 
+async function readLines(response, onLine) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let last = null;
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+    const lines = buffer.split("\n");
+    buffer = lines.pop();
+    for (const line of lines) {
+      if (line.trim()) {
+        last = JSON.parse(line);
+        onLine(last);
+      }
+    }
+    if (done) {
+      return last;
+    }
+  }
+}
+
+async function upload(path, body, onLine) {
+  const headers = new Headers({ "Content-Type": "text/plain; charset=utf-8" });
+  const token = getToken();
+  if (token) {
+    headers.set("Authorization", `Bearer ${token}`);
+  }
+  const response = await fetch(`${API_BASE}${path}`, { method: "POST", headers, body });
+  if (response.status === 401) {
+    localStorage.removeItem(TOKEN_KEY);
+    localStorage.removeItem(USER_KEY);
+    window.location.href = "/login";
+    return null;
+  }
+  if (!response.ok) {
+    const text = await response.text();
+    throw new Error(text || response.statusText);
+  }
+  return readLines(response, onLine);
+}
+
 export const api = {
   login(payload) {
     return request("/auth/login", {
@@ -85,8 +127,15 @@ export const api = {
   me() {
     return request("/auth/me");
   },
-  getQueue(dictionaryId) {
-    return request(`/dictionaries/${dictionaryId}/study/queue`);
+  getQueue(dictionaryId, params = {}) {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+      if (value !== undefined && value !== null) {
+        query.set(key, value);
+      }
+    });
+    const suffix = query.toString() ? `?${query.toString()}` : "";
+    return request(`/dictionaries/${dictionaryId}/study/queue${suffix}`);
   },
   review(dictionaryId, payload) {
     return request(`/dictionaries/${dictionaryId}/study/review`, {
@@ -94,6 +143,12 @@ export const api = {
       body: JSON.stringify(payload),
     });
   },
+  reviewBatch(dictionaryId, items) {
+    return request(`/dictionaries/${dictionaryId}/study/reviews`, {
+      method: "POST",
+      body: JSON.stringify({ items }),
+    });
+  },
   startSession(dictionaryId) {
     return request(`/dictionaries/${dictionaryId}/study/session/start`, { method: "POST" });
   },
@@ -109,10 +164,20 @@ export const api = {
       body: JSON.stringify({ items: payload.items }),
     });
   },
+  importText(dictionaryId, body, onProgress = () => {}) {
+    return upload(`/dictionaries/${dictionaryId}/characters/import/text`, body, onProgress);
+  },
   getCharacterInfo(dictionaryId, hanzi) {
     return request(`/dictionaries/${dictionaryId}/characters/${encodeURIComponent(hanzi)}/info`);
   },
   getStats(dictionaryId) {
     return request(`/dictionaries/${dictionaryId}/stats/summary`);
   },
+  getDaily(dictionaryId, days = 30) {
+    return request(`/dictionaries/${dictionaryId}/stats/daily?days=${days}`);
+  },
+  getForecast(dictionaryId, days = 7) {
+    const tzOffset = -new Date().getTimezoneOffset();
+    return request(`/dictionaries/${dictionaryId}/stats/forecast?days=${days}&tz_offset=${tzOffset}`);
+  },
 };